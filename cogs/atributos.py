@@ -1,14 +1,15 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
+from utils.autocomplete import personaje_autocomplete
 
 class Atributos(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
     @property
-    def conn(self):
-        return self.bot.conn
+    def db(self):
+        return self.bot.db
 
     atributos = app_commands.Group(name="atributos", description="Gestión de atributos")
     
@@ -21,18 +22,18 @@ class Atributos(commands.Cog):
         max_value="Valor máximo (opcional)"
     )
     async def atributo_crear(self, interaction: discord.Interaction, nombre: str, default: int = 0, min_value: int = None, max_value: int = None):
-        cur = self.conn.cursor()
         try:
-            cur.execute("""
-                INSERT INTO attribute_defs (name, default_value, min_value, max_value)
-                VALUES (%s, %s, %s, %s)
-            """, (nombre, default, min_value, max_value))
-            self.conn.commit()
-            await interaction.response.send_message(f"Atributo **{nombre}** creado.", ephemeral=True)
+            await self.db.run(self._crear_tx, nombre, default, min_value, max_value)
         except Exception as e:
             await interaction.response.send_message("Este atributo ya existe.", ephemeral=True)
-        finally:
-            cur.close()
+            return
+        await interaction.response.send_message(f"Atributo **{nombre}** creado.", ephemeral=True)
+
+    def _crear_tx(self, cur, nombre, default, min_value, max_value):
+        cur.execute("""
+            INSERT INTO attribute_defs (name, default_value, min_value, max_value)
+            VALUES (%s, %s, %s, %s)
+        """, (nombre, default, min_value, max_value))
 
     @atributos.command(name="set", description="Asigna un valor de atributo a un personaje")
     @app_commands.describe(
@@ -40,37 +41,36 @@ class Atributos(commands.Cog):
         atributo="Nombre del atributo",
         valor="Valor a asignar"
     )
+    @app_commands.autocomplete(personaje=personaje_autocomplete)
     async def atributo_set(self, interaction: discord.Interaction, personaje: str, atributo: str, valor: int):
-        cur = self.conn.cursor()
+        error = await self.db.run(self._set_tx, str(interaction.guild.id), personaje, atributo, valor)
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
 
+        await interaction.response.send_message(f"{atributo} de **{personaje}** ahora es {valor}.", ephemeral=True)
+
+    def _set_tx(self, cur, guild_id, personaje, atributo, valor):
+        """Unidad de trabajo de /atributos set. Devuelve el mensaje de error o None"""
         # Validar personaje
-        cur.execute("SELECT id, attributes FROM characters WHERE guild_id=%s AND name=%s",
-                    (str(interaction.guild.id), personaje))
+        cur.execute("SELECT id FROM characters WHERE guild_id=%s AND name=%s", (guild_id, personaje))
         pj = cur.fetchone()
         if not pj:
-            await interaction.response.send_message("No existe ese personaje.", ephemeral=True)
-            cur.close()
-            return
-        personaje_id, attributes = pj
-        attributes = attributes or {}
+            return "No existe ese personaje."
+        personaje_id = pj[0]
 
         # Validar atributo
         cur.execute("SELECT min_value, max_value FROM attribute_defs WHERE name=%s", (atributo,))
         atr = cur.fetchone()
         if not atr:
-            await interaction.response.send_message("Ese atributo no está definido.", ephemeral=True)
-            cur.close()
-            return
+            return "Ese atributo no está definido."
 
         min_val, max_val = atr
         if min_val is not None and valor < min_val:
-            await interaction.response.send_message(f"El valor mínimo de {atributo} es {min_val}.", ephemeral=True)
-            cur.close()
-            return
+            return f"El valor mínimo de {atributo} es {min_val}."
         if max_val is not None and valor > max_val:
-            await interaction.response.send_message(f"El valor máximo de {atributo} es {max_val}.", ephemeral=True)
-            cur.close()
-            return
+            return f"El valor máximo de {atributo} es {max_val}."
 
         # Actualizar atributo
         cur.execute("""
@@ -78,73 +78,65 @@ class Atributos(commands.Cog):
             SET attributes = jsonb_set(COALESCE(attributes, '{}'::jsonb), %s, %s, true)
             WHERE id=%s
         """, (f'{{{atributo}}}', str(valor), personaje_id))
-        self.conn.commit()
-        cur.close()
-
-        await interaction.response.send_message(f"{atributo} de **{personaje}** ahora es {valor}.", ephemeral=True)
+        return None
 
     @atributos.command(name="lista", description="Muestra todos los atributos definidos en el servidor")
     async def atributos_lista(self, interaction: discord.Interaction):
-        cur = self.conn.cursor()
-        
         try:
-            cur.execute("SELECT name, default_value, min_value, max_value FROM attribute_defs ORDER BY name")
-            atributos = cur.fetchall()
-            
-            if not atributos:
-                await interaction.response.send_message("No hay atributos definidos en este servidor.", ephemeral=True)
-                return
-            
-            embed = discord.Embed(title="Atributos Definidos", color=discord.Color.dark_gold())
-            
-            for nombre, default, min_val, max_val in atributos:
-                cur.execute("""
-                    SELECT COUNT(*) 
-                    FROM characters 
-                    WHERE guild_id = %s 
-                    AND attributes ? %s
-                """, (str(interaction.guild.id), nombre))
-                count = cur.fetchone()[0]
-                
-                # Formatear la información del atributo
-                info = f"**Default:** {default}\n"
-                if min_val is not None:
-                    info += f"**Mínimo:** {min_val}\n"
-                if max_val is not None:
-                    info += f"**Máximo:** {max_val}\n"
-                info += f"**Personajes con este atributo:** {count}"
-                
-                embed.add_field(name=nombre, value=info, inline=False)
-            
-            await interaction.response.send_message(embed=embed)
-            
+            atributos = await self.db.run(self._lista_tx, str(interaction.guild.id))
         except Exception as e:
             await interaction.response.send_message("Error al obtener la lista de atributos.", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not atributos:
+            await interaction.response.send_message("No hay atributos definidos en este servidor.", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="Atributos Definidos", color=discord.Color.dark_gold())
+
+        for nombre, default, min_val, max_val, count in atributos:
+            # Formatear la información del atributo
+            info = f"**Default:** {default}\n"
+            if min_val is not None:
+                info += f"**Mínimo:** {min_val}\n"
+            if max_val is not None:
+                info += f"**Máximo:** {max_val}\n"
+            info += f"**Personajes con este atributo:** {count}"
+
+            embed.add_field(name=nombre, value=info, inline=False)
+
+        await interaction.response.send_message(embed=embed)
+
+    def _lista_tx(self, cur, guild_id):
+        """Atributos definidos con cuántos personajes del servidor tienen cada uno (una consulta)"""
+        cur.execute("""
+            SELECT ad.name, ad.default_value, ad.min_value, ad.max_value,
+                   (SELECT COUNT(*) FROM characters c WHERE c.guild_id = %s AND c.attributes ? ad.name)
+            FROM attribute_defs ad
+            ORDER BY ad.name
+        """, (guild_id,))
+        return cur.fetchall()
 
     @atributos.command(name="eliminar", description="Elimina un atributo definido (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(nombre="Nombre del atributo a eliminar")
     async def atributo_eliminar(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
-        
         try:
-
-            cur.execute("SELECT name FROM attribute_defs WHERE name = %s", (nombre,))
-            if not cur.fetchone():
-                await interaction.response.send_message("No existe un atributo con ese nombre.", ephemeral=True)
-                return
-            
-            cur.execute("DELETE FROM attribute_defs WHERE name = %s", (nombre,))
-            self.conn.commit()
-            
-            await interaction.response.send_message(f"Atributo **{nombre}** eliminado correctamente.", ephemeral=True)
-            
+            eliminado = await self.db.run(self._eliminar_tx, nombre)
         except Exception as e:
             await interaction.response.send_message("Error al eliminar el atributo.", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        if not eliminado:
+            await interaction.response.send_message("No existe un atributo con ese nombre.", ephemeral=True)
+            return
+
+        await interaction.response.send_message(f"Atributo **{nombre}** eliminado correctamente.", ephemeral=True)
+
+    def _eliminar_tx(self, cur, nombre):
+        cur.execute("DELETE FROM attribute_defs WHERE name = %s RETURNING name", (nombre,))
+        return cur.fetchone() is not None
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Atributos(bot))
\ No newline at end of file
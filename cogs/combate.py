@@ -1,20 +1,24 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import random
-import re
-import json
+from utils.autocomplete import personaje_autocomplete
+from utils.character_stats import load_stats
+from utils.dice import procesar_expresion
+from utils.encounter import (
+    ACCIONES, DEFAULT_VIDA, DERROTADO, Accion, Participante, orden_iniciativa, resolver_ronda, tirar,
+)
 
 class Combate(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     @property
-    def conn(self):
-        return self.bot.conn
+    def db(self):
+        return self.bot.db
 
     atributo = app_commands.Group(name="atributo", description="Gestión de atributos de combate")
     dado = app_commands.Group(name="dado", description="Tiradas de dados de combate")
+    combate = app_commands.Group(name="combate", description="Encuentros con iniciativa y rondas")
 
     @atributo.command(name="establecer", description="Establece un atributo base para todos los personajes nuevos (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
@@ -39,125 +43,70 @@ class Combate(commands.Cog):
         atributo="Nombre del atributo",
         valor="Nuevo valor del atributo"
     )
+    @app_commands.autocomplete(personaje=personaje_autocomplete)
     async def modificar_atributo(self, interaction: discord.Interaction, personaje: str, atributo: str, valor: int):
-        cur = self.conn.cursor()
         try:
-            cur.execute("""
-                UPDATE characters 
-                SET attributes = jsonb_set(
-                    COALESCE(attributes, '{}'::jsonb), 
-                    %s, 
-                    %s::text::jsonb,
-                    true
-                )
-                WHERE guild_id = %s AND name = %s
-            """, (f"{{{atributo}}}", str(valor), str(interaction.guild.id), personaje))
-            
-            self.conn.commit()
-            
-            if cur.rowcount > 0:
-                await interaction.response.send_message(
-                    f"Atributo {atributo} de {personaje} establecido en {valor}.",
-                    ephemeral=False
-                )
-            else:
-                await interaction.response.send_message("Personaje no encontrado.", ephemeral=True)
-                
+            modificado = await self.db.run(
+                self._modificar_atributo_tx, str(interaction.guild.id), personaje, atributo, valor
+            )
         except Exception as e:
             await interaction.response.send_message("Error al modificar el atributo.", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if modificado:
+            await interaction.response.send_message(
+                f"Atributo {atributo} de {personaje} establecido en {valor}.",
+                ephemeral=False
+            )
+        else:
+            await interaction.response.send_message("Personaje no encontrado.", ephemeral=True)
+
+    def _modificar_atributo_tx(self, cur, guild_id, personaje, atributo, valor):
+        cur.execute("""
+            UPDATE characters 
+            SET attributes = jsonb_set(
+                COALESCE(attributes, '{}'::jsonb), 
+                %s, 
+                %s::text::jsonb,
+                true
+            )
+            WHERE guild_id = %s AND name = %s
+        """, (f"{{{atributo}}}", str(valor), guild_id, personaje))
+        return cur.rowcount > 0
 
     @dado.command(name="ataque", description="Realiza una tirada de ataque")
     @app_commands.describe(personaje="Nombre del personaje")
+    @app_commands.autocomplete(personaje=personaje_autocomplete)
     async def tirar_ataque(self, interaction: discord.Interaction, personaje: str):
         await self._tirar_dado_combate(interaction, personaje, "Ataque")
 
     @dado.command(name="defensa", description="Realiza una tirada de defensa")
     @app_commands.describe(personaje="Nombre del personaje")
+    @app_commands.autocomplete(personaje=personaje_autocomplete)
     async def tirar_defensa(self, interaction: discord.Interaction, personaje: str):
         await self._tirar_dado_combate(interaction, personaje, "Defensa")
 
     @dado.command(name="esquive", description="Realiza una tirada de esquive")
     @app_commands.describe(personaje="Nombre del personaje")
+    @app_commands.autocomplete(personaje=personaje_autocomplete)
     async def tirar_esquive(self, interaction: discord.Interaction, personaje: str):
         await self._tirar_dado_combate(interaction, personaje, "Agilidad")
 
     async def _tirar_dado_combate(self, interaction: discord.Interaction, personaje: str, tipo: str):
-        cur = self.conn.cursor()
         try:
-            # Obtener atributo base del personaje
-            cur.execute("""
-                SELECT attributes FROM characters 
-                WHERE guild_id = %s AND name = %s
-            """, (str(interaction.guild.id), personaje))
-            
-            result = cur.fetchone()
-            
-            if not result:
+            # Atributos y equipo ya están sumados en character_stats
+            stats = (await self.db.run(load_stats, interaction.guild.id, [personaje])).get(personaje)
+
+            if not stats:
                 await interaction.response.send_message("Personaje no encontrado.", ephemeral=True)
                 return
 
-            attributes = result[0] or {}
-            atributo_base = attributes.get(tipo, 5)
-            
-            # Buscar items equipados
-            cur.execute("""
-                SELECT i.effects, i.attack, i.defense, inv.equipped_slot
-                FROM inventory inv
-                JOIN items i ON inv.item_id = i.id
-                JOIN characters c ON inv.character_id = c.id
-                WHERE c.guild_id = %s AND c.name = %s AND inv.equipped_slot IS NOT NULL
-            """, (str(interaction.guild.id), personaje))
-            
-            items_equipados = cur.fetchall()
-            
-            # Calcular modificadores
-            modificadores = []
-            dado_personalizado = None
-            valor_final = atributo_base
-
-            for effects, attack, defense, slot in items_equipados:
-                # Efectos de atributos
-                if effects:
-                    efectos_dict = self._safe_json_load(effects) or {}
-                    for efecto, valor in efectos_dict.items():
-                        if tipo.lower() in efecto.lower():
-                            if isinstance(valor, (int, float)):
-                                valor_final += valor
-                                simbolo = "+" if valor > 0 else ""
-                                modificadores.append(f"{slot}: {efecto} {simbolo}{valor}")
-
-                # Dados personalizados
-                if tipo == "Ataque" and attack and not dado_personalizado:
-                    dado_personalizado = attack
-                elif tipo == "Defensa" and defense and not dado_personalizado:
-                    dado_personalizado = defense
-
-            # Determinar dado a usar
-            if dado_personalizado:
-                dado_expresion = dado_personalizado
-                fuente = "Arma equipada"
-            else:
-                dado_expresion = f"1d{valor_final}"
-                fuente = f"Atributo {tipo}"
+            dado_expresion, fuente = stats.dado(tipo)
+            modificadores = stats.modificadores(tipo)
 
             # Realizar tirada
-            dados_cog = self.bot.get_cog('Dados')
-            if dados_cog and hasattr(dados_cog, 'procesar_expresion'):
-                resultado, detalles, expandida = dados_cog.procesar_expresion(dado_expresion)
-            else:
-                # Tirada simple
-                if 'd' in dado_expresion:
-                    partes = dado_expresion.split('d')
-                    cantidad = int(partes[0]) if partes[0] else 1
-                    caras = int(partes[1])
-                    tiradas = [random.randint(1, caras) for _ in range(cantidad)]
-                    resultado = sum(tiradas)
-                    detalles = f"{cantidad}d{caras}: {tiradas} = {resultado}"
-                else:
-                    resultado = int(dado_expresion)
-                    detalles = f"Valor fijo: {resultado}"
+            resultado, detalles, expandida = procesar_expresion(dado_expresion)
 
             # Crear embed serio
             embed = discord.Embed(
@@ -178,20 +127,284 @@ class Combate(commands.Cog):
                 
         except Exception as e:
             await interaction.response.send_message(f"Error al realizar la tirada: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
-
-    def _safe_json_load(self, data):
-        if data is None:
-            return {}
-        if isinstance(data, dict):
-            return data
-        if isinstance(data, str):
-            try:
-                return json.loads(data)
-            except:
-                return {}
-        return {}
+
+    # =============================
+    # ENCUENTROS
+    # =============================
+    @combate.command(name="iniciar", description="Inicia un encuentro de combate en este canal")
+    async def iniciar_encuentro(self, interaction: discord.Interaction):
+        try:
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    INSERT INTO encounters (guild_id, channel_id, created_by)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (channel_id) DO NOTHING
+                    RETURNING id
+                """, (str(interaction.guild.id), str(interaction.channel_id), str(interaction.user.id)))
+                creado = cur.fetchone()
+                await cur.commit()
+
+            if not creado:
+                await interaction.response.send_message("Ya hay un encuentro activo en este canal.", ephemeral=True)
+                return
+            await interaction.response.send_message(
+                "Encuentro iniciado. Usa `/combate unirse` para añadir personajes."
+            )
+        except Exception as e:
+            await interaction.response.send_message(f"Error al iniciar el encuentro: {str(e)}", ephemeral=True)
+
+    @combate.command(name="unirse", description="Añade un personaje al encuentro y tira su iniciativa")
+    @app_commands.describe(
+        personaje="Nombre del personaje",
+        vida=f"Puntos de vida iniciales (por defecto su atributo Vida o {DEFAULT_VIDA})"
+    )
+    @app_commands.autocomplete(personaje=personaje_autocomplete)
+    async def unirse_encuentro(self, interaction: discord.Interaction, personaje: str, vida: int = None):
+        try:
+            if vida is not None and vida < 1:
+                await interaction.response.send_message("La vida debe ser al menos 1.", ephemeral=True)
+                return
+
+            error, datos = await self.db.run(
+                self._unirse_tx, str(interaction.guild.id), str(interaction.channel_id),
+                str(interaction.user.id), interaction.user.guild_permissions.administrator, personaje, vida
+            )
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
+
+            iniciativa, vida = datos
+            await interaction.response.send_message(
+                f"**{personaje}** entra en combate con iniciativa **{iniciativa}** y **{vida}** de vida."
+            )
+        except Exception as e:
+            await interaction.response.send_message(f"Error al unirse al encuentro: {str(e)}", ephemeral=True)
+
+    def _unirse_tx(self, cur, guild_id, channel_id, user_id, is_admin, personaje, vida):
+        """Unidad de trabajo de /combate unirse. Devuelve (error, (iniciativa, vida))"""
+        cur.execute("SELECT id FROM encounters WHERE channel_id=%s", (channel_id,))
+        encuentro = cur.fetchone()
+        if not encuentro:
+            return "No hay un encuentro activo en este canal.", None
+
+        cur.execute("SELECT user_id FROM characters WHERE guild_id=%s AND name=%s", (guild_id, personaje))
+        dueno = cur.fetchone()
+        stats = load_stats(cur, guild_id, [personaje]).get(personaje)
+        if not dueno or not stats:
+            return "Personaje no encontrado.", None
+        if dueno[0] != user_id and not is_admin:
+            return "No tienes permisos para usar este personaje.", None
+
+        if vida is None:
+            vida = stats.attributes.get("Vida")
+            vida = int(vida) if isinstance(vida, (int, float)) and vida >= 1 else DEFAULT_VIDA
+        iniciativa = tirar(stats.dado("Agilidad")[0])
+
+        cur.execute("""
+            INSERT INTO encounter_participants (encounter_id, character_id, initiative, hp, max_hp)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (encounter_id, character_id) DO NOTHING
+            RETURNING id
+        """, (encuentro[0], stats.character_id, iniciativa, vida, vida))
+        if not cur.fetchone():
+            return "Ese personaje ya participa en el encuentro.", None
+        return None, (iniciativa, vida)
+
+    @combate.command(name="accion", description="Elige la acción de un personaje para esta ronda")
+    @app_commands.describe(
+        personaje="Nombre del personaje",
+        accion="Acción a realizar",
+        objetivo="Personaje al que atacar (solo para atacar)"
+    )
+    @app_commands.choices(accion=[app_commands.Choice(name=a.capitalize(), value=a) for a in ACCIONES])
+    @app_commands.autocomplete(personaje=personaje_autocomplete, objetivo=personaje_autocomplete)
+    async def accion_encuentro(self, interaction: discord.Interaction, personaje: str,
+                               accion: app_commands.Choice[str], objetivo: str = None):
+        try:
+            if accion.value == "atacar" and not objetivo:
+                await interaction.response.send_message("Indica a quién atacar.", ephemeral=True)
+                return
+
+            error, ronda = await self.db.run(
+                self._accion_tx, str(interaction.guild.id), str(interaction.channel_id),
+                str(interaction.user.id), interaction.user.guild_permissions.administrator,
+                personaje, accion.value, objetivo if accion.value == "atacar" else None
+            )
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
+
+            destino = f" a **{objetivo}**" if accion.value == "atacar" else ""
+            await interaction.response.send_message(
+                f"Ronda {ronda}: **{personaje}** va a {accion.value}{destino}.", ephemeral=True
+            )
+        except Exception as e:
+            await interaction.response.send_message(f"Error al elegir la acción: {str(e)}", ephemeral=True)
+
+    def _accion_tx(self, cur, guild_id, channel_id, user_id, is_admin, personaje, accion, objetivo):
+        """Unidad de trabajo de /combate accion. Devuelve (error, ronda)"""
+        cur.execute("""
+            SELECT e.id, e.round, p.id, p.status, c.user_id, t.id, t.status
+            FROM encounters e
+            JOIN encounter_participants p ON p.encounter_id = e.id
+            JOIN characters c ON c.id = p.character_id AND c.name = %s
+            LEFT JOIN characters tc ON tc.guild_id = c.guild_id AND tc.name = %s
+            LEFT JOIN encounter_participants t ON t.encounter_id = e.id AND t.character_id = tc.id
+            WHERE e.channel_id = %s
+        """, (personaje, objetivo, channel_id))
+        fila = cur.fetchone()
+        if not fila:
+            return "Ese personaje no participa en el encuentro de este canal.", None
+
+        encuentro_id, ronda, actor_id, estado, dueno, objetivo_id, estado_objetivo = fila
+        if dueno != user_id and not is_admin:
+            return "No tienes permisos para usar este personaje.", None
+        if estado == DERROTADO:
+            return f"{personaje} está fuera de combate.", None
+        if objetivo and not objetivo_id:
+            return "El objetivo no participa en el encuentro.", None
+        if objetivo and estado_objetivo == DERROTADO:
+            return f"{objetivo} ya está fuera de combate.", None
+
+        cur.execute("""
+            INSERT INTO encounter_actions (encounter_id, round, actor_id, action, target_id)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (encounter_id, round, actor_id)
+            DO UPDATE SET action = EXCLUDED.action, target_id = EXCLUDED.target_id, created_at = now()
+        """, (encuentro_id, ronda, actor_id, accion, objetivo_id))
+        return None, ronda
+
+    @combate.command(name="resolver", description="Resuelve todas las acciones de la ronda y pasa a la siguiente")
+    async def resolver_encuentro(self, interaction: discord.Interaction):
+        try:
+            error, datos = await self.db.run(
+                self._resolver_tx, str(interaction.guild.id), str(interaction.channel_id),
+                str(interaction.user.id), interaction.user.guild_permissions.administrator
+            )
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
+                return
+
+            ronda, lineas, participantes = datos
+            embed = self._embed_encuentro(
+                f"Ronda {ronda}", "\n".join(lineas) or "Nadie actuó en esta ronda.", participantes
+            )
+            embed.set_footer(text=f"Comienza la ronda {ronda + 1}")
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            await interaction.response.send_message(f"Error al resolver la ronda: {str(e)}", ephemeral=True)
+
+    def _resolver_tx(self, cur, guild_id, channel_id, user_id, is_admin):
+        """Unidad de trabajo de /combate resolver. Devuelve (error, (ronda, líneas, participantes))
+
+        Las estadísticas de todos los participantes se leen en una sola
+        consulta y la vida resultante se guarda en un único UPDATE.
+        """
+        cur.execute("SELECT id, round, created_by FROM encounters WHERE channel_id=%s FOR UPDATE",
+                    (channel_id,))
+        encuentro = cur.fetchone()
+        if not encuentro:
+            return "No hay un encuentro activo en este canal.", None
+        encuentro_id, ronda, creador = encuentro
+        if creador != user_id and not is_admin:
+            return "Solo quien inició el encuentro o un administrador puede resolver rondas.", None
+
+        cur.execute("""
+            SELECT p.id, c.name, p.initiative, p.hp, p.max_hp, p.status
+            FROM encounter_participants p
+            JOIN characters c ON c.id = p.character_id
+            WHERE p.encounter_id = %s
+        """, (encuentro_id,))
+        participantes = [Participante(*fila) for fila in cur.fetchall()]
+        if not participantes:
+            return "El encuentro no tiene participantes.", None
+
+        cur.execute("SELECT actor_id, action, target_id FROM encounter_actions WHERE encounter_id=%s AND round=%s",
+                    (encuentro_id, ronda))
+        acciones = [Accion(*fila) for fila in cur.fetchall()]
+
+        stats = load_stats(cur, guild_id, [p.name for p in participantes])
+        lineas = resolver_ronda(participantes, acciones, stats)
+
+        cur.execute("""
+            UPDATE encounter_participants p
+            SET hp = v.hp, status = v.status
+            FROM unnest(%s::int[], %s::int[], %s::text[]) AS v(id, hp, status)
+            WHERE p.id = v.id
+        """, ([p.id for p in participantes], [p.hp for p in participantes], [p.status for p in participantes]))
+        cur.execute("DELETE FROM encounter_actions WHERE encounter_id=%s AND round<=%s", (encuentro_id, ronda))
+        cur.execute("UPDATE encounters SET round = round + 1 WHERE id=%s", (encuentro_id,))
+        return None, (ronda, lineas, orden_iniciativa(participantes, stats))
+
+    @combate.command(name="estado", description="Muestra el orden de iniciativa y la vida de los participantes")
+    async def estado_encuentro(self, interaction: discord.Interaction):
+        try:
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    SELECT e.round, p.id, c.name, p.initiative, p.hp, p.max_hp, p.status, a.action, tc.name
+                    FROM encounters e
+                    JOIN encounter_participants p ON p.encounter_id = e.id
+                    JOIN characters c ON c.id = p.character_id
+                    LEFT JOIN character_stats cs ON cs.character_id = c.id
+                    LEFT JOIN encounter_actions a ON a.encounter_id = e.id AND a.round = e.round AND a.actor_id = p.id
+                    LEFT JOIN encounter_participants t ON t.id = a.target_id
+                    LEFT JOIN characters tc ON tc.id = t.character_id
+                    WHERE e.channel_id = %s
+                    ORDER BY p.initiative DESC, cs.agility DESC NULLS LAST, c.name
+                """, (str(interaction.channel_id),))
+                filas = cur.fetchall()
+
+            if not filas:
+                await interaction.response.send_message(
+                    "No hay un encuentro con participantes en este canal.", ephemeral=True
+                )
+                return
+
+            ronda = filas[0][0]
+            participantes = [Participante(*fila[1:7]) for fila in filas]
+            pendientes = [
+                f"{nombre}: {accion}" + (f" → {objetivo}" if objetivo else "")
+                for (_, _, nombre, *_resto, accion, objetivo) in filas if accion
+            ]
+            embed = self._embed_encuentro(
+                f"Encuentro - ronda {ronda}",
+                "\n".join(pendientes) or "Sin acciones elegidas todavía.",
+                participantes
+            )
+            await interaction.response.send_message(embed=embed)
+        except Exception as e:
+            await interaction.response.send_message(f"Error al mostrar el encuentro: {str(e)}", ephemeral=True)
+
+    @combate.command(name="terminar", description="Termina el encuentro de este canal")
+    async def terminar_encuentro(self, interaction: discord.Interaction):
+        try:
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    DELETE FROM encounters
+                    WHERE channel_id = %s AND (created_by = %s OR %s)
+                    RETURNING round
+                """, (str(interaction.channel_id), str(interaction.user.id),
+                      interaction.user.guild_permissions.administrator))
+                borrado = cur.fetchone()
+                await cur.commit()
+
+            if not borrado:
+                await interaction.response.send_message(
+                    "No hay un encuentro que puedas terminar en este canal.", ephemeral=True
+                )
+                return
+            await interaction.response.send_message(f"Encuentro terminado tras {borrado[0] - 1} rondas.")
+        except Exception as e:
+            await interaction.response.send_message(f"Error al terminar el encuentro: {str(e)}", ephemeral=True)
+
+    def _embed_encuentro(self, titulo, descripcion, participantes):
+        embed = discord.Embed(title=titulo, description=descripcion[:4000], color=discord.Color.dark_gold())
+        estado = []
+        for p in participantes:
+            marca = " (derrotado)" if p.status == DERROTADO else ""
+            estado.append(f"**{p.name}** · Ini {p.initiative} · {p.hp}/{p.max_hp} PV{marca}")
+        embed.add_field(name="Iniciativa", value="\n".join(estado)[:1024], inline=False)
+        return embed
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Combate(bot))
\ No newline at end of file
@@ -2,19 +2,145 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import json
-import random
-import re
+from utils.command_program import (
+    MAX_ACCIONES, ProgramError, acciones_de, compilar_accion, compilar_programa, parsear_item,
+)
+from utils.dice import DiceError
+from utils.ratelimit import GRUPO_PERSONALIZADO
+
+# Prefijo con el que se invocan los comandos personalizados (.nombre)
+PREFIJO = "."
 
 class CustomCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # {guild_id: {nombre, ...}} para descartar mensajes sin ir a la base de datos
+        self._nombres = {}
+        # {guild_id: {nombre: CommandProgram}} compilados la primera vez que se usan
+        self._programas = {}
+
+    async def cog_load(self):
+        self._nombres = await self.db.run(self._cargar_nombres)
+        print(f"[CUSTOM] {sum(len(n) for n in self._nombres.values())} comandos personalizados cargados")
+
+    def _cargar_nombres(self, cur):
+        cur.execute("SELECT guild_id, name FROM custom_commands")
+        nombres = {}
+        for guild_id, name in cur.fetchall():
+            nombres.setdefault(guild_id, set()).add(name)
+        return nombres
 
     @property
-    def conn(self):
-        return self.bot.conn
+    def db(self):
+        return self.bot.db
 
     comando = app_commands.Group(name="comando", description="Sistema de comandos personalizados")
 
+    def _buscar_comando(self, message: discord.Message):
+        """Nombre del comando personalizado que invoca el mensaje, o None.
+
+        Solo mira memoria: los mensajes que no empiezan por el prefijo o cuyo
+        nombre no está en el servidor se descartan sin tocar la base de datos.
+        """
+        content = message.content
+        if not content.startswith(PREFIJO) or message.author.bot or message.guild is None:
+            return None
+        nombres = self._nombres.get(str(message.guild.id))
+        if not nombres:
+            return None
+        # ". " o ".\n" no tienen nombre: split() devuelve una lista vacía
+        palabras = content[len(PREFIJO):].split(None, 1)
+        if not palabras:
+            return None
+        nombre = palabras[0].lower()
+        if nombre not in nombres or self.bot.get_command(nombre):
+            # Los comandos con prefijo del propio bot (.roll, .r...) tienen prioridad
+            return None
+        return nombre
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        nombre = self._buscar_comando(message)
+        if nombre:
+            await self._ejecutar_comando(message, nombre)
+
+    async def _programa(self, guild: discord.Guild, nombre: str):
+        """Programa compilado del comando; se recompila si cambian los items del servidor"""
+        guild_id = str(guild.id)
+        programas = self._programas.setdefault(guild_id, {})
+        programa = programas.get(nombre)
+        if programa and programa.catalog_version == self.bot.items.version(guild_id):
+            return programa
+
+        if programa:
+            definicion = programa.definicion
+        else:
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    SELECT name, main_action, requirements, response_message
+                    FROM custom_commands
+                    WHERE guild_id=%s AND name=%s
+                """, (guild_id, nombre))
+                definicion = cur.fetchone()
+            if not definicion:
+                return None
+            name, main_action, requirements, response_message = definicion
+            definicion = (
+                name,
+                json.loads(main_action) if isinstance(main_action, str) else main_action,
+                json.loads(requirements) if isinstance(requirements, str) else (requirements or []),
+                response_message,
+            )
+
+        programa = await compilar_programa(*definicion, guild, self.bot.items)
+        programas[nombre] = programa
+        return programa
+
+    def _olvidar_programa(self, guild_id: str, nombre: str):
+        self._nombres.get(guild_id, set()).discard(nombre)
+        self._programas.get(guild_id, {}).pop(nombre, None)
+
+    async def _ejecutar_comando(self, message: discord.Message, nombre: str):
+        guild_id = str(message.guild.id)
+        espera, _ = self.bot.limits.consumir(message.author.id, guild_id, GRUPO_PERSONALIZADO)
+        if espera:
+            # Una reacción en lugar de un mensaje para no sumar más spam al canal
+            await message.add_reaction("⏳")
+            return
+        try:
+            programa = await self._programa(message.guild, nombre)
+        except (ProgramError, DiceError, KeyError) as e:
+            await message.channel.send(f"El comando `.{nombre}` está mal definido: {e}")
+            return
+        if not programa:
+            self._olvidar_programa(guild_id, nombre)
+            return
+
+        # Roles desde la caché de Discord
+        faltante = programa.rol_faltante(message.author)
+        if faltante:
+            await message.channel.send(f"No cumples el requisito **rol: {faltante.nombre}**.")
+            return
+
+        # Requisitos de item, dar_item/quitar_item y efectos en una sola transacción
+        if programa.usa_base_de_datos:
+            error, invocacion = await self.db.run(
+                programa.ejecutar_tx, str(message.author.id), guild_id, str(message.channel.id)
+            )
+            if error:
+                await message.channel.send(error)
+                return
+            if programa.inventario:
+                self.bot.dispatch("inventory_change", invocacion.character_id)
+            for effect_id, expira in invocacion.efectos:
+                self.bot.effects.schedule(effect_id, expira)
+
+        resultados = programa.ejecutar(message) + [programa.response_message]
+        embeds = [r for r in resultados if isinstance(r, discord.Embed)]
+        texto = "\n".join(r for r in resultados if r and isinstance(r, str))
+        if texto or embeds:
+            await message.channel.send(content=texto or None, embeds=embeds[:10])
+
     # Helper functions simplificadas
     def _parse_requirement(self, req_str: str):
         """Parsea un requisito en formato tipo:valor - Solo objetos y roles"""
@@ -47,90 +173,38 @@ class CustomCommands(commands.Cog):
         
         return {'type': action_type, 'params': params}, None
 
-    def _execute_action(self, action_type: str, params: str, message: discord.Message):
-        """Ejecuta una acción basada en su tipo - Versión simplificada"""
-        try:
-            if action_type == "mensaje":
-                return params
-            
-            elif action_type == "embed":
-                title, description = params.split('|', 1) if '|' in params else (params, "")
-                embed = discord.Embed(title=title.strip(), description=description.strip(), color=discord.Color.dark_gold())
-                return embed
-            
-            elif action_type == "imagen":
-                return params.strip()
-            
-            elif action_type == "dado":
-                if 'd' in params:
-                    partes = params.split('d')
-                    cantidad = int(partes[0]) if partes[0] else 1
-                    caras = int(partes[1])
-                    tiradas = [random.randint(1, caras) for _ in range(cantidad)]
-                    resultado = sum(tiradas)
-                    return f"🎲 {params}: {tiradas} = **{resultado}**"
-                else:
-                    return f"🎲 Dado: {params}"
-            
-            elif action_type == "dar_item":
-                parts = params.split(',')
-                if len(parts) >= 2:
-                    item_name = parts[0].strip()
-                    quantity = int(parts[1].strip())
-                    # Lógica para dar item (simplificada)
-                    return f"Recibes {quantity}x {item_name}"
-                return "Error en formato: dar_item@nombre_item,cantidad"
-            
-            elif action_type == "quitar_item":
-                parts = params.split(',')
-                if len(parts) >= 2:
-                    item_name = parts[0].strip()
-                    quantity = int(parts[1].strip())
-                    return f"Pierdes {quantity}x {item_name}"
-                return "Error en formato: quitar_item@nombre_item,cantidad"
-            
-            elif action_type == "efecto":
-                return f"Efecto aplicado: {params}"
-            
-            elif action_type == "teleport":
-                return f"Teletransporte a: {params}"
-            
-            else:
-                return f"Tipo de acción desconocido: {action_type}"
-                
-        except Exception as e:
-            return f"Error ejecutando acción: {str(e)}"
+    async def _parse_actions(self, guild_id: str, actions_str: str):
+        """Parsea varias acciones separadas por ';' y comprueba que se puedan compilar"""
+        acciones = []
+        for parte in actions_str.split(';'):
+            if not parte.strip():
+                continue
+            accion, error = self._parse_action(parte)
+            if error:
+                return None, error
+            try:
+                compilar_accion(accion['type'], accion['params'])
+                if accion['type'] in ("dar_item", "quitar_item"):
+                    item_name, _ = parsear_item(accion['type'], accion['params'])
+                    if not await self.bot.items.by_name(guild_id, item_name):
+                        return None, f"El item **{item_name}** no existe en este servidor."
+            except (ProgramError, DiceError) as e:
+                return None, str(e)
+            acciones.append(accion)
 
-    def _check_requirement(self, req_type: str, value: str, user: discord.Member, guild_id: str):
-        """Verifica si un usuario cumple un requisito - Solo objetos y roles"""
-        cur = self.conn.cursor()
-        
-        try:
-            if req_type == "rol":
-                # Verificar si el usuario tiene el rol
-                role = discord.utils.get(user.roles, name=value)
-                return role is not None
-                
-            elif req_type == "item":
-                # Verificar si tiene el item
-                parts = value.split(',')
-                item_name = parts[0].strip()
-                quantity = int(parts[1].strip()) if len(parts) > 1 else 1
-                
-                cur.execute("""
-                    SELECT inv.quantity FROM inventory inv
-                    JOIN characters c ON inv.character_id = c.id
-                    JOIN items i ON inv.item_id = i.id
-                    WHERE c.user_id=%s AND c.guild_id=%s AND c.approved=true AND i.name ILIKE %s
-                """, (str(user.id), guild_id, item_name))
-                result = cur.fetchone()
-                return result and result[0] >= quantity
-                
-            else:
-                return False
-                
-        finally:
-            cur.close()
+        if not acciones:
+            return None, "Formato incorrecto. Usa: tipo@parametros"
+        if len(acciones) > MAX_ACCIONES:
+            return None, f"Un comando admite como máximo {MAX_ACCIONES} acciones."
+        # Una sola acción se guarda como antes (objeto); varias, como lista
+        return (acciones[0] if len(acciones) == 1 else acciones), None
+
+    @staticmethod
+    def _texto_acciones(main_action):
+        """tipo@params; tipo@params ... tal y como se escribió al crear el comando"""
+        if isinstance(main_action, str):
+            main_action = json.loads(main_action)
+        return "; ".join(f"{a['type']}@{a['params']}" for a in acciones_de(main_action))
 
     # Comandos de administración
     @comando.command(name="crear", description="Crea un nuevo comando personalizado")
@@ -138,7 +212,7 @@ class CustomCommands(commands.Cog):
     @app_commands.describe(
         nombre="Nombre del comando (se usará con .nombre)",
         descripcion="Descripción del comando",
-        accion_principal="Acción principal (tipo@parametros)",
+        accion_principal="Acciones (tipo@parametros; tipo@parametros...) que se ejecutan juntas",
         requisito1="Requisito 1 (opcional) - formato: tipo:valor (solo rol o item)",
         requisito2="Requisito 2 (opcional)",
         requisito3="Requisito 3 (opcional)", 
@@ -153,207 +227,199 @@ class CustomCommands(commands.Cog):
                           requisito3: str = None,
                           mensaje_respuesta: str = None):
         
-        cur = self.conn.cursor()
-        try:
-            # Verificar que el nombre no exista
-            cur.execute("SELECT id FROM custom_commands WHERE guild_id=%s AND name=%s", 
-                       (str(interaction.guild.id), nombre.lower()))
-            if cur.fetchone():
-                await interaction.response.send_message("Ya existe un comando con ese nombre.", ephemeral=True)
-                return
+        # Parsear acción principal (los items se buscan en el catálogo antes de
+        # tomar una conexión del pool)
+        accion, error = await self._parse_actions(str(interaction.guild.id), accion_principal)
+        if error:
+            await interaction.response.send_message(f"{error}", ephemeral=True)
+            return
 
-            # Parsear acción principal
-            accion, error = self._parse_action(accion_principal)
-            if error:
-                await interaction.response.send_message(f"{error}", ephemeral=True)
-                return
+        # Parsear requisitos
+        requisitos = []
+        for req in [requisito1, requisito2, requisito3]:
+            if req:
+                requisito_parsed, error = self._parse_requirement(req)
+                if error:
+                    await interaction.response.send_message(f"{error}", ephemeral=True)
+                    return
+                requisitos.append(requisito_parsed)
 
-            # Parsear requisitos
-            requisitos = []
-            for req in [requisito1, requisito2, requisito3]:
-                if req:
-                    requisito_parsed, error = self._parse_requirement(req)
-                    if error:
-                        await interaction.response.send_message(f"{error}", ephemeral=True)
-                        return
-                    requisitos.append(requisito_parsed)
-
-            # Insertar en la base de datos
-            cur.execute("""
-                INSERT INTO custom_commands 
-                (guild_id, name, description, main_action, requirements, response_message, created_by)
-                VALUES (%s, %s, %s, %s::jsonb, %s::jsonb, %s, %s)
-            """, (
-                str(interaction.guild.id),
-                nombre.lower(),
-                descripcion,
-                json.dumps(accion),
-                json.dumps(requisitos),
-                mensaje_respuesta,
-                str(interaction.user.id)
-            ))
-            
-            self.conn.commit()
-            
-            embed = discord.Embed(
-                title="Comando Personalizado Creado",
-                description=f"El comando `.{nombre}` ha sido creado exitosamente.",
-                color=discord.Color.dark_gold()
+        try:
+            creado = await self.db.run(
+                self._crear_tx, str(interaction.guild.id), nombre.lower(), descripcion,
+                accion, requisitos, mensaje_respuesta, str(interaction.user.id)
             )
-            embed.add_field(name="Descripción", value=descripcion, inline=False)
-            embed.add_field(name="Acción Principal", value=accion_principal, inline=False)
-            embed.add_field(name="Requisitos", value=str(len(requisitos)) or "Ninguno", inline=True)
-            
-            await interaction.response.send_message(embed=embed)
-            
         except Exception as e:
             await interaction.response.send_message(f"❌ Error al crear el comando: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not creado:
+            await interaction.response.send_message("Ya existe un comando con ese nombre.", ephemeral=True)
+            return
+
+        self._programas.get(str(interaction.guild.id), {}).pop(nombre.lower(), None)
+        self._nombres.setdefault(str(interaction.guild.id), set()).add(nombre.lower())
+
+        embed = discord.Embed(
+            title="Comando Personalizado Creado",
+            description=f"El comando `.{nombre}` ha sido creado exitosamente.",
+            color=discord.Color.dark_gold()
+        )
+        embed.add_field(name="Descripción", value=descripcion, inline=False)
+        embed.add_field(name="Acción Principal", value=accion_principal, inline=False)
+        embed.add_field(name="Requisitos", value=str(len(requisitos)) or "Ninguno", inline=True)
+
+        await interaction.response.send_message(embed=embed)
+
+    def _crear_tx(self, cur, guild_id, nombre, descripcion, accion, requisitos, mensaje_respuesta, created_by):
+        # Verificar que el nombre no exista
+        cur.execute("SELECT id FROM custom_commands WHERE guild_id=%s AND name=%s", (guild_id, nombre))
+        if cur.fetchone():
+            return False
+
+        cur.execute("""
+            INSERT INTO custom_commands 
+            (guild_id, name, description, main_action, requirements, response_message, created_by)
+            VALUES (%s, %s, %s, %s::jsonb, %s::jsonb, %s, %s)
+        """, (
+            guild_id,
+            nombre,
+            descripcion,
+            json.dumps(accion),
+            json.dumps(requisitos),
+            mensaje_respuesta,
+            created_by
+        ))
+        return True
 
     @comando.command(name="eliminar", description="Elimina un comando personalizado")
     @app_commands.checks.has_permissions(administrator=True)
     async def eliminar_comando(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
-        try:
-            cur.execute("DELETE FROM custom_commands WHERE guild_id=%s AND name=%s", 
-                       (str(interaction.guild.id), nombre.lower()))
-            
-            if cur.rowcount > 0:
-                await interaction.response.send_message(f"Comando `.{nombre}` eliminado.", ephemeral=True)
-            else:
-                await interaction.response.send_message("Comando no encontrado.", ephemeral=True)
-                
-            self.conn.commit()
-        finally:
-            cur.close()
+        eliminado = await self.db.run(self._eliminar_tx, str(interaction.guild.id), nombre.lower())
+        if eliminado:
+            self._olvidar_programa(str(interaction.guild.id), nombre.lower())
+            await interaction.response.send_message(f"Comando `.{nombre}` eliminado.", ephemeral=True)
+        else:
+            await interaction.response.send_message("Comando no encontrado.", ephemeral=True)
+
+    def _eliminar_tx(self, cur, guild_id, nombre):
+        cur.execute("DELETE FROM custom_commands WHERE guild_id=%s AND name=%s", (guild_id, nombre))
+        return cur.rowcount > 0
 
     @comando.command(name="lista", description="Lista todos los comandos personalizados del servidor")
     async def lista_comandos(self, interaction: discord.Interaction):
-        cur = self.conn.cursor()
         try:
-            cur.execute("""
-                SELECT name, description, main_action, requirements 
-                FROM custom_commands 
-                WHERE guild_id=%s 
-                ORDER BY name
-            """, (str(interaction.guild.id),))
-            
-            comandos = cur.fetchall()
-            
-            if not comandos:
-                embed = discord.Embed(
-                    title="Comandos Personalizados",
-                    description="No hay comandos personalizados en este servidor.",
-                    color=discord.Color.dark_gold()
-                )
-                await interaction.response.send_message(embed=embed)
-                return
-            
-            embed = discord.Embed(
-                title=f"Comandos Personalizados ({len(comandos)})",
-                color=discord.Color.dark_gold()
-            )
-            
-            for name, description, main_action, requirements in comandos:
-                # Parsear correctamente el JSON
-                try:
-                    if isinstance(main_action, str):
-                        accion = json.loads(main_action)
-                    else:
-                        accion = main_action
-                    accion_str = f"{accion['type']}@{accion['params']}"
-                except:
-                    accion_str = "Error parsing action"
-                
-                try:
-                    if isinstance(requirements, str):
-                        reqs = json.loads(requirements)
-                    else:
-                        reqs = requirements or []
-                    requisitos_str = "\n".join([f"- {req['type']}: {req['value']}" for req in reqs]) if reqs else "Sin requisitos"
-                except:
-                    requisitos_str = "Error parsing requirements"
-                
-                embed.add_field(
-                    name=f".{name}",
-                    value=f"**Descripción:** {description}\n**Acción:** {accion_str}\n**Requisitos:**\n{requisitos_str}",
-                    inline=False
-                )
-            
-            await interaction.response.send_message(embed=embed)
-            
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    SELECT name, description, main_action, requirements 
+                    FROM custom_commands 
+                    WHERE guild_id=%s 
+                    ORDER BY name
+                """, (str(interaction.guild.id),))
+                comandos = cur.fetchall()
         except Exception as e:
             await interaction.response.send_message(f"Error al listar comandos: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
 
-    @comando.command(name="info", description="Muestra información detallada de un comando")
-    async def info_comando(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
-        try:
-            cur.execute("""
-                SELECT name, description, main_action, requirements, response_message, created_by
-                FROM custom_commands 
-                WHERE guild_id=%s AND name=%s
-            """, (str(interaction.guild.id), nombre.lower()))
-            
-            comando = cur.fetchone()
-            
-            if not comando:
-                await interaction.response.send_message("Comando no encontrado.", ephemeral=True)
-                return
-            
-            name, description, main_action, requirements, response_message, created_by = comando
-            
+        if not comandos:
             embed = discord.Embed(
-                title=f"Información del comando .{name}",
+                title="Comandos Personalizados",
+                description="No hay comandos personalizados en este servidor.",
                 color=discord.Color.dark_gold()
             )
-            
-            embed.add_field(name="Descripción", value=description, inline=False)
-            
+            await interaction.response.send_message(embed=embed)
+            return
+
+        embed = discord.Embed(
+            title=f"Comandos Personalizados ({len(comandos)})",
+            color=discord.Color.dark_gold()
+        )
+
+        for name, description, main_action, requirements in comandos:
             # Parsear correctamente el JSON
             try:
-                if isinstance(main_action, str):
-                    accion = json.loads(main_action)
-                else:
-                    accion = main_action
-                embed.add_field(name="Acción Principal", value=f"`{accion['type']}@{accion['params']}`", inline=False)
+                accion_str = self._texto_acciones(main_action)
             except:
-                embed.add_field(name="Acción Principal", value="Error parsing action", inline=False)
-            
+                accion_str = "Error parsing action"
+
             try:
                 if isinstance(requirements, str):
                     reqs = json.loads(requirements)
                 else:
                     reqs = requirements or []
-                if reqs:
-                    requisitos_str = "\n".join([f"- **{req['type']}:** {req['value']}" for req in reqs])
-                    embed.add_field(name="Requisitos", value=requisitos_str, inline=False)
-                else:
-                    embed.add_field(name="Requisitos", value="Ninguno", inline=False)
-            except:
-                embed.add_field(name="Requisitos", value="Error parsing requirements", inline=False)
-            
-            if response_message:
-                embed.add_field(name="Mensaje Adicional", value=response_message, inline=False)
-            
-            # Obtener información del creador
-            try:
-                creator = await interaction.guild.fetch_member(int(created_by))
-                creator_name = creator.display_name if creator else "Usuario no encontrado"
+                requisitos_str = "\n".join([f"- {req['type']}: {req['value']}" for req in reqs]) if reqs else "Sin requisitos"
             except:
-                creator_name = "Usuario no encontrado"
-            
-            embed.set_footer(text=f"Creado por: {creator_name}")
-            
-            await interaction.response.send_message(embed=embed)
-            
+                requisitos_str = "Error parsing requirements"
+
+            embed.add_field(
+                name=f".{name}",
+                value=f"**Descripción:** {description}\n**Acción:** {accion_str}\n**Requisitos:**\n{requisitos_str}",
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed)
+
+    @comando.command(name="info", description="Muestra información detallada de un comando")
+    async def info_comando(self, interaction: discord.Interaction, nombre: str):
+        try:
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    SELECT name, description, main_action, requirements, response_message, created_by
+                    FROM custom_commands 
+                    WHERE guild_id=%s AND name=%s
+                """, (str(interaction.guild.id), nombre.lower()))
+                comando = cur.fetchone()
         except Exception as e:
             await interaction.response.send_message(f"Error: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # Desde aquí la conexión ya está devuelta al pool: fetch_member y la respuesta no la retienen
+        if not comando:
+            await interaction.response.send_message("Comando no encontrado.", ephemeral=True)
+            return
+
+        name, description, main_action, requirements, response_message, created_by = comando
+
+        embed = discord.Embed(
+            title=f"Información del comando .{name}",
+            color=discord.Color.dark_gold()
+        )
+
+        embed.add_field(name="Descripción", value=description, inline=False)
+
+        # Parsear correctamente el JSON
+        try:
+            embed.add_field(name="Acción Principal", value=f"`{self._texto_acciones(main_action)}`", inline=False)
+        except:
+            embed.add_field(name="Acción Principal", value="Error parsing action", inline=False)
+
+        try:
+            if isinstance(requirements, str):
+                reqs = json.loads(requirements)
+            else:
+                reqs = requirements or []
+            if reqs:
+                requisitos_str = "\n".join([f"- **{req['type']}:** {req['value']}" for req in reqs])
+                embed.add_field(name="Requisitos", value=requisitos_str, inline=False)
+            else:
+                embed.add_field(name="Requisitos", value="Ninguno", inline=False)
+        except:
+            embed.add_field(name="Requisitos", value="Error parsing requirements", inline=False)
+
+        if response_message:
+            embed.add_field(name="Mensaje Adicional", value=response_message, inline=False)
+
+        # Obtener información del creador
+        try:
+            creator = await interaction.guild.fetch_member(int(created_by))
+            creator_name = creator.display_name if creator else "Usuario no encontrado"
+        except:
+            creator_name = "Usuario no encontrado"
+
+        embed.set_footer(text=f"Creado por: {creator_name}")
+
+        await interaction.response.send_message(embed=embed)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(CustomCommands(bot))
\ No newline at end of file
@@ -1,134 +1,136 @@
-import random
-import re
+import asyncio
+import io
+
 import discord
 from discord import app_commands
 from discord.ext import commands
+from utils.dice import MAX_REPETICIONES, DiceError, procesar_expresion, separar_repeticiones, tirar_lote
+from utils.dice_stats import distribucion, enfrentar, histograma, resumen
+
+
+# Límite de caracteres de un mensaje de Discord; por encima se adjunta un fichero
+LIMITE_MENSAJE = 2000
+
+# Resultados por línea en una tirada en lote
+RESULTADOS_POR_LINEA = 5
 
 
 class Dados(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        
-    @app_commands.command(
-        name="dados",
+
+    dados = app_commands.Group(name="dados", description="Tiradas y probabilidades de dados")
+
+    @dados.command(
+        name="tirar",
         description="Tira dados con notación tipo 2d6+3"
     )
-    @app_commands.describe(expresion="Ej: 2d6+3 o 1d20")
-    async def dados(self, interaction: discord.Interaction, expresion: str = "1d6"):
+    @app_commands.describe(
+        expresion="Ej: 2d6+3, 4d6kh3, 3d6!, 1d10r1 o 10d10>=7 (30# 1d20+5 para tirarla 30 veces)",
+        repeticiones=f"Cuántas veces tirar la expresión (máx. {MAX_REPETICIONES})"
+    )
+    async def tirar(self, interaction: discord.Interaction, expresion: str = "1d6",
+                    repeticiones: app_commands.Range[int, 1, MAX_REPETICIONES] = 1):
         try:
-            resultado, detalles, expandida = self.procesar_expresion(expresion)
-            
-            respuesta = f"``Tirada de: {interaction.user}``"
-            respuesta += f"\n```{detalles}```"
-            respuesta += f"``Resultado: {resultado}``\n"
-            
-            await interaction.response.send_message(respuesta)
-            
-        except Exception:
-            await interaction.response.send_message("``Error en la tirada``", ephemeral=True)
-
-    def procesar_expresion(self, expresion):
-        detalles = []
-        partes_expandida = []  
-
-        def reemplazar_dado(match):
-            cantidad = int(match.group(1)) if match.group(1) else 1
-            caras = int(match.group(2))
-            if cantidad < 1 or caras < 1:
-                raise ValueError("Cantidad y caras deben ser al menos 1")
+            respuesta, archivo = self.respuesta_tirada(interaction.user, expresion, repeticiones)
+            extra = {"file": archivo} if archivo else {}
+            await interaction.response.send_message(respuesta, **extra)
 
-            tiradas = [random.randint(1, caras) for _ in range(cantidad)]
-            total_dado = sum(tiradas)
-
-            detalle = f"- {cantidad}d{caras}: {', '.join(str(t) for t in tiradas)} = {total_dado}"
-            detalles.append(detalle)
-
-            partes_expandida.append("(" + "+".join(map(str, tiradas)) + ")")
-
-            return str(total_dado)
-
-
-        expresion_numerica = re.sub(r'(\d*)d(\d+)', reemplazar_dado, expresion)
-
-
-        expresion_expandida = expresion
-        for bloque in partes_expandida:
-            expresion_expandida = re.sub(r'\d+', bloque, expresion_expandida, 1)
-
-        if not re.match(r'^[\d\s+\-*/().]+$', expresion_numerica):
-            raise ValueError("La expresión contiene caracteres no permitidos")
-
-        try:
-            resultado = eval(expresion_numerica)
+        except DiceError as e:
+            await interaction.response.send_message(f"``Error en la tirada: {e}``", ephemeral=True)
         except Exception:
-            raise ValueError("Expresión matemática inválida")
-
-        return resultado, "\n".join(detalles), expresion_expandida
-
-
-
-
-
-
-
-
-
-
-
-
-
+            await interaction.response.send_message("``Error en la tirada``", ephemeral=True)
 
     @commands.command(aliases=[ 'r', 'tirar'])
     async def roll(self, ctx, *, expresion: str = "1d6"):
         try:
-            resultado, detalles, expandida = self.procesar_expresion(expresion)
-            
-            respuesta = f"``Tirada de: {ctx.author}``"
-            respuesta += f"\n```{detalles}```"
-            respuesta += f"``Resultado: {resultado}``\n"
-            
-            await ctx.send(respuesta)
-            
+            respuesta, archivo = self.respuesta_tirada(ctx.author, expresion)
+            await ctx.send(respuesta, file=archivo)
+
+        except DiceError as e:
+            await ctx.send(f"``Error: {e}``")
         except Exception:
             await ctx.send(f"``Error``")
 
-    def procesar_expresion(self, expresion):
-        detalles = []
-        partes_expandida = []  
-
-        def reemplazar_dado(match):
-            cantidad = int(match.group(1)) if match.group(1) else 1
-            caras = int(match.group(2))
-            if cantidad < 1 or caras < 1:
-                raise ValueError("Cantidad y caras deben ser al menos 1")
-
-            tiradas = [random.randint(1, caras) for _ in range(cantidad)]
-            total_dado = sum(tiradas)
+    def respuesta_tirada(self, autor, expresion, repeticiones=1):
+        """Texto de la tirada y, si no cabe en un mensaje, el fichero adjunto (o None).
 
-            detalle = f"- {cantidad}d{caras}: {', '.join(str(t) for t in tiradas)} = {total_dado}"
-            detalles.append(detalle)
-
-            partes_expandida.append("(" + "+".join(map(str, tiradas)) + ")")
-
-            return str(total_dado)
-
-
-        expresion_numerica = re.sub(r'(\d*)d(\d+)', reemplazar_dado, expresion)
-
-
-        expresion_expandida = expresion
-        for bloque in partes_expandida:
-            expresion_expandida = re.sub(r'\d+', bloque, expresion_expandida, 1)
-
-        if not re.match(r'^[\d\s+\-*/().]+$', expresion_numerica):
-            raise ValueError("La expresión contiene caracteres no permitidos")
+        Acepta el prefijo de lote "30# 1d20+5" además del parámetro repeticiones.
+        """
+        veces, expresion = separar_repeticiones(expresion)
+        veces = max(veces, repeticiones)
+        if veces == 1:
+            resultado, detalles, expandida = self.procesar_expresion(expresion)
 
+            respuesta = f"``Tirada de: {autor}``"
+            respuesta += f"\n```{detalles}```"
+            respuesta += f"``Resultado: {resultado}``\n"
+            return respuesta, None
+
+        lote = tirar_lote(expresion, veces)
+        resultados = [self._formatear(r) for r in lote.tolist()]
+        ancho = len(str(veces))
+        celdas = [f"#{i:0{ancho}d}: {r:>5}" for i, r in enumerate(resultados, 1)]
+        lineas = [
+            "  ".join(celdas[i:i + RESULTADOS_POR_LINEA])
+            for i in range(0, len(celdas), RESULTADOS_POR_LINEA)
+        ]
+        cabecera = f"``Tirada de: {autor} · {veces}× {expresion.strip()}``"
+        resumen_lote = (
+            f"``Media: {lote.mean():.2f} · Mín: {self._formatear(lote.min().item())} · "
+            f"Máx: {self._formatear(lote.max().item())}``"
+        )
+
+        respuesta = cabecera + "\n```" + "\n".join(lineas) + "```" + resumen_lote
+        if len(respuesta) <= LIMITE_MENSAJE:
+            return respuesta, None
+        contenido = "\n".join(f"#{i}: {r}" for i, r in enumerate(resultados, 1))
+        archivo = discord.File(io.BytesIO(contenido.encode("utf-8")), filename="tiradas.txt")
+        return cabecera + "\n" + resumen_lote + "\n``Resultados en el fichero adjunto``", archivo
+
+    @staticmethod
+    def _formatear(valor):
+        if isinstance(valor, float):
+            return str(int(valor)) if valor.is_integer() else f"{valor:.2f}"
+        return str(valor)
+
+    @dados.command(
+        name="stats",
+        description="Probabilidades exactas de una tirada y, opcionalmente, contra otra"
+    )
+    @app_commands.describe(
+        expresion="Ej: 3d8+2",
+        contra="Tirada rival, ej: 1d12+4"
+    )
+    async def stats(self, interaction: discord.Interaction, expresion: str, contra: str = None):
         try:
-            resultado = eval(expresion_numerica)
+            # El cálculo es NumPy puro: fuera del event loop para no frenar al resto del bot
+            loop = asyncio.get_running_loop()
+            respuesta = await loop.run_in_executor(None, self.respuesta_stats, expresion, contra)
+            await interaction.response.send_message(respuesta)
+
+        except DiceError as e:
+            await interaction.response.send_message(f"``Error en las estadísticas: {e}``", ephemeral=True)
         except Exception:
-            raise ValueError("Expresión matemática inválida")
+            await interaction.response.send_message("``Error en las estadísticas``", ephemeral=True)
+
+    @staticmethod
+    def respuesta_stats(expresion, contra=None):
+        """Texto de /dados stats: resumen, histograma y, si hay rival, probabilidades"""
+        dist = distribucion(expresion)
+        respuesta = f"``Estadísticas de {expresion}``"
+        respuesta += f"\n```{resumen(dist)}\n\n{histograma(dist)}```"
+        if contra:
+            gana, empata, pierde = enfrentar(expresion, contra)
+            respuesta += (
+                f"``Contra {contra}: gana {gana * 100:.1f}% · "
+                f"empata {empata * 100:.1f}% · pierde {pierde * 100:.1f}%``"
+            )
+        return respuesta
 
-        return resultado, "\n".join(detalles), expresion_expandida
+    def procesar_expresion(self, expresion):
+        """Tira una expresión con el motor de utils.dice: (resultado, detalles, expandida)"""
+        return procesar_expresion(expresion)
     
 
 async def setup(bot: commands.Bot):
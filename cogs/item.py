@@ -2,14 +2,15 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import json
+from utils.autocomplete import item_autocomplete
 
 class Items(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     @property
-    def conn(self):
-        return self.bot.conn
+    def db(self):
+        return self.bot.db
 
     item = app_commands.Group(name="item", description="Gestión de ítems del servidor")
 
@@ -98,21 +99,23 @@ class Items(commands.Cog):
         craft: str = None,
         decompose: str = None
     ):
-        cur = self.conn.cursor()
+        guild_id = str(interaction.guild.id)
+        efectos_json = self._parse_json_field(efectos) or {}
+        equipable_bool = equipable.lower() in ['sí', 'si', 's', 'yes', 'y', 'true', '1']
+        # Las recetas se resuelven con el catálogo antes de tomar una conexión del pool
+        craft_json = await self._parse_receta_field(guild_id, craft) or []
+        decompose_json = await self._parse_receta_field(guild_id, decompose) or []
+
+        cur = await self.db.cursor()
         try:
-            # Primero verificamos si el item ya existe
-            cur.execute("SELECT id FROM items WHERE name = %s", (nombre,))
+            # Primero verificamos si el item ya existe en este servidor
+            await cur.execute("SELECT id FROM items WHERE guild_id = %s AND lower(name) = lower(%s)", (guild_id, nombre))
             existing_item = cur.fetchone()
-            
-            efectos_json = self._parse_json_field(efectos) or {}
-            equipable_bool = equipable.lower() in ['sí', 'si', 's', 'yes', 'y', 'true', '1']
-            craft_json = await self._parse_receta_field(craft, cur) or []
-            decompose_json = await self._parse_receta_field(decompose, cur) or []
 
             if existing_item:
                 # ACTUALIZAR ITEM EXISTENTE
                 item_id = existing_item[0]
-                cur.execute("""
+                await cur.execute("""
                     UPDATE items 
                     SET category = %s, 
                         description = %s, 
@@ -142,11 +145,12 @@ class Items(commands.Cog):
                 action_message = f"Item **{nombre}** actualizado con éxito (ID: {item_id})."
             else:
                 # CREAR NUEVO ITEM
-                cur.execute("""
-                    INSERT INTO items (name, category, description, image, effects, max_uses, equipable, attack, defense, craft, decompose)
-                    VALUES (%s, %s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s::jsonb, %s::jsonb)
+                await cur.execute("""
+                    INSERT INTO items (guild_id, name, category, description, image, effects, max_uses, equipable, attack, defense, craft, decompose)
+                    VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s::jsonb, %s::jsonb)
                     RETURNING id
                 """, (
+                    guild_id,
                     nombre, 
                     categoria, 
                     descripcion, 
@@ -163,25 +167,33 @@ class Items(commands.Cog):
                 item_id = cur.fetchone()[0]
                 action_message = f"Item **{nombre}** creado con éxito (ID: {item_id})."
             
-            self.conn.commit()
-            
-            await interaction.response.send_message(
-                f"{action_message}\n"
-                f"Equipable: {'Sí' if equipable_bool else 'No'}\n"
-                f"Usos máximos: {max_usos if max_usos > 0 else 'Ilimitados'}\n"
-                f"Ataque: {ataque or 'No'}\n"
-                f"Defensa: {defensa or 'No'}\n"
-                f"Craft: {len(craft_json)} componentes\n"
-                f"Decompose: {len(decompose_json)} componentes", 
-                ephemeral=True
-            )
-            
+            await cur.commit()
         except Exception as e:
             await interaction.response.send_message(f"No se pudo crear/actualizar el ítem: {str(e)}", ephemeral=True)
+            return
         finally:
-            cur.close()
+            await cur.close()
+
+        # El catálogo recarga el item con su propia conexión, ya devuelta la nuestra
+        await self.bot.items.refresh(guild_id, item_id)
+        if existing_item:
+            # Las tablas de /inventario ver cacheadas muestran usos y nombre del item
+            self.bot.dispatch("inventory_change")
+        else:
+            self.bot.names.add(guild_id, "items", nombre)
 
-    async def _parse_receta_field(self, field_str, cur):
+        await interaction.response.send_message(
+            f"{action_message}\n"
+            f"Equipable: {'Sí' if equipable_bool else 'No'}\n"
+            f"Usos máximos: {max_usos if max_usos > 0 else 'Ilimitados'}\n"
+            f"Ataque: {ataque or 'No'}\n"
+            f"Defensa: {defensa or 'No'}\n"
+            f"Craft: {len(craft_json)} componentes\n"
+            f"Decompose: {len(decompose_json)} componentes", 
+            ephemeral=True
+        )
+
+    async def _parse_receta_field(self, guild_id, field_str):
         """Convierte formato item1*2,item2*3 a [{"item_id": X, "qty": Y}]"""
         if not field_str:
             return []
@@ -194,18 +206,16 @@ class Items(commands.Cog):
                     nombre = nombre.strip()
                     qty = int(qty.strip())
                     
-                    cur.execute("SELECT id FROM items WHERE name=%s", (nombre,))
-                    item_row = cur.fetchone()
+                    item_row = await self.bot.items.by_name(guild_id, nombre)
                     if item_row:
-                        componentes.append({"item_id": item_row[0], "qty": qty})
+                        componentes.append({"item_id": item_row.id, "qty": qty})
                     else:
                         componentes.append({"item_name": nombre, "qty": qty})
                 else:
                     nombre = componente.strip()
-                    cur.execute("SELECT id FROM items WHERE name=%s", (nombre,))
-                    item_row = cur.fetchone()
+                    item_row = await self.bot.items.by_name(guild_id, nombre)
                     if item_row:
-                        componentes.append({"item_id": item_row[0], "qty": 1})
+                        componentes.append({"item_id": item_row.id, "qty": 1})
                     else:
                         componentes.append({"item_name": nombre, "qty": 1})
             
@@ -215,20 +225,34 @@ class Items(commands.Cog):
             return []
 
     @item.command(name="ver", description="Muestra la información de un item")
+    @app_commands.autocomplete(nombre=item_autocomplete)
     async def ver_item(self, interaction: discord.Interaction, nombre: str):
+        cur = await self.db.cursor()
         try:
-            cur = self.conn.cursor()
-            cur.execute("""
+            await cur.execute("""
                 SELECT id, name, category, description, image, effects, max_uses, equipable, attack, defense, craft, decompose
-                FROM items WHERE name=%s
-            """, (nombre,))
+                FROM items WHERE guild_id=%s AND lower(name)=lower(%s)
+            """, (str(interaction.guild.id), nombre))
             row = cur.fetchone()
 
-            if not row:
-                await interaction.response.send_message("No encontré ese item.", ephemeral=True)
-                cur.close()
-                return
+            # La receta del sistema se lee ya: los nombres de los componentes
+            # salen del catálogo, que no se consulta con el cursor abierto
+            recipe_row = None
+            if row:
+                await cur.execute("SELECT components FROM recipes WHERE result_item_id=%s", (row[0],))
+                recipe_row = cur.fetchone()
+        except Exception as e:
+            print(f"Error en ver_item: {e}")
+            await interaction.response.send_message("Ocurrió un error al mostrar el item.", ephemeral=True)
+            return
+        finally:
+            await cur.close()
+
+        if not row:
+            await interaction.response.send_message("No encontré ese item.", ephemeral=True)
+            return
 
+        try:
             (item_id, name, category, description, image, effects, max_uses, equipable, attack, defense, craft, decompose) = row
 
             effects_dict = self._safe_json_load(effects)
@@ -265,36 +289,32 @@ class Items(commands.Cog):
             else:
                 embed.add_field(name="Efectos", value="No tiene efectos definidos", inline=False)
 
-            craft_str = await self._formatear_receta(craft_data, "craft", cur)
+            craft_str = await self._formatear_receta(interaction.guild.id, craft_data, "craft")
             if craft_str:
                 embed.add_field(name="Receta de Crafteo", value=craft_str, inline=False)
-            else:
-                cur.execute("SELECT components FROM recipes WHERE result_item_id=%s", (item_id,))
-                recipe_row = cur.fetchone()
-                if recipe_row:
-                    recipe_components = self._safe_json_load(recipe_row[0])
-                    recipe_str = await self._formatear_receta(recipe_components, "recipe", cur)
-                    if recipe_str:
-                        embed.add_field(name="Receta de Crafteo (Sistema)", value=recipe_str, inline=False)
-                    else:
-                        embed.add_field(name="Crafteo", value="No se puede craftear", inline=False)
+            elif recipe_row:
+                recipe_components = self._safe_json_load(recipe_row[0])
+                recipe_str = await self._formatear_receta(interaction.guild.id, recipe_components, "recipe")
+                if recipe_str:
+                    embed.add_field(name="Receta de Crafteo (Sistema)", value=recipe_str, inline=False)
                 else:
                     embed.add_field(name="Crafteo", value="No se puede craftear", inline=False)
+            else:
+                embed.add_field(name="Crafteo", value="No se puede craftear", inline=False)
 
-            decompose_str = await self._formatear_receta(decompose_data, "decompose", cur)
+            decompose_str = await self._formatear_receta(interaction.guild.id, decompose_data, "decompose")
             if decompose_str:
                 embed.add_field(name="Descompone en", value=decompose_str, inline=False)
             else:
                 embed.add_field(name="Descomposición", value="No se puede descomponer", inline=False)
 
-            cur.close()
             await interaction.response.send_message(embed=embed)
             
         except Exception as e:
             print(f"Error en ver_item: {e}")  
             await interaction.response.send_message("Ocurrió un error al mostrar el item.", ephemeral=True)
 
-    async def _formatear_receta(self, data, tipo, cur):
+    async def _formatear_receta(self, guild_id, data, tipo):
         """Formatea recetas de crafteo/descomposición de manera compatible"""
         if not data:
             return None
@@ -303,16 +323,15 @@ class Items(commands.Cog):
             componentes = []
             
             if isinstance(data, list):
+                names = await self.bot.items.names(guild_id, (comp.get('item_id') for comp in data))
                 for comp in data:
                     item_id = comp.get('item_id')
                     item_name = comp.get('item_name')
                     qty = comp.get('qty', 1)
                     
                     if item_id:
-                        cur.execute("SELECT name FROM items WHERE id=%s", (item_id,))
-                        item_row = cur.fetchone()
-                        if item_row:
-                            componentes.append(f"• **{item_row[0]}** x{qty}")
+                        if item_id in names:
+                            componentes.append(f"• **{names[item_id]}** x{qty}")
                         else:
                             componentes.append(f"• Item ID {item_id} x{qty}")
                     elif item_name:
@@ -331,10 +350,10 @@ class Items(commands.Cog):
     @item.command(name="lista", description="Muestra todos los ítems del servidor")
     async def lista_items(self, interaction: discord.Interaction):
             try:
-                cur = self.conn.cursor()
-                cur.execute("SELECT name, category FROM items ORDER BY name ASC")
-                rows = cur.fetchall()
-                cur.close()
+                async with await self.db.cursor() as cur:
+                    await cur.execute("SELECT name, category FROM items WHERE guild_id=%s ORDER BY name ASC",
+                                      (str(interaction.guild.id),))
+                    rows = cur.fetchall()
 
                 if not rows:
                     await interaction.response.send_message("No hay ítems registrados aún.", ephemeral=True)
@@ -364,72 +383,81 @@ class Items(commands.Cog):
     @item.command(name="eliminar", description="Elimina un item del servidor (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(nombre="Nombre del item a eliminar")
+    @app_commands.autocomplete(nombre=item_autocomplete)
     async def eliminar_item(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
+        guild_id = str(interaction.guild.id)
         try:
-            cur.execute("SELECT name FROM items WHERE name = %s", (nombre,))
-            if not cur.fetchone():
-                await interaction.response.send_message("No existe un item con ese nombre.", ephemeral=True)
-                return
-            
-            cur.execute("DELETE FROM items WHERE name = %s", (nombre,))
-            self.conn.commit()
-            
-            await interaction.response.send_message(f"Item **{nombre}** eliminado correctamente.", ephemeral=True)
-            
+            deleted = await self.db.run(self._eliminar_tx, guild_id, nombre)
         except Exception as e:
             await interaction.response.send_message(f"Error al eliminar el item: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
-    
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not deleted:
+            await interaction.response.send_message("No existe un item con ese nombre.", ephemeral=True)
+            return
+
+        for item_id, item_name in deleted:
+            self.bot.items.remove(guild_id, item_id)
+            self.bot.names.remove(guild_id, "items", item_name)
+        self.bot.dispatch("inventory_change")
+
+        await interaction.response.send_message(f"Item **{nombre}** eliminado correctamente.", ephemeral=True)
+
+    def _eliminar_tx(self, cur, guild_id, nombre):
+        cur.execute("DELETE FROM items WHERE guild_id = %s AND lower(name) = lower(%s) RETURNING id, name",
+                    (guild_id, nombre))
+        return cur.fetchall()
+
     @item.command(name="debug", description="Muestra información de debug de un item")
     @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.autocomplete(nombre=item_autocomplete)
     async def debug_item(self, interaction: discord.Interaction, nombre: str):
         """Comando para diagnosticar problemas con los items"""
         try:
-            cur = self.conn.cursor()
-            cur.execute("""
-                SELECT id, name, category, description, effects, max_uses, equipable, attack, defense, craft, decompose
-                FROM items WHERE name=%s
-            """, (nombre,))
-            row = cur.fetchone()
-
-            if not row:
-                await interaction.response.send_message("Item no encontrado.", ephemeral=True)
-                return
-
-            (item_id, name, category, description, effects, max_uses, equipable, attack, defense, craft, decompose) = row
-            
-            embed = discord.Embed(title=f"Debug: {name}", color=discord.Color.blue())
-            
-            embed.add_field(name="ID", value=item_id, inline=True)
-            embed.add_field(name="Categoría", value=category or "Ninguna", inline=True)
-            embed.add_field(name="Descripción", value=description or "Ninguna", inline=True)
-            
-            # Efectos
-            embed.add_field(name="Effects (crudo)", value=f"`{effects}`", inline=False)
-            effects_parsed = self._safe_json_load(effects) or {}
-            embed.add_field(name="Effects (parseado)", value=f"`{effects_parsed}`", inline=False)
-            embed.add_field(name="Tipo Effects", value=str(type(effects_parsed)), inline=True)
-            
-            # Nuevos campos
-            embed.add_field(name="Max Uses", value=max_uses, inline=True)
-            embed.add_field(name="Equipable", value=equipable, inline=True)
-            embed.add_field(name="Attack", value=attack or "N/A", inline=True)
-            embed.add_field(name="Defense", value=defense or "N/A", inline=True)
-            
-            # Craft y Decompose
-            craft_parsed = self._safe_json_load(craft)
-            decompose_parsed = self._safe_json_load(decompose)
-            
-            embed.add_field(name="Craft (parseado)", value=f"`{craft_parsed}`", inline=False)
-            embed.add_field(name="Decompose (parseado)", value=f"`{decompose_parsed}`", inline=False)
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            cur.close()
-        
+            async with await self.db.cursor() as cur:
+                await cur.execute("""
+                    SELECT id, name, category, description, effects, max_uses, equipable, attack, defense, craft, decompose
+                    FROM items WHERE guild_id=%s AND lower(name)=lower(%s)
+                """, (str(interaction.guild.id), nombre))
+                row = cur.fetchone()
         except Exception as e:
             await interaction.response.send_message(f"Error en debug: {e}", ephemeral=True)
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not row:
+            await interaction.response.send_message("Item no encontrado.", ephemeral=True)
+            return
+
+        (item_id, name, category, description, effects, max_uses, equipable, attack, defense, craft, decompose) = row
+
+        embed = discord.Embed(title=f"Debug: {name}", color=discord.Color.blue())
+
+        embed.add_field(name="ID", value=item_id, inline=True)
+        embed.add_field(name="Categoría", value=category or "Ninguna", inline=True)
+        embed.add_field(name="Descripción", value=description or "Ninguna", inline=True)
+
+        # Efectos
+        embed.add_field(name="Effects (crudo)", value=f"`{effects}`", inline=False)
+        effects_parsed = self._safe_json_load(effects) or {}
+        embed.add_field(name="Effects (parseado)", value=f"`{effects_parsed}`", inline=False)
+        embed.add_field(name="Tipo Effects", value=str(type(effects_parsed)), inline=True)
+
+        # Nuevos campos
+        embed.add_field(name="Max Uses", value=max_uses, inline=True)
+        embed.add_field(name="Equipable", value=equipable, inline=True)
+        embed.add_field(name="Attack", value=attack or "N/A", inline=True)
+        embed.add_field(name="Defense", value=defense or "N/A", inline=True)
+
+        # Craft y Decompose
+        craft_parsed = self._safe_json_load(craft)
+        decompose_parsed = self._safe_json_load(decompose)
+
+        embed.add_field(name="Craft (parseado)", value=f"`{craft_parsed}`", inline=False)
+        embed.add_field(name="Decompose (parseado)", value=f"`{decompose_parsed}`", inline=False)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Items(bot))
\ No newline at end of file
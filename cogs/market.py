@@ -1,27 +1,47 @@
+import asyncio
 import random
-import json
-import math
+import time
 import discord
+import numpy as np
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+from psycopg2.extras import execute_values
+from utils.autocomplete import item_autocomplete, mercado_autocomplete, personaje_autocomplete
+from utils.market_engine import recalcular_listados
+
+# Cada cuánto se buscan mercados con actualización automática pendiente
+TICK_CHECK_MINUTES = 1
+# Mercados procesados a la vez y como máximo por cada comprobación
+TICK_BATCH_SIZE = 5
+TICK_MAX_PER_RUN = 50
+
+# Condición SQL: al mercado "m" le toca actualización automática
+TICK_DUE = """m.tick_interval_minutes IS NOT NULL
+    AND (m.last_tick_at IS NULL
+         OR m.last_tick_at + make_interval(mins => m.tick_interval_minutes) <= now())"""
 
 class Market(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+    async def cog_load(self):
+        self.tick_mercados.start()
+
+    async def cog_unload(self):
+        self.tick_mercados.cancel()
+
     @property
-    def conn(self):
-        return self.bot.conn
+    def db(self):
+        return self.bot.db
 
     mercado = app_commands.Group(name="mercado", description="Sistema de mercados del servidor")
 
-    def _item_id_by_name(self, cur, name: str):
-        """Obtiene el ID de un item por su nombre"""
-        cur.execute("SELECT id FROM items WHERE lower(name)=lower(%s) LIMIT 1", (name,))
-        r = cur.fetchone()
-        return r[0] if r else None
+    async def _item_id_by_name(self, guild_id, name: str):
+        """Obtiene el ID de un item del servidor por su nombre"""
+        item = await self.bot.items.by_name(guild_id, name)
+        return item.id if item else None
 
-    def _parse_price_spec(self, price_spec: str, cur):
+    async def _parse_price_spec(self, guild_id, price_spec: str):
         """Convierte 'madera*2, piedra*1' en lista de componentes"""
         if not price_spec or not price_spec.strip():
             return [], None
@@ -37,7 +57,7 @@ class Market(commands.Cog):
             else:
                 name, qty = p.strip(), 1
             
-            item_id = self._item_id_by_name(cur, name)
+            item_id = await self._item_id_by_name(guild_id, name)
             if not item_id:
                 return None, f"Item no encontrado: {name}"
             
@@ -45,78 +65,108 @@ class Market(commands.Cog):
         
         return price_list, None
 
-    def _format_price_for_display(self, price_json, cur):
-        """Formatea un precio para mostrarlo en la tabla"""
-        if not price_json:
-            return "N/A"
-        
-        try:
-            price_data = json.loads(price_json) if isinstance(price_json, str) else price_json
-            if not price_data or price_data == []:
-                return "GRATIS"
-            
-            components = []
-            for comp in price_data:
-                cur.execute("SELECT name FROM items WHERE id = %s", (comp["item_id"],))
-                item_name = cur.fetchone()[0]
-                components.append(f"{comp['qty']}x{item_name}")
-            
-            return ", ".join(components)
-        except:
-            return "ERROR"
+    def _price_rows(self, prices):
+        """Convierte los precios parseados (slot 1..3) en columnas para listing_prices.
+
+        Un item repetido dentro del mismo precio se agrupa en un solo componente.
+        """
+        slots, item_ids, qtys = [], [], []
+        for slot, price_list in enumerate(prices, start=1):
+            agrupado = {}
+            for comp in price_list or []:
+                agrupado[comp["item_id"]] = agrupado.get(comp["item_id"], 0) + comp["qty"]
+            for item_id, qty in agrupado.items():
+                slots.append(slot)
+                item_ids.append(item_id)
+                qtys.append(qty)
+        return slots, item_ids, qtys
+
+    def _format_price_list(self, price_list, names):
+        """Formatea un precio recién parseado usando un mapa id -> nombre"""
+        if not price_list:
+            return "GRATIS"
+        return ", ".join(f"{comp['qty']}x{names[comp['item_id']]}" for comp in price_list)
+
+    @staticmethod
+    def _precio_agregado(slot):
+        """Columna SQL con el precio de un slot formateado como '2xMadera, 1xOro' (NULL si no tiene)"""
+        return (f"string_agg(lp.qty || 'x' || pi.name, ', ' ORDER BY pi.name) "
+                f"FILTER (WHERE lp.price_slot = {int(slot)})")
+
+    @classmethod
+    def _listados_sql(cls):
+        """Listados de un mercado (market_id) con sus tres precios formateados en una sola consulta"""
+        return f"""
+            SELECT i.name, {cls._precio_agregado(1)}, {cls._precio_agregado(2)}, {cls._precio_agregado(3)},
+                   ml.current_stock
+            FROM market_listings ml
+            JOIN items i ON ml.item_id = i.id
+            LEFT JOIN listing_prices lp ON lp.listing_id = ml.id AND lp.qty IS NOT NULL
+            LEFT JOIN items pi ON pi.id = lp.item_id
+            WHERE ml.market_id = %s
+            GROUP BY ml.id, i.name, ml.current_stock
+            ORDER BY i.name
+        """
 
     @mercado.command(name="crear", description="Crear un mercado en este servidor (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     async def crear_mercado(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
         try:
-            cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)", 
-                       (str(interaction.guild.id), nombre))
-            if cur.fetchone():
-                await interaction.response.send_message("Ya existe un mercado con ese nombre.", ephemeral=True)
-                return
-            
-            cur.execute("INSERT INTO markets (guild_id, name, created_by) VALUES (%s,%s,%s)",
-                        (str(interaction.guild.id), nombre, str(interaction.user.id)))
-            self.conn.commit()
-            
-            embed = discord.Embed(
-                title="Mercado Creado",
-                description=f"El mercado **{nombre}** ha sido creado exitosamente.",
-                color=discord.Color.dark_gold()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            
+            creado = await self.db.run(self._crear_tx, str(interaction.guild.id), nombre, str(interaction.user.id))
         except Exception as e:
             await interaction.response.send_message(f"Error al crear el mercado: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not creado:
+            await interaction.response.send_message("Ya existe un mercado con ese nombre.", ephemeral=True)
+            return
+        self.bot.names.add(interaction.guild.id, "mercados", nombre)
+
+        embed = discord.Embed(
+            title="Mercado Creado",
+            description=f"El mercado **{nombre}** ha sido creado exitosamente.",
+            color=discord.Color.dark_gold()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def _crear_tx(self, cur, guild_id, nombre, user_id):
+        cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)", (guild_id, nombre))
+        if cur.fetchone():
+            return False
+
+        cur.execute("INSERT INTO markets (guild_id, name, created_by) VALUES (%s,%s,%s)",
+                    (guild_id, nombre, user_id))
+        return True
 
     @mercado.command(name="eliminar", description="Eliminar un mercado y sus listados (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.autocomplete(nombre=mercado_autocomplete)
     async def eliminar_mercado(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
         try:
-            cur.execute("DELETE FROM markets WHERE guild_id=%s AND lower(name)=lower(%s) RETURNING id", 
-                       (str(interaction.guild.id), nombre))
-            r = cur.fetchone()
-            if not r:
-                await interaction.response.send_message("No se encontró ese mercado.", ephemeral=True)
-                return
-            
-            self.conn.commit()
-            
-            embed = discord.Embed(
-                title="Mercado Eliminado",
-                description=f"El mercado **{nombre}** ha sido eliminado.",
-                color=discord.Color.dark_gold()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            
+            eliminado = await self.db.run(self._eliminar_tx, str(interaction.guild.id), nombre)
         except Exception as e:
             await interaction.response.send_message(f"Error al eliminar el mercado: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        if not eliminado:
+            await interaction.response.send_message("No se encontró ese mercado.", ephemeral=True)
+            return
+        self.bot.names.remove(interaction.guild.id, "mercados", eliminado)
+
+        embed = discord.Embed(
+            title="Mercado Eliminado",
+            description=f"El mercado **{nombre}** ha sido eliminado.",
+            color=discord.Color.dark_gold()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def _eliminar_tx(self, cur, guild_id, nombre):
+        """Devuelve el nombre del mercado eliminado, o None si no existía"""
+        cur.execute("DELETE FROM markets WHERE guild_id=%s AND lower(name)=lower(%s) RETURNING name",
+                    (guild_id, nombre))
+        r = cur.fetchone()
+        return r[0] if r else None
 
     @mercado.command(name="add_item", description="Añadir un item a un mercado con hasta 3 precios (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
@@ -128,252 +178,243 @@ class Market(commands.Cog):
         precio3="Precio alternativo 2 (opcional)",
         stock_inicial="Stock inicial (opcional)"
     )
+    @app_commands.autocomplete(mercado_nombre=mercado_autocomplete, item_nombre=item_autocomplete)
     async def add_item(self, interaction: discord.Interaction, mercado_nombre: str, item_nombre: str,
                       precio1: str, precio2: str = None, precio3: str = None, stock_inicial: int = None):
-        cur = self.conn.cursor()
         try:
-            # Verificar mercado
-            cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)", 
-                       (str(interaction.guild.id), mercado_nombre))
-            mercado = cur.fetchone()
-            if not mercado:
-                await interaction.response.send_message("Mercado no encontrado.", ephemeral=True)
-                return
-            market_id = mercado[0]
-
-            # Verificar item
-            item_id = self._item_id_by_name(cur, item_nombre)
+            # Item y precios salen del catálogo antes de tomar una conexión del pool
+            item_id = await self._item_id_by_name(interaction.guild.id, item_nombre)
             if not item_id:
                 await interaction.response.send_message("Item no encontrado.", ephemeral=True)
                 return
 
-            # Parsear precios
-            price1, error = self._parse_price_spec(precio1, cur)
-            if error:
-                await interaction.response.send_message(error, ephemeral=True)
-                return
-
-            price2, error = self._parse_price_spec(precio2, cur) if precio2 else ([], None)
-            if error:
-                await interaction.response.send_message(error, ephemeral=True)
-                return
-
-            price3, error = self._parse_price_spec(precio3, cur) if precio3 else ([], None)
-            if error:
-                await interaction.response.send_message(error, ephemeral=True)
-                return
+            prices = []
+            for spec in (precio1, precio2, precio3):
+                price, error = await self._parse_price_spec(interaction.guild.id, spec) if spec else ([], None)
+                if error:
+                    await interaction.response.send_message(error, ephemeral=True)
+                    return
+                prices.append(price)
+            price1, price2, price3 = prices
+            slots, item_ids, qtys = self._price_rows(prices)
+            names = await self.bot.items.names(interaction.guild.id, item_ids)
 
             # Stock inicial
             if stock_inicial is None:
                 stock_inicial = random.randint(1, 10)
 
-            # Insertar en la base de datos
-            cur.execute("""
-                INSERT INTO market_listings 
-                (market_id, item_id, price, price2, price3, initial_price, initial_price2, initial_price3,
-                 initial_stock, base_stock, current_stock)
-                VALUES (%s, %s, %s::jsonb, %s::jsonb, %s::jsonb, %s::jsonb, %s::jsonb, %s::jsonb, %s, %s, %s)
-                ON CONFLICT (market_id, item_id) 
-                DO UPDATE SET 
-                    price = EXCLUDED.price,
-                    price2 = EXCLUDED.price2,
-                    price3 = EXCLUDED.price3,
-                    current_stock = EXCLUDED.current_stock
-            """, (
-                market_id, item_id,
-                json.dumps(price1),
-                json.dumps(price2) if price2 else '[]',
-                json.dumps(price3) if price3 else '[]',
-                json.dumps(price1),
-                json.dumps(price2) if price2 else '[]',
-                json.dumps(price3) if price3 else '[]',
-                stock_inicial, stock_inicial, stock_inicial
-            ))
-            
-            self.conn.commit()
-            
-            embed = discord.Embed(
-                title="Item Añadido al Mercado",
-                description=f"El item **{item_nombre}** ha sido añadido al mercado **{mercado_nombre}**.",
-                color=discord.Color.dark_gold()
+            añadido = await self.db.run(
+                self._add_item_tx, str(interaction.guild.id), mercado_nombre, item_id, stock_inicial,
+                slots, item_ids, qtys
             )
-            embed.add_field(name="Stock inicial", value=str(stock_inicial), inline=True)
-            embed.add_field(name="Precio 1", value=self._format_price_for_display(json.dumps(price1), cur), inline=True)
-            
-            if price2:
-                embed.add_field(name="Precio 2", value=self._format_price_for_display(json.dumps(price2), cur), inline=True)
-            if price3:
-                embed.add_field(name="Precio 3", value=self._format_price_for_display(json.dumps(price3), cur), inline=True)
-            
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-
         except Exception as e:
             await interaction.response.send_message(f"Error al añadir el item: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not añadido:
+            await interaction.response.send_message("Mercado no encontrado.", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title="Item Añadido al Mercado",
+            description=f"El item **{item_nombre}** ha sido añadido al mercado **{mercado_nombre}**.",
+            color=discord.Color.dark_gold()
+        )
+        embed.add_field(name="Stock inicial", value=str(stock_inicial), inline=True)
+        embed.add_field(name="Precio 1", value=self._format_price_list(price1, names), inline=True)
+
+        if price2:
+            embed.add_field(name="Precio 2", value=self._format_price_list(price2, names), inline=True)
+        if price3:
+            embed.add_field(name="Precio 3", value=self._format_price_list(price3, names), inline=True)
+
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def _add_item_tx(self, cur, guild_id, mercado_nombre, item_id, stock_inicial, slots, item_ids, qtys):
+        """Unidad de trabajo de /mercado add_item. Devuelve False si el mercado no existe"""
+        # Verificar mercado
+        cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)",
+                    (guild_id, mercado_nombre))
+        mercado = cur.fetchone()
+        if not mercado:
+            return False
+        market_id = mercado[0]
+
+        # Insertar el listado y reemplazar sus componentes de precio
+        cur.execute("""
+            INSERT INTO market_listings (market_id, item_id, initial_stock, base_stock, current_stock)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (market_id, item_id) 
+            DO UPDATE SET current_stock = EXCLUDED.current_stock
+            RETURNING id
+        """, (market_id, item_id, stock_inicial, stock_inicial, stock_inicial))
+        listing_id = cur.fetchone()[0]
+
+        cur.execute("DELETE FROM listing_prices WHERE listing_id=%s", (listing_id,))
+        cur.execute("""
+            INSERT INTO listing_prices (listing_id, price_slot, item_id, qty, initial_qty)
+            SELECT %s, p.slot, p.item_id, p.qty, p.qty
+            FROM unnest(%s::smallint[], %s::int[], %s::int[]) AS p(slot, item_id, qty)
+        """, (listing_id, slots, item_ids, qtys))
+        return True
 
     @mercado.command(name="remove_item", description="Quitar un item de un mercado (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.autocomplete(mercado_nombre=mercado_autocomplete, item_nombre=item_autocomplete)
     async def remove_item(self, interaction: discord.Interaction, mercado_nombre: str, item_nombre: str):
-        cur = self.conn.cursor()
-        try:
-            cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)", 
-                       (str(interaction.guild.id), mercado_nombre))
-            mercado = cur.fetchone()
-            if not mercado:
-                await interaction.response.send_message("Mercado no encontrado.", ephemeral=True)
-                return
-            market_id = mercado[0]
+        # El item sale del catálogo antes de tomar una conexión del pool
+        item_id = await self._item_id_by_name(interaction.guild.id, item_nombre)
+        if not item_id:
+            await interaction.response.send_message("Item no encontrado.", ephemeral=True)
+            return
 
-            item_id = self._item_id_by_name(cur, item_nombre)
-            if not item_id:
-                await interaction.response.send_message("Item no encontrado.", ephemeral=True)
-                return
-
-            cur.execute("DELETE FROM market_listings WHERE market_id=%s AND item_id=%s RETURNING id", 
-                       (market_id, item_id))
-            resultado = cur.fetchone()
-            
-            if not resultado:
-                await interaction.response.send_message("Este item no estaba en el mercado.", ephemeral=True)
-                return
-            
-            self.conn.commit()
-            
-            embed = discord.Embed(
-                title="Item Removido",
-                description=f"El item **{item_nombre}** ha sido removido del mercado **{mercado_nombre}**.",
-                color=discord.Color.dark_gold()
-            )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            
+        try:
+            error = await self.db.run(self._remove_item_tx, str(interaction.guild.id), mercado_nombre, item_id)
         except Exception as e:
             await interaction.response.send_message(f"Error al remover el item: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title="Item Removido",
+            description=f"El item **{item_nombre}** ha sido removido del mercado **{mercado_nombre}**.",
+            color=discord.Color.dark_gold()
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def _remove_item_tx(self, cur, guild_id, mercado_nombre, item_id):
+        """Devuelve el mensaje de error, o None si se quitó el listado"""
+        cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)",
+                    (guild_id, mercado_nombre))
+        mercado = cur.fetchone()
+        if not mercado:
+            return "Mercado no encontrado."
+
+        cur.execute("DELETE FROM market_listings WHERE market_id=%s AND item_id=%s RETURNING id",
+                    (mercado[0], item_id))
+        if not cur.fetchone():
+            return "Este item no estaba en el mercado."
+        return None
 
     @mercado.command(name="lista", description="Lista todos los mercados del servidor")
     async def lista_mercados(self, interaction: discord.Interaction):
-        cur = self.conn.cursor()
         try:
-            cur.execute("SELECT name FROM markets WHERE guild_id=%s ORDER BY name", 
-                       (str(interaction.guild.id),))
-            mercados = [row[0] for row in cur.fetchall()]
-            
-            if not mercados:
-                embed = discord.Embed(
-                    title="Mercados del Servidor",
-                    description="No hay mercados creados en este servidor.",
-                    color=discord.Color.dark_gold()
-                )
-            else:
-                embed = discord.Embed(
-                    title="Mercados del Servidor",
-                    description="\n".join([f"• {nombre}" for nombre in mercados]),
-                    color=discord.Color.dark_gold()
-                )
-            
-            await interaction.response.send_message(embed=embed)
-            
+            async with await self.db.cursor() as cur:
+                await cur.execute("SELECT name FROM markets WHERE guild_id=%s ORDER BY name", 
+                           (str(interaction.guild.id),))
+                mercados = [row[0] for row in cur.fetchall()]
         except Exception as e:
             await interaction.response.send_message("Error al obtener la lista de mercados.", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not mercados:
+            embed = discord.Embed(
+                title="Mercados del Servidor",
+                description="No hay mercados creados en este servidor.",
+                color=discord.Color.dark_gold()
+            )
+        else:
+            embed = discord.Embed(
+                title="Mercados del Servidor",
+                description="\n".join([f"• {nombre}" for nombre in mercados]),
+                color=discord.Color.dark_gold()
+            )
+
+        await interaction.response.send_message(embed=embed)
 
     @mercado.command(name="ver", description="Muestra los items y precios de un mercado en formato tabla")
+    @app_commands.autocomplete(mercado_nombre=mercado_autocomplete)
     async def ver_mercado(self, interaction: discord.Interaction, mercado_nombre: str):
-        cur = self.conn.cursor()
         try:
-            # Verificar mercado
-            cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)", 
-                       (str(interaction.guild.id), mercado_nombre))
-            mercado = cur.fetchone()
-            if not mercado:
-                await interaction.response.send_message("Mercado no encontrado.", ephemeral=True)
-                return
-            market_id = mercado[0]
+            items = await self.db.run(self._ver_tx, str(interaction.guild.id), mercado_nombre)
+        except Exception as e:
+            await interaction.response.send_message(f"Error al mostrar el mercado: {str(e)}", ephemeral=True)
+            return
 
-            # Obtener items del mercado
-            cur.execute("""
-                SELECT i.name, ml.price, ml.price2, ml.price3, ml.current_stock
-                FROM market_listings ml
-                JOIN items i ON ml.item_id = i.id
-                WHERE ml.market_id = %s
-                ORDER BY i.name
-            """, (market_id,))
-            
-            items = cur.fetchall()
+        # La tabla se arma y se envía con la conexión ya devuelta al pool
+        if items is None:
+            await interaction.response.send_message("Mercado no encontrado.", ephemeral=True)
+            return
 
-            if not items:
-                embed = discord.Embed(
-                    title=f"Mercado: {mercado_nombre}",
-                    description="Este mercado no tiene items disponibles.",
-                    color=discord.Color.dark_gold()
-                )
-                await interaction.response.send_message(embed=embed)
-                return
-
-            # Crear tabla mejorada con todos los precios
-            table_lines = []
-            table_lines.append("```")
-            table_lines.append("ITEM                 | STOCK | PRECIO 1")
-            table_lines.append("-" * 50)
-
-            # Primera pasada: mostrar solo precio principal en la tabla principal
-            for name, price1, price2, price3, stock in items:
-                # Formatear nombre
-                name_display = name[:18] + ".." if len(name) > 20 else name.ljust(20)
-                
-                # Formatear stock
-                stock_display = str(stock).ljust(5)
-                
-                # Formatear precio 1
-                precio1_display = self._format_price_for_display(price1, cur)
-                if len(precio1_display) > 25:
-                    precio1_display = precio1_display[:22] + "..."
-                precio1_display = precio1_display.ljust(25)
-                
-                table_lines.append(f"{name_display} | {stock_display} | {precio1_display}")
-
-            table_lines.append("```")
-
-            # Crear embed principal
+        if not items:
             embed = discord.Embed(
                 title=f"Mercado: {mercado_nombre}",
-                description="\n".join(table_lines),
+                description="Este mercado no tiene items disponibles.",
                 color=discord.Color.dark_gold()
             )
+            await interaction.response.send_message(embed=embed)
+            return
 
-            # Segunda pasada: agregar precios alternativos SOLO si existen, en fields organizados
-            alternative_prices_exist = False
-            alternative_fields = []
-            
-            for name, price1, price2, price3, stock in items:
-                price2_display = self._format_price_for_display(price2, cur) if price2 and price2 != '[]' else None
-                price3_display = self._format_price_for_display(price3, cur) if price3 and price3 != '[]' else None
-                
-                if price2_display and price2_display != "N/A":
-                    alternative_prices_exist = True
-                    alternative_fields.append(f"**{name} - Precio 2:** {price2_display}")
-                
-                if price3_display and price3_display != "N/A":
-                    alternative_prices_exist = True
-                    alternative_fields.append(f"**{name} - Precio 3:** {price3_display}")
-
-            # Agregar precios alternativos como un solo field organizado
-            if alternative_prices_exist:
-                embed.add_field(
-                    name="Precios Alternativos",
-                    value="\n".join(alternative_fields) if alternative_fields else "No hay precios alternativos",
-                    inline=False
-                )
+        # Crear tabla mejorada con todos los precios
+        table_lines = []
+        table_lines.append("```")
+        table_lines.append("ITEM                 | STOCK | PRECIO 1")
+        table_lines.append("-" * 50)
 
-            await interaction.response.send_message(embed=embed)
+        # Primera pasada: mostrar solo precio principal en la tabla principal
+        for name, price1, price2, price3, stock in items:
+            # Formatear nombre
+            name_display = name[:18] + ".." if len(name) > 20 else name.ljust(20)
 
-        except Exception as e:
-            await interaction.response.send_message(f"Error al mostrar el mercado: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            # Formatear stock
+            stock_display = str(stock).ljust(5)
+
+            # Formatear precio 1
+            precio1_display = price1 or "N/A"
+            if len(precio1_display) > 25:
+                precio1_display = precio1_display[:22] + "..."
+            precio1_display = precio1_display.ljust(25)
+
+            table_lines.append(f"{name_display} | {stock_display} | {precio1_display}")
+
+        table_lines.append("```")
+
+        # Crear embed principal
+        embed = discord.Embed(
+            title=f"Mercado: {mercado_nombre}",
+            description="\n".join(table_lines),
+            color=discord.Color.dark_gold()
+        )
+
+        # Segunda pasada: agregar precios alternativos SOLO si existen, en fields organizados
+        alternative_prices_exist = False
+        alternative_fields = []
+
+        for name, price1, price2, price3, stock in items:
+            if price2:
+                alternative_prices_exist = True
+                alternative_fields.append(f"**{name} - Precio 2:** {price2}")
+
+            if price3:
+                alternative_prices_exist = True
+                alternative_fields.append(f"**{name} - Precio 3:** {price3}")
+
+        # Agregar precios alternativos como un solo field organizado
+        if alternative_prices_exist:
+            embed.add_field(
+                name="Precios Alternativos",
+                value="\n".join(alternative_fields) if alternative_fields else "No hay precios alternativos",
+                inline=False
+            )
+
+        await interaction.response.send_message(embed=embed)
+
+    def _ver_tx(self, cur, guild_id, mercado_nombre):
+        """Listados del mercado con sus precios formateados, o None si el mercado no existe"""
+        cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)",
+                    (guild_id, mercado_nombre))
+        mercado = cur.fetchone()
+        if not mercado:
+            return None
+
+        # Obtener items del mercado con sus tres precios ya formateados
+        cur.execute(self._listados_sql(), (mercado[0],))
+        return cur.fetchall()
 
     @mercado.command(name="comprar", description="Comprar item de un mercado")
     @app_commands.describe(
@@ -383,106 +424,27 @@ class Market(commands.Cog):
         precio_elegido="Número del precio a usar (1, 2 o 3)",
         cantidad="Cantidad a comprar"
     )
+    @app_commands.autocomplete(mercado_nombre=mercado_autocomplete, personaje=personaje_autocomplete, item_nombre=item_autocomplete)
     async def comprar(self, interaction: discord.Interaction, mercado_nombre: str, personaje: str,
                      item_nombre: str, precio_elegido: int = 1, cantidad: int = 1):
-        cur = self.conn.cursor()
         try:
             if cantidad < 1:
                 await interaction.response.send_message("La cantidad debe ser al menos 1.", ephemeral=True)
                 return
 
-            # Verificar personaje
-            cur.execute("SELECT id, user_id FROM characters WHERE guild_id=%s AND name=%s", 
-                       (str(interaction.guild.id), personaje))
-            char_info = cur.fetchone()
-            if not char_info:
-                await interaction.response.send_message("Personaje no encontrado.", ephemeral=True)
-                return
-            char_id, owner_id = char_info
-
-            # Verificar permisos
-            if str(interaction.user.id) != owner_id and not interaction.user.guild_permissions.administrator:
-                await interaction.response.send_message("No tienes permisos para usar este personaje.", ephemeral=True)
-                return
-
-            # Verificar mercado y item
-            cur.execute("""
-                SELECT ml.id, ml.price, ml.price2, ml.price3, ml.current_stock, i.id
-                FROM market_listings ml
-                JOIN items i ON ml.item_id = i.id
-                JOIN markets m ON ml.market_id = m.id
-                WHERE m.guild_id = %s AND m.name = %s AND i.name = %s
-            """, (str(interaction.guild.id), mercado_nombre, item_nombre))
-            
-            listing = cur.fetchone()
-            if not listing:
-                await interaction.response.send_message("Item no encontrado en el mercado.", ephemeral=True)
-                return
-
-            listing_id, price1, price2, price3, stock, item_id = listing
-
-            # Seleccionar precio
-            precios = [price1, price2, price3]
             if precio_elegido < 1 or precio_elegido > 3:
                 await interaction.response.send_message("El precio debe ser 1, 2 o 3.", ephemeral=True)
                 return
-            
-            precio_json = precios[precio_elegido - 1]
-            if not precio_json or precio_json == '[]':
-                await interaction.response.send_message("Este precio no está disponible.", ephemeral=True)
-                return
-
-            # Verificar stock
-            if stock < cantidad:
-                await interaction.response.send_message("Stock insuficiente.", ephemeral=True)
-                return
 
-            # Parsear precio
-            try:
-                precio = json.loads(precio_json) if isinstance(precio_json, str) else precio_json
-            except:
-                await interaction.response.send_message("Error en el formato del precio.", ephemeral=True)
+            error, compra = await self.db.run(
+                self._comprar_tx, str(interaction.guild.id), str(interaction.user.id),
+                interaction.user.guild_permissions.administrator,
+                mercado_nombre, personaje, item_nombre, precio_elegido, cantidad
+            )
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
                 return
-
-            # Verificar que el personaje tiene los recursos
-            for componente in precio:
-                cur.execute("SELECT quantity FROM inventory WHERE character_id=%s AND item_id=%s", 
-                           (char_id, componente["item_id"]))
-                inv_row = cur.fetchone()
-                cantidad_necesaria = componente["qty"] * cantidad
-                
-                if not inv_row or inv_row[0] < cantidad_necesaria:
-                    cur.execute("SELECT name FROM items WHERE id=%s", (componente["item_id"],))
-                    item_name = cur.fetchone()[0]
-                    await interaction.response.send_message(
-                        f"No tienes suficiente {item_name}. Necesitas {cantidad_necesaria}, tienes {inv_row[0] if inv_row else 0}.",
-                        ephemeral=True
-                    )
-                    return
-
-            # Realizar transacción
-            # 1. Quitar recursos del comprador
-            for componente in precio:
-                cantidad_necesaria = componente["qty"] * cantidad
-                cur.execute("UPDATE inventory SET quantity = quantity - %s WHERE character_id=%s AND item_id=%s", 
-                           (cantidad_necesaria, char_id, componente["item_id"]))
-                # Eliminar si la cantidad llega a 0
-                cur.execute("DELETE FROM inventory WHERE character_id=%s AND item_id=%s AND quantity <= 0", 
-                           (char_id, componente["item_id"]))
-
-            # 2. Añadir item comprado al inventario
-            cur.execute("""
-                INSERT INTO inventory (character_id, item_id, quantity)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (character_id, item_id)
-                DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
-            """, (char_id, item_id, cantidad))
-
-            # 3. Actualizar stock del mercado
-            cur.execute("UPDATE market_listings SET current_stock = current_stock - %s WHERE id=%s", 
-                       (cantidad, listing_id))
-
-            self.conn.commit()
+            self.bot.dispatch("inventory_change", compra["char_id"])
 
             # Mensaje de confirmación
             embed = discord.Embed(
@@ -490,83 +452,142 @@ class Market(commands.Cog):
                 description=f"**{personaje}** ha comprado **{cantidad}x {item_nombre}** del mercado **{mercado_nombre}**.",
                 color=discord.Color.dark_gold()
             )
-            
-            # Mostrar el precio pagado
-            precio_pagado = []
-            for componente in precio:
-                cur.execute("SELECT name FROM items WHERE id=%s", (componente["item_id"],))
-                item_name = cur.fetchone()[0]
-                precio_pagado.append(f"{componente['qty'] * cantidad}x {item_name}")
-            
-            embed.add_field(name="Precio pagado", value=", ".join(precio_pagado), inline=False)
-            embed.add_field(name="Stock restante", value=str(stock - cantidad), inline=True)
+            embed.add_field(name="Precio pagado", value=", ".join(compra["precio_pagado"]), inline=False)
+            embed.add_field(name="Stock restante", value=str(compra["stock_restante"]), inline=True)
             
             await interaction.response.send_message(embed=embed)
 
         except Exception as e:
             await interaction.response.send_message(f"Error durante la compra: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+
+    def _comprar_tx(self, cur, guild_id, user_id, is_admin, mercado_nombre, personaje,
+                    item_nombre, precio_elegido, cantidad):
+        """Unidad de trabajo de /mercado comprar. Devuelve (error, compra)
+
+        El número de sentencias no depende de cuántos componentes tenga el
+        precio: se bloquea la fila del listado y los componentes se validan
+        y descuentan con joins sobre listing_prices.
+        """
+        # Verificar personaje
+        cur.execute("SELECT id, user_id FROM characters WHERE guild_id=%s AND name=%s", 
+                   (guild_id, personaje))
+        char_info = cur.fetchone()
+        if not char_info:
+            return "Personaje no encontrado.", None
+        char_id, owner_id = char_info
+
+        # Verificar permisos
+        if user_id != owner_id and not is_admin:
+            return "No tienes permisos para usar este personaje.", None
+
+        # Verificar mercado e item, bloqueando el listado hasta el final de la compra
+        cur.execute("""
+            SELECT ml.id, ml.current_stock, i.id
+            FROM market_listings ml
+            JOIN items i ON ml.item_id = i.id
+            JOIN markets m ON ml.market_id = m.id
+            WHERE m.guild_id = %s AND lower(m.name) = lower(%s) AND lower(i.name) = lower(%s)
+            FOR UPDATE OF ml
+        """, (guild_id, mercado_nombre, item_nombre))
+        
+        listing = cur.fetchone()
+        if not listing:
+            return "Item no encontrado en el mercado.", None
+
+        listing_id, stock, item_id = listing
+
+        # Componentes del precio elegido con su nombre y lo que tiene el personaje
+        cur.execute("""
+            SELECT lp.item_id, pi.name, lp.qty * %s, COALESCE(inv.quantity, 0)
+            FROM listing_prices lp
+            JOIN items pi ON pi.id = lp.item_id
+            LEFT JOIN inventory inv ON inv.character_id = %s AND inv.item_id = lp.item_id
+            WHERE lp.listing_id = %s AND lp.price_slot = %s AND lp.qty IS NOT NULL
+            ORDER BY pi.name
+        """, (cantidad, char_id, listing_id, precio_elegido))
+        componentes = cur.fetchall()
+        if not componentes:
+            return "Este precio no está disponible.", None
+
+        # Verificar stock
+        if stock < cantidad:
+            return "Stock insuficiente.", None
+
+        # Verificar que el personaje tiene los recursos
+        for _, item_name, cantidad_necesaria, disponible in componentes:
+            if disponible < cantidad_necesaria:
+                return (f"No tienes suficiente {item_name}. Necesitas {cantidad_necesaria}, "
+                        f"tienes {disponible}."), None
+
+        # Realizar transacción
+        # 1. Quitar recursos del comprador (solo si siguen alcanzando)
+        cur.execute("""
+            UPDATE inventory inv
+            SET quantity = inv.quantity - lp.qty * %s
+            FROM listing_prices lp
+            WHERE lp.listing_id = %s AND lp.price_slot = %s AND lp.qty IS NOT NULL
+              AND inv.character_id = %s AND inv.item_id = lp.item_id
+              AND inv.quantity >= lp.qty * %s
+        """, (cantidad, listing_id, precio_elegido, char_id, cantidad))
+        if cur.rowcount != len(componentes):
+            # Otra operación gastó los recursos entre la comprobación y el descuento
+            cur.connection.rollback()
+            return "Tus recursos cambiaron durante la compra. Inténtalo de nuevo.", None
+
+        item_ids = [row[0] for row in componentes]
+        cur.execute("DELETE FROM inventory WHERE character_id=%s AND item_id = ANY(%s) AND quantity <= 0", 
+                   (char_id, item_ids))
+
+        # 2. Añadir item comprado al inventario
+        cur.execute("""
+            INSERT INTO inventory (character_id, item_id, quantity)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (character_id, item_id)
+            DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+        """, (char_id, item_id, cantidad))
+
+        # 3. Actualizar stock del mercado
+        cur.execute("""
+            UPDATE market_listings SET current_stock = current_stock - %s
+            WHERE id=%s AND current_stock >= %s
+            RETURNING current_stock
+        """, (cantidad, listing_id, cantidad))
+        restante = cur.fetchone()
+        if not restante:
+            cur.connection.rollback()
+            return "Stock insuficiente.", None
+
+        # Precio pagado para el recibo
+        precio_pagado = [f"{cantidad_necesaria}x {item_name}" for _, item_name, cantidad_necesaria, _ in componentes]
+
+        return None, {"char_id": char_id, "precio_pagado": precio_pagado, "stock_restante": restante[0]}
 
     @mercado.command(name="inflacion", description="Aplica inflación a TODOS los items en todos los mercados (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(
-        porcentaje="Porcentaje de inflación (puede ser negativo)"
+        porcentaje="Porcentaje de inflación (puede ser negativo)",
+        mercado="Aplicar solo a este mercado (opcional)",
+        categoria="Aplicar solo a items de esta categoría (opcional)"
     )
-    async def inflacion(self, interaction: discord.Interaction, porcentaje: float):
-        cur = self.conn.cursor()
+    @app_commands.autocomplete(mercado=mercado_autocomplete)
+    async def inflacion(self, interaction: discord.Interaction, porcentaje: float,
+                        mercado: str = None, categoria: str = None):
         try:
             ratio = 1.0 + (porcentaje / 100.0)
+            modified = await self.db.run(self._inflacion_tx, str(interaction.guild.id), ratio, mercado, categoria)
+
+            alcance = "TODOS los items en todos los precios del mercado"
+            if mercado or categoria:
+                partes = []
+                if mercado:
+                    partes.append(f"el mercado **{mercado}**")
+                if categoria:
+                    partes.append(f"la categoría **{categoria}**")
+                alcance = "los items de " + " y ".join(partes)
 
-            # Obtener todos los listings del servidor
-            cur.execute("""
-                SELECT ml.id, ml.price, ml.price2, ml.price3 
-                FROM market_listings ml
-                JOIN markets m ON ml.market_id = m.id
-                WHERE m.guild_id = %s
-            """, (str(interaction.guild.id),))
-            
-            rows = cur.fetchall()
-            modified = 0
-
-            for listing_id, price1, price2, price3 in rows:
-                precios = [price1, price2, price3]
-                nuevos_precios = []
-                changed = False
-
-                for precio_json in precios:
-                    if not precio_json or precio_json == '[]':
-                        nuevos_precios.append(precio_json)
-                        continue
-
-                    try:
-                        precio = json.loads(precio_json) if isinstance(precio_json, str) else precio_json
-                        nuevo_precio = []
-                        
-                        for componente in precio:
-                            # Aplicar inflación a CADA componente del precio
-                            new_qty = max(1, math.ceil(componente["qty"] * ratio))
-                            nuevo_precio.append({"item_id": componente["item_id"], "qty": new_qty})
-                            changed = True
-                        
-                        nuevos_precios.append(json.dumps(nuevo_precio))
-                    except Exception as e:
-                        print(f"Error procesando precio: {e}")
-                        nuevos_precios.append(precio_json)
-
-                if changed:
-                    cur.execute("""
-                        UPDATE market_listings 
-                        SET price = %s::jsonb, price2 = %s::jsonb, price3 = %s::jsonb
-                        WHERE id = %s
-                    """, (nuevos_precios[0], nuevos_precios[1], nuevos_precios[2], listing_id))
-                    modified += 1
-
-            self.conn.commit()
-            
             embed = discord.Embed(
                 title="Inflación Aplicada",
-                description=f"Se aplicó {porcentaje}% de inflación a TODOS los items en todos los precios del mercado.",
+                description=f"Se aplicó {porcentaje}% de inflación a {alcance}.",
                 color=discord.Color.dark_gold()
             )
             embed.add_field(name="Listings modificados", value=str(modified), inline=True)
@@ -575,165 +596,271 @@ class Market(commands.Cog):
 
         except Exception as e:
             await interaction.response.send_message(f"Error al aplicar inflación: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+
+    def _inflacion_tx(self, cur, guild_id, ratio, mercado=None, categoria=None):
+        """Unidad de trabajo de /mercado inflacion: un único UPDATE para todo el servidor.
+
+        Cada componente pasa a max(1, ceil(qty * ratio)). Devuelve los listados modificados.
+        """
+        filtros = ""
+        if mercado:
+            filtros += " AND lower(m.name) = lower(%(mercado)s)"
+        if categoria:
+            filtros += " AND lower(i.category) = lower(%(categoria)s)"
+
+        cur.execute(f"""
+            WITH modificados AS (
+                UPDATE listing_prices lp
+                SET qty = GREATEST(1, ceil(lp.qty::float8 * %(ratio)s::float8))::int
+                FROM market_listings ml, markets m, items i
+                WHERE lp.listing_id = ml.id AND ml.market_id = m.id AND ml.item_id = i.id
+                  AND lp.qty IS NOT NULL
+                  AND m.guild_id = %(guild_id)s{filtros}
+                RETURNING lp.listing_id
+            )
+            SELECT count(DISTINCT listing_id) FROM modificados
+        """, {"guild_id": guild_id, "ratio": ratio, "mercado": mercado, "categoria": categoria})
+        return cur.fetchone()[0]
 
     @mercado.command(name="reiniciar_inflacion", description="Reinicia TODOS los precios a los valores iniciales (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     async def reiniciar_inflacion(self, interaction: discord.Interaction):
-        cur = self.conn.cursor()
         try:
-            # Obtener todos los listings del servidor para contar cuántos se van a modificar
-            cur.execute("""
-                SELECT COUNT(*) 
-                FROM market_listings ml
-                JOIN markets m ON ml.market_id = m.id
-                WHERE m.guild_id = %s
-            """, (str(interaction.guild.id),))
-            
-            total_listings = cur.fetchone()[0]
-
-            # Reiniciar todos los precios a sus valores iniciales
-            cur.execute("""
-                UPDATE market_listings 
-                SET price = initial_price, 
-                    price2 = initial_price2, 
-                    price3 = initial_price3
-                FROM markets
-                WHERE market_listings.market_id = markets.id 
-                AND markets.guild_id = %s
-            """, (str(interaction.guild.id),))
-            
-            modified = cur.rowcount
-            self.conn.commit()
-            
-            embed = discord.Embed(
-                title="Inflación Reiniciada",
-                description="Todos los precios han sido restablecidos a sus valores iniciales.",
-                color=discord.Color.dark_gold()
-            )
-            embed.add_field(name="Listings modificados", value=f"{modified}/{total_listings}", inline=True)
-            
-            await interaction.response.send_message(embed=embed)
-
+            modified, total_listings = await self.db.run(self._reiniciar_inflacion_tx, str(interaction.guild.id))
         except Exception as e:
             await interaction.response.send_message(f"Error al reiniciar la inflación: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        embed = discord.Embed(
+            title="Inflación Reiniciada",
+            description="Todos los precios han sido restablecidos a sus valores iniciales.",
+            color=discord.Color.dark_gold()
+        )
+        embed.add_field(name="Listings modificados", value=f"{modified}/{total_listings}", inline=True)
+
+        await interaction.response.send_message(embed=embed)
+
+    def _reiniciar_inflacion_tx(self, cur, guild_id):
+        """Unidad de trabajo de /mercado reiniciar_inflacion. Devuelve (modificados, total de listados)"""
+        # Obtener todos los listings del servidor para contar cuántos se van a modificar
+        cur.execute("""
+            SELECT COUNT(*) 
+            FROM market_listings ml
+            JOIN markets m ON ml.market_id = m.id
+            WHERE m.guild_id = %s
+        """, (guild_id,))
+        total_listings = cur.fetchone()[0]
+
+        # Reiniciar todos los precios a sus valores iniciales
+        cur.execute("""
+            WITH modificados AS (
+                UPDATE listing_prices lp
+                SET qty = lp.initial_qty
+                FROM market_listings ml, markets m
+                WHERE lp.listing_id = ml.id AND ml.market_id = m.id AND m.guild_id = %s
+                RETURNING lp.listing_id
+            )
+            SELECT count(DISTINCT listing_id) FROM modificados
+        """, (guild_id,))
+        modified = cur.fetchone()[0]
+
+        # Los componentes que no estaban en el precio inicial desaparecen
+        cur.execute("""
+            DELETE FROM listing_prices lp
+            USING market_listings ml, markets m
+            WHERE lp.listing_id = ml.id AND ml.market_id = m.id AND m.guild_id = %s
+              AND lp.qty IS NULL
+        """, (guild_id,))
+        return modified, total_listings
 
     @mercado.command(name="actualizar", description="(Admin) Actualiza stocks aleatorios y ajusta precios según ventas")
     @app_commands.checks.has_permissions(administrator=True)
-    async def actualizar_mercado(self, interaction: discord.Interaction, mercado_nombre: str):
-        cur = self.conn.cursor()
+    @app_commands.describe(
+        mercado_nombre="Nombre del mercado",
+        semilla="Semilla para que el resultado sea reproducible (opcional)"
+    )
+    @app_commands.autocomplete(mercado_nombre=mercado_autocomplete)
+    async def actualizar_mercado(self, interaction: discord.Interaction, mercado_nombre: str, semilla: int = None):
         try:
-            # Obtener el mercado
-            cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s)", (str(interaction.guild.id), mercado_nombre))
-            mk = cur.fetchone()
-            if not mk:
-                await interaction.response.send_message("No encontré ese mercado.", ephemeral=True)
-                return
-            market_id = mk[0]
-
-            # Obtener los listados del mercado
-            cur.execute("""
-                SELECT id, price, price2, price3, initial_price, initial_price2, initial_price3, base_stock, current_stock
-                FROM market_listings
-                WHERE market_id=%s
-            """, (market_id,))
-            rows = cur.fetchall()
-            if not rows:
-                await interaction.response.send_message("Ese mercado no tiene items.", ephemeral=True)
+            error, actualizados = await self.db.run(
+                self._actualizar_tx, str(interaction.guild.id), mercado_nombre, semilla
+            )
+            if error:
+                await interaction.response.send_message(error, ephemeral=True)
                 return
 
-            updated = []
-
-            for (listing_id, price_raw, price2_raw, price3_raw, init_raw, init2_raw, init3_raw, base_stock, current_stock) in rows:
-                # Parsear los precios
-                price = json.loads(price_raw) if price_raw and isinstance(price_raw, str) else price_raw or []
-                price2 = json.loads(price2_raw) if price2_raw and isinstance(price2_raw, str) else price2_raw or []
-                price3 = json.loads(price3_raw) if price3_raw and isinstance(price3_raw, str) else price3_raw or []
-                initial_price = json.loads(init_raw) if init_raw and isinstance(init_raw, str) else init_raw or []
-                initial_price2 = json.loads(init2_raw) if init2_raw and isinstance(init2_raw, str) else init2_raw or []
-                initial_price3 = json.loads(init3_raw) if init3_raw and isinstance(init3_raw, str) else init3_raw or []
-
-                base_stock = int(base_stock or 0)
-                current_stock = int(current_stock or 0)
-
-                # Calcular vendidos
-                sold = base_stock - current_stock
-
-                # Nuevo stock aleatorio
-                new_base_stock = random.randint(1, 10)
-                new_current_stock = new_base_stock
-
-                # Función para ajustar un precio de forma INDEPENDIENTE
-                def adjust_price(price_list, initial_price_list):
-                    if not price_list:  # Si no hay precio, mantenerlo vacío
-                        return []
-                    
-                    # Si el precio está vacío o es cero, restaurar al inicial
-                    if self._is_price_zero(price_list):
-                        return initial_price_list if initial_price_list else []
-
-                    new_price = []
-                    for e in price_list:
-                        current_qty = e.get("qty", 0)
-                        
-                        # CONDICIÓN ESPECIAL: Si el precio es 1 y se vendió la mitad o más
-                        if current_qty == 1 and sold >= math.ceil(base_stock / 2) and base_stock > 0:
-                            new_qty = 2  # Aumentar directamente a 2
-                        else:
-                            # Sistema normal: calcular factor según ventas
-                            mitad = math.ceil(base_stock / 2) if base_stock > 0 else 1
-                            factor = 1.5 if sold >= mitad else 0.5
-                            new_qty = max(1, int(e.get("qty", 0) * factor))
-                        
-                        new_price.append({"item_id": e["item_id"], "qty": new_qty})
-                    return new_price
-
-                # Ajustar CADA precio de forma INDEPENDIENTE
-                new_price = adjust_price(price, initial_price)
-                new_price2 = adjust_price(price2, initial_price2)
-                new_price3 = adjust_price(price3, initial_price3)
-
-                # Actualizar el listing
-                cur.execute("""
-                    UPDATE market_listings
-                    SET price = %s::jsonb, price2 = %s::jsonb, price3 = %s::jsonb,
-                        base_stock = %s, current_stock = %s
-                    WHERE id = %s
-                """, (
-                    json.dumps(new_price) if new_price else '[]',
-                    json.dumps(new_price2) if new_price2 else '[]', 
-                    json.dumps(new_price3) if new_price3 else '[]',
-                    new_base_stock, new_current_stock, listing_id
-                ))
-
-                updated.append(listing_id)
-
-            self.conn.commit()
-
             embed = discord.Embed(
                 title="Mercado Actualizado",
                 description=f"El mercado **{mercado_nombre}** ha sido actualizado.",
                 color=discord.Color.dark_gold()
             )
-            embed.add_field(name="Listados actualizados", value=str(len(updated)), inline=True)
+            embed.add_field(name="Listados actualizados", value=str(actualizados), inline=True)
             await interaction.response.send_message(embed=embed)
 
         except Exception as e:
             await interaction.response.send_message(f"Error al actualizar el mercado: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
 
-    def _is_price_zero(self, price_list):
-        """Verifica si el precio es cero (no se puede comprar)"""
-        if not price_list:
-            return True
-        for comp in price_list:
-            if comp.get('qty', 0) > 0:
-                return False
-        return True
+    def _actualizar_tx(self, cur, guild_id, mercado_nombre, semilla=None):
+        """Unidad de trabajo de /mercado actualizar. Devuelve (error, listados actualizados)"""
+        # Obtener el mercado
+        cur.execute("SELECT id FROM markets WHERE guild_id=%s AND lower(name)=lower(%s) FOR UPDATE",
+                    (guild_id, mercado_nombre))
+        mk = cur.fetchone()
+        if not mk:
+            return "No encontré ese mercado.", 0
+        market_id = mk[0]
+
+        inicio = time.perf_counter()
+        actualizados = self._recalcular_mercado(cur, market_id, semilla)
+        if actualizados == 0:
+            return "Ese mercado no tiene items.", 0
+
+        # La actualización manual también cuenta como tick: reinicia el intervalo automático
+        cur.execute("UPDATE markets SET last_tick_at = now() WHERE id=%s", (market_id,))
+        self._registrar_tick(cur, market_id, inicio, actualizados, manual=True)
+        return None, actualizados
+
+    def _recalcular_mercado(self, cur, market_id, semilla=None):
+        """Reabastece y reajusta precios de un mercado. Devuelve los listados tocados"""
+        cur.execute("""
+            SELECT id, base_stock, current_stock
+            FROM market_listings
+            WHERE market_id=%s
+            ORDER BY id
+            FOR UPDATE
+        """, (market_id,))
+        listings = cur.fetchall()
+        if not listings:
+            return 0
+
+        cur.execute("""
+            SELECT lp.listing_id, lp.price_slot, lp.item_id, lp.qty, lp.initial_qty
+            FROM listing_prices lp
+            JOIN market_listings ml ON ml.id = lp.listing_id
+            WHERE ml.market_id=%s
+        """, (market_id,))
+        componentes = cur.fetchall()
+
+        # Calcular todo el mercado de una vez y escribirlo con un UPDATE por tabla
+        stocks, precios = recalcular_listados(listings, componentes, np.random.default_rng(semilla))
+        execute_values(cur, """
+            UPDATE market_listings AS ml
+            SET base_stock = v.base_stock, current_stock = v.current_stock
+            FROM (VALUES %s) AS v(id, base_stock, current_stock)
+            WHERE ml.id = v.id
+        """, stocks, page_size=len(stocks))
+
+        if precios:
+            execute_values(cur, """
+                UPDATE listing_prices AS lp
+                SET qty = v.qty::int
+                FROM (VALUES %s) AS v(listing_id, price_slot, item_id, qty)
+                WHERE lp.listing_id = v.listing_id AND lp.price_slot = v.price_slot AND lp.item_id = v.item_id
+            """, precios, page_size=len(precios))
+            # Componentes que no estaban en el precio inicial restaurado
+            cur.execute("""
+                DELETE FROM listing_prices lp
+                USING market_listings ml
+                WHERE lp.listing_id = ml.id AND ml.market_id=%s AND lp.qty IS NULL AND lp.initial_qty IS NULL
+            """, (market_id,))
+
+        return len(stocks)
+
+    def _registrar_tick(self, cur, market_id, inicio, filas, manual=False):
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        cur.execute("""
+            INSERT INTO market_ticks (market_id, duration_ms, rows_touched, manual)
+            VALUES (%s, %s, %s, %s)
+        """, (market_id, round(duracion_ms, 3), filas, manual))
+
+    @mercado.command(name="programar", description="(Admin) Programa la actualización automática de un mercado")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        mercado_nombre="Nombre del mercado",
+        minutos="Minutos entre actualizaciones (0 para desactivar)"
+    )
+    @app_commands.autocomplete(mercado_nombre=mercado_autocomplete)
+    async def programar_mercado(self, interaction: discord.Interaction, mercado_nombre: str, minutos: int):
+        if minutos < 0:
+            await interaction.response.send_message("Los minutos no pueden ser negativos.", ephemeral=True)
+            return
+
+        async with await self.db.cursor() as cur:
+            await cur.execute("""
+                UPDATE markets SET tick_interval_minutes = %s
+                WHERE guild_id=%s AND lower(name)=lower(%s)
+                RETURNING name
+            """, (minutos or None, str(interaction.guild.id), mercado_nombre))
+            mk = cur.fetchone()
+            await cur.commit()
+
+        if not mk:
+            await interaction.response.send_message("No encontré ese mercado.", ephemeral=True)
+            return
+
+        if minutos:
+            mensaje = f"El mercado **{mk[0]}** se actualizará automáticamente cada {minutos} minutos."
+        else:
+            mensaje = f"Actualización automática desactivada para **{mk[0]}**."
+        await interaction.response.send_message(mensaje, ephemeral=True)
+
+    @tasks.loop(minutes=TICK_CHECK_MINUTES)
+    async def tick_mercados(self):
+        """Actualiza en lotes acotados los mercados a los que les toca tick"""
+        try:
+            pendientes = await self.db.run(self._mercados_pendientes, TICK_MAX_PER_RUN)
+            for i in range(0, len(pendientes), TICK_BATCH_SIZE):
+                lote = pendientes[i:i + TICK_BATCH_SIZE]
+                resultados = await asyncio.gather(
+                    *(self.db.run(self._tick_tx, market_id) for market_id in lote),
+                    return_exceptions=True
+                )
+                for market_id, resultado in zip(lote, resultados):
+                    if isinstance(resultado, Exception):
+                        print(f"[ERROR TICK] Mercado {market_id}: {resultado}")
+        except Exception as e:
+            print(f"[ERROR TICK] {e}")
+
+    @tick_mercados.before_loop
+    async def _antes_de_tick(self):
+        await self.bot.wait_until_ready()
+
+    def _mercados_pendientes(self, cur, limite):
+        cur.execute(f"""
+            SELECT m.id FROM markets m
+            WHERE {TICK_DUE}
+            ORDER BY m.last_tick_at NULLS FIRST
+            LIMIT %s
+        """, (limite,))
+        return [row[0] for row in cur.fetchall()]
+
+    def _tick_tx(self, cur, market_id):
+        """Unidad de trabajo de un tick automático. Devuelve los listados tocados o None si ya no tocaba.
+
+        Reclamar el tick (last_tick_at) y aplicarlo van en la misma transacción:
+        si el bot se cae a mitad se deshace todo y el tick se repite al
+        reiniciar, y dos instancias no pueden aplicar el mismo tick.
+        """
+        cur.execute(f"""
+            UPDATE markets m SET last_tick_at = now()
+            WHERE m.id = %s AND {TICK_DUE}
+            RETURNING EXISTS (
+                SELECT 1 FROM market_listings ml
+                WHERE ml.market_id = m.id AND ml.current_stock < ml.base_stock
+            )
+        """, (market_id,))
+        reclamado = cur.fetchone()
+        if not reclamado:
+            return None
+
+        # Sin ventas desde el último tick no hay nada que reajustar
+        if not reclamado[0]:
+            return 0
+
+        inicio = time.perf_counter()
+        filas = self._recalcular_mercado(cur, market_id)
+        self._registrar_tick(cur, market_id, inicio, filas)
+        return filas
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Market(bot))
@@ -2,14 +2,16 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import json
+from utils.autocomplete import personaje_autocomplete
+from utils.effects import EFECTOS_ACTIVOS_SQL
 
 class Personajes(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
     @property
-    def conn(self):
-        return self.bot.conn
+    def db(self):
+        return self.bot.db
 
     personaje = app_commands.Group(name="personaje", description="Gestión de personajes")
 
@@ -24,305 +26,296 @@ class Personajes(commands.Cog):
     )
     async def crear_personaje(self, interaction: discord.Interaction, nombre: str, genero: str = None, edad: int = None, 
                              imagen: str = None, historia: str = None, rasgos: str = None):
-        cur = self.conn.cursor()
-        try:
-            # Verificar si el personaje ya existe
-            cur.execute("SELECT id FROM characters WHERE guild_id=%s AND name=%s", (str(interaction.guild.id), nombre))
-            if cur.fetchone():
-                await interaction.response.send_message("Ya existe un personaje con ese nombre en este servidor.", ephemeral=True)
-                return
-
-            # Convertir rasgos a lista JSON
-            rasgos_lista = []
-            if rasgos:
-                rasgos_lista = [r.strip() for r in rasgos.split(",") if r.strip()]
-
-            # Insertar el personaje
-            cur.execute("""
-                INSERT INTO characters (user_id, guild_id, name, gender, age, image, lore, traits, attributes)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb)
-            """, (str(interaction.user.id), str(interaction.guild.id), nombre, genero, edad, imagen, historia, json.dumps(rasgos_lista)))
-            self.conn.commit()
+        # Convertir rasgos a lista JSON
+        rasgos_lista = []
+        if rasgos:
+            rasgos_lista = [r.strip() for r in rasgos.split(",") if r.strip()]
 
-            await interaction.response.send_message(f"Personaje **{nombre}** creado con éxito.", ephemeral=True)
+        try:
+            creado = await self.db.run(
+                self._crear_tx, str(interaction.user.id), str(interaction.guild.id),
+                nombre, genero, edad, imagen, historia, rasgos_lista
+            )
         except Exception as e:
             await interaction.response.send_message(f"No se pudo crear el personaje: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
+            return
+
+        # La respuesta se envía con la conexión ya devuelta al pool
+        if not creado:
+            await interaction.response.send_message("Ya existe un personaje con ese nombre en este servidor.", ephemeral=True)
+            return
+
+        self.bot.names.add(interaction.guild.id, "personajes", nombre)
+        await interaction.response.send_message(f"Personaje **{nombre}** creado con éxito.", ephemeral=True)
+
+    def _crear_tx(self, cur, user_id, guild_id, nombre, genero, edad, imagen, historia, rasgos_lista):
+        # Verificar si el personaje ya existe
+        cur.execute("SELECT id FROM characters WHERE guild_id=%s AND name=%s", (guild_id, nombre))
+        if cur.fetchone():
+            return False
+
+        cur.execute("""
+            INSERT INTO characters (user_id, guild_id, name, gender, age, image, lore, traits, attributes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s::jsonb, '{}'::jsonb)
+        """, (user_id, guild_id, nombre, genero, edad, imagen, historia, json.dumps(rasgos_lista)))
+        return True
 
     @personaje.command(name="ver", description="Muestra la ficha de un personaje")
+    @app_commands.autocomplete(nombre=personaje_autocomplete)
     async def ver_personaje(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
-
         try:
-            # Obtener información básica del personaje
-            cur.execute("""
-                SELECT name, gender, age, attributes, traits, lore, image, approved, user_id, id
-                FROM characters
-                WHERE guild_id=%s AND name=%s
-            """, (str(interaction.guild.id), nombre))
-            row = cur.fetchone()
+            # Personaje con sus bonificaciones y ranuras equipadas precalculadas en character_stats
+            # y los efectos temporales que siguen vigentes
+            async with await self.db.cursor() as cur:
+                await cur.execute(f"""
+                    SELECT c.name, c.gender, c.age, c.attributes, c.traits, c.lore, c.image, c.approved, c.user_id,
+                           cs.bonuses, cs.equipped_slots, {EFECTOS_ACTIVOS_SQL}
+                    FROM characters c
+                    LEFT JOIN character_stats cs ON cs.character_id = c.id
+                    WHERE c.guild_id=%s AND c.name=%s
+                """, (str(interaction.guild.id), nombre))
+                row = cur.fetchone()
+        except Exception as e:
+            await interaction.response.send_message(f"Error al mostrar el personaje: {str(e)}", ephemeral=True)
+            return
 
-            if not row:
-                await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
-                return
+        # Desde aquí la conexión ya está devuelta al pool: fetch_member y la respuesta no la retienen
+        if not row:
+            await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
+            return
 
-            name, gender, age, attributes, traits, lore, image, approved, user_id, char_id = row
+        (name, gender, age, attributes, traits, lore, image, approved, user_id,
+         bonificaciones, items_activos, efectos) = row
 
-            is_owner = str(interaction.user.id) == user_id
-            is_admin = interaction.user.guild_permissions.administrator
-            
-            if not approved and not is_owner and not is_admin:
-                await interaction.response.send_message("Este personaje aún no ha sido aprobado y solo puede ser visto por su dueño o administradores.", ephemeral=True)
-                return
+        is_owner = str(interaction.user.id) == user_id
+        is_admin = interaction.user.guild_permissions.administrator
 
-            # Obtener items equipados y sus efectos
-            cur.execute("""
-                SELECT i.effects, i.attack, i.defense, inv.equipped_slot
-                FROM inventory inv
-                JOIN items i ON inv.item_id = i.id
-                WHERE inv.character_id=%s AND inv.equipped_slot IS NOT NULL
-            """, (char_id,))
-            
-            items_equipados = cur.fetchall()
-
-            # Procesar atributos base y bonificaciones
-            atributos_base = attributes or {}
-            bonificaciones = {}
-            items_activos = []
-
-            for effects, attack, defense, slot in items_equipados:
-                if effects:
-                    try:
-                        efectos_dict = json.loads(effects) if isinstance(effects, str) else effects
-                        for attr, valor in efectos_dict.items():
-                            if isinstance(valor, (int, float)):
-                                if attr not in bonificaciones:
-                                    bonificaciones[attr] = 0
-                                bonificaciones[attr] += valor
-                    except:
-                        pass
-                
-                # Registrar item activo
-                items_activos.append(slot)
-
-            # Crear embed
-            embed = discord.Embed(
-                title=f"{name}",
-                description=lore or "",
-                color=discord.Color.dark_gold()
+        if not approved and not is_owner and not is_admin:
+            await interaction.response.send_message("Este personaje aún no ha sido aprobado y solo puede ser visto por su dueño o administradores.", ephemeral=True)
+            return
+
+        atributos_base = attributes or {}
+        bonificaciones = bonificaciones or {}
+        items_activos = items_activos or []
+        efectos = efectos or []
+
+        # Los efectos temporales se suman a la bonificación del atributo con el mismo nombre
+        bonificaciones = dict(bonificaciones)
+        for efecto in efectos:
+            attr = next((a for a in atributos_base if a.lower() == efecto["atributo"].lower()), None)
+            if attr:
+                bonificaciones[attr] = bonificaciones.get(attr, 0) + efecto["valor"]
+
+        # Crear embed
+        embed = discord.Embed(
+            title=f"{name}",
+            description=lore or "",
+            color=discord.Color.dark_gold()
+        )
+
+        embed.add_field(name="Género", value=gender or "No definido", inline=True)
+        embed.add_field(name="Edad", value=age or "Desconocida", inline=True)
+
+        # Atributos con bonificaciones
+        if atributos_base:
+            atributos_str = ""
+            for attr, valor_base in atributos_base.items():
+                bono = bonificaciones.get(attr, 0)
+                if isinstance(bono, float) and bono.is_integer():
+                    bono = int(bono)
+                if bono != 0:
+                    valor_final = valor_base + bono
+                    simbolo = "+" if bono > 0 else ""
+                    atributos_str += f"**{attr}**: {valor_base} ({simbolo}{bono}) = {valor_final}\n"
+                else:
+                    atributos_str += f"**{attr}**: {valor_base}\n"
+
+            embed.add_field(name="Atributos", value=atributos_str, inline=False)
+        else:
+            embed.add_field(name="Atributos", value="Ninguno", inline=False)
+
+        if efectos:
+            efectos_str = "\n".join(
+                f"• {e['atributo']} {'+' if e['valor'] > 0 else ''}{e['valor']:g} (termina <t:{int(e['expira'])}:R>)"
+                for e in efectos
             )
-            
-            embed.add_field(name="Género", value=gender or "No definido", inline=True)
-            embed.add_field(name="Edad", value=age or "Desconocida", inline=True)
-            
-            # Atributos con bonificaciones
-            if atributos_base:
-                atributos_str = ""
-                for attr, valor_base in atributos_base.items():
-                    bono = bonificaciones.get(attr, 0)
-                    if bono != 0:
-                        valor_final = valor_base + bono
-                        simbolo = "+" if bono > 0 else ""
-                        atributos_str += f"**{attr}**: {valor_base} ({simbolo}{bono}) = {valor_final}\n"
-                    else:
-                        atributos_str += f"**{attr}**: {valor_base}\n"
-                
-                embed.add_field(name="Atributos", value=atributos_str, inline=False)
-            else:
-                embed.add_field(name="Atributos", value="Ninguno", inline=False)
-            
-            # Items equipados
-            if items_activos:
-                embed.add_field(name="Equipado en", value=", ".join(items_activos), inline=True)
-            else:
-                embed.add_field(name="Equipado", value="Nada", inline=True)
-            
-            # Rasgos
-            if traits and len(traits) > 0:
-                rasgos_str = "\n".join([f"• {trait}" for trait in traits])
-                embed.add_field(name="Rasgos", value=rasgos_str, inline=False)
-            else:
-                embed.add_field(name="Rasgos", value="Ninguno", inline=False)
-                
-            embed.add_field(name="Estado", value="Aprobado" if approved else "Pendiente", inline=True)
-            
-            if image:
-                embed.set_image(url=image)
-                
-            if is_admin:
-                try:
-                    owner = await interaction.guild.fetch_member(int(user_id))
-                    owner_name = owner.display_name
-                except:
-                    owner_name = f"Usuario con ID {user_id}"
-                embed.set_footer(text=f"Dueño: {owner_name}")
-
-            await interaction.response.send_message(embed=embed)
-            
-        except Exception as e:
-            await interaction.response.send_message(f"Error al mostrar el personaje: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
-    
+            embed.add_field(name="Efectos temporales", value=efectos_str, inline=False)
+
+        # Items equipados
+        if items_activos:
+            embed.add_field(name="Equipado en", value=", ".join(items_activos), inline=True)
+        else:
+            embed.add_field(name="Equipado", value="Nada", inline=True)
+
+        # Rasgos
+        if traits and len(traits) > 0:
+            rasgos_str = "\n".join([f"• {trait}" for trait in traits])
+            embed.add_field(name="Rasgos", value=rasgos_str, inline=False)
+        else:
+            embed.add_field(name="Rasgos", value="Ninguno", inline=False)
+
+        embed.add_field(name="Estado", value="Aprobado" if approved else "Pendiente", inline=True)
+
+        if image:
+            embed.set_image(url=image)
+
+        if is_admin:
+            try:
+                owner = await interaction.guild.fetch_member(int(user_id))
+                owner_name = owner.display_name
+            except:
+                owner_name = f"Usuario con ID {user_id}"
+            embed.set_footer(text=f"Dueño: {owner_name}")
+
+        await interaction.response.send_message(embed=embed)
+
     @personaje.command(name="agregar_rasgo", description="Agrega rasgos a un personaje (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(
         nombre="Nombre del personaje",
         rasgos="Rasgos a agregar, separados por comas"
     )
+    @app_commands.autocomplete(nombre=personaje_autocomplete)
     async def agregar_rasgo(self, interaction: discord.Interaction, nombre: str, rasgos: str):
-        cur = self.conn.cursor()
-        
+        # Convertir nuevos rasgos a lista
+        nuevos_rasgos = [r.strip() for r in rasgos.split(",") if r.strip()]
+
         try:
-            # Verificar que el personaje existe
-            cur.execute("SELECT traits FROM characters WHERE guild_id=%s AND name=%s", 
-                       (str(interaction.guild.id), nombre))
-            resultado = cur.fetchone()
-            
-            if not resultado:
-                await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
-                return
-                
-            # Obtener rasgos actuales
-            rasgos_actuales = resultado[0] or []
-            
-            # Convertir nuevos rasgos a lista
-            nuevos_rasgos = [r.strip() for r in rasgos.split(",") if r.strip()]
-            
-            # Filtrar rasgos que ya existen
-            rasgos_a_agregar = [r for r in nuevos_rasgos if r not in rasgos_actuales]
-            
-            if not rasgos_a_agregar:
-                await interaction.response.send_message("Todos los rasgos ya existen en el personaje.", ephemeral=True)
-                return
-                
-            # Combinar rasgos
-            todos_los_rasgos = rasgos_actuales + rasgos_a_agregar
-            
-            # Actualizar en la base de datos
-            cur.execute("""
-                UPDATE characters 
-                SET traits = %s::jsonb 
-                WHERE guild_id=%s AND name=%s
-            """, (json.dumps(todos_los_rasgos), str(interaction.guild.id), nombre))
-            
-            self.conn.commit()
-            
-            await interaction.response.send_message(
-                f"Rasgos agregados a **{nombre}**: {', '.join(rasgos_a_agregar)}", 
-                ephemeral=True
+            rasgos_agregados = await self.db.run(
+                self._cambiar_rasgos_tx, str(interaction.guild.id), nombre, nuevos_rasgos, True
             )
-            
         except Exception as e:
             await interaction.response.send_message(f"Error al agregar rasgos: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
-    
+            return
+
+        if rasgos_agregados is None:
+            await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
+            return
+
+        if not rasgos_agregados:
+            await interaction.response.send_message("Todos los rasgos ya existen en el personaje.", ephemeral=True)
+            return
+
+        await interaction.response.send_message(
+            f"Rasgos agregados a **{nombre}**: {', '.join(rasgos_agregados)}", 
+            ephemeral=True
+        )
+
     @personaje.command(name="eliminar_rasgo", description="Elimina rasgos de un personaje (solo admins)")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(
         nombre="Nombre del personaje",
         rasgos="Rasgos a eliminar, separados por comas"
     )
+    @app_commands.autocomplete(nombre=personaje_autocomplete)
     async def eliminar_rasgo(self, interaction: discord.Interaction, nombre: str, rasgos: str):
-        cur = self.conn.cursor()
-        
+        # Convertir rasgos a eliminar a lista
+        rasgos_a_eliminar = [r.strip() for r in rasgos.split(",") if r.strip()]
+
         try:
-            # Verificar que el personaje existe
-            cur.execute("SELECT traits FROM characters WHERE guild_id=%s AND name=%s", 
-                       (str(interaction.guild.id), nombre))
-            resultado = cur.fetchone()
-            
-            if not resultado:
-                await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
-                return
-                
-            # Obtener rasgos actuales
-            rasgos_actuales = resultado[0] or []
-            
-            # Convertir rasgos a eliminar a lista
-            rasgos_a_eliminar = [r.strip() for r in rasgos.split(",") if r.strip()]
-            
-            # Filtrar rasgos que existen
-            rasgos_existentes = [r for r in rasgos_a_eliminar if r in rasgos_actuales]
-            
-            if not rasgos_existentes:
-                await interaction.response.send_message("Ninguno de los rasgos existe en el personaje.", ephemeral=True)
-                return
-                
-            # Eliminar rasgos
-            nuevos_rasgos = [r for r in rasgos_actuales if r not in rasgos_existentes]
-            
-            # Actualizar en la base de datos
+            rasgos_eliminados = await self.db.run(
+                self._cambiar_rasgos_tx, str(interaction.guild.id), nombre, rasgos_a_eliminar, False
+            )
+        except Exception as e:
+            await interaction.response.send_message(f"Error al eliminar rasgos: {str(e)}", ephemeral=True)
+            return
+
+        if rasgos_eliminados is None:
+            await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
+            return
+
+        if not rasgos_eliminados:
+            await interaction.response.send_message("Ninguno de los rasgos existe en el personaje.", ephemeral=True)
+            return
+
+        await interaction.response.send_message(
+            f"Rasgos eliminados de **{nombre}**: {', '.join(rasgos_eliminados)}", 
+            ephemeral=True
+        )
+
+    def _cambiar_rasgos_tx(self, cur, guild_id, nombre, rasgos, agregar):
+        """Agrega o quita rasgos. Devuelve los que cambiaron, o None si el personaje no existe"""
+        # FOR UPDATE: dos cambios de rasgos a la vez no se pisan la lista
+        cur.execute("SELECT traits FROM characters WHERE guild_id=%s AND name=%s FOR UPDATE",
+                    (guild_id, nombre))
+        resultado = cur.fetchone()
+        if not resultado:
+            return None
+
+        rasgos_actuales = resultado[0] or []
+        if agregar:
+            cambiados = [r for r in rasgos if r not in rasgos_actuales]
+            nuevos_rasgos = rasgos_actuales + cambiados
+        else:
+            cambiados = [r for r in rasgos if r in rasgos_actuales]
+            nuevos_rasgos = [r for r in rasgos_actuales if r not in cambiados]
+
+        if cambiados:
             cur.execute("""
                 UPDATE characters 
                 SET traits = %s::jsonb 
                 WHERE guild_id=%s AND name=%s
-            """, (json.dumps(nuevos_rasgos), str(interaction.guild.id), nombre))
-            
-            self.conn.commit()
-            
-            await interaction.response.send_message(
-                f"Rasgos eliminados de **{nombre}**: {', '.join(rasgos_existentes)}", 
-                ephemeral=True
-            )
-            
-        except Exception as e:
-            await interaction.response.send_message(f"Error al eliminar rasgos: {str(e)}", ephemeral=True)
-        finally:
-            cur.close()
-    
+            """, (json.dumps(nuevos_rasgos), guild_id, nombre))
+        return cambiados
+
     @personaje.command(name="eliminar", description="Elimina un personaje (solo dueño o admin)")
+    @app_commands.autocomplete(nombre=personaje_autocomplete)
     async def eliminar_personaje(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
-        
         try:
-            cur.execute("""
-                SELECT user_id FROM characters 
-                WHERE guild_id=%s AND name=%s
-            """, (str(interaction.guild.id), nombre))
-            result = cur.fetchone()
-            
-            if not result:
-                await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
-                return
-                
-            owner_id = result[0]
-            is_owner = str(interaction.user.id) == owner_id
-            is_admin = interaction.user.guild_permissions.administrator
-            
-            if not is_owner and not is_admin:
-                await interaction.response.send_message("Solo el dueño del personaje o un administrador puede eliminarlo.", ephemeral=True)
-                return
-                
-            cur.execute("""
-                DELETE FROM characters 
-                WHERE guild_id=%s AND name=%s
-            """, (str(interaction.guild.id), nombre))
-            self.conn.commit()
-            
-            await interaction.response.send_message(f"Personaje **{nombre}** eliminado con éxito.", ephemeral=True)
-            
+            error, deleted_ids = await self.db.run(
+                self._eliminar_tx, str(interaction.guild.id), nombre,
+                str(interaction.user.id), interaction.user.guild_permissions.administrator
+            )
         except Exception as e:
             await interaction.response.send_message("Ocurrió un error al eliminar el personaje.", ephemeral=True)
-        finally:
-            cur.close()
-    
-    @personaje.command(name="aprobar", description="Aprueba un personaje (solo admins)")
-    @app_commands.checks.has_permissions(administrator=True)
-    async def aprobar_personaje(self, interaction: discord.Interaction, nombre: str):
-        cur = self.conn.cursor()
+            return
+
+        if error:
+            await interaction.response.send_message(error, ephemeral=True)
+            return
+
+        for char_id in deleted_ids:
+            self.bot.dispatch("inventory_change", char_id)
+        if deleted_ids:
+            self.bot.names.remove(interaction.guild.id, "personajes", nombre)
+
+        await interaction.response.send_message(f"Personaje **{nombre}** eliminado con éxito.", ephemeral=True)
+
+    def _eliminar_tx(self, cur, guild_id, nombre, user_id, is_admin):
         cur.execute("""
-            UPDATE characters
-            SET approved = TRUE
+            SELECT user_id FROM characters 
             WHERE guild_id=%s AND name=%s
-            RETURNING name
-        """, (str(interaction.guild.id), nombre))
+        """, (guild_id, nombre))
         result = cur.fetchone()
-        self.conn.commit()
-        cur.close()
 
+        if not result:
+            return "No encontré ese personaje.", None
+
+        if result[0] != user_id and not is_admin:
+            return "Solo el dueño del personaje o un administrador puede eliminarlo.", None
+
+        cur.execute("""
+            DELETE FROM characters 
+            WHERE guild_id=%s AND name=%s
+            RETURNING id
+        """, (guild_id, nombre))
+        return None, [row[0] for row in cur.fetchall()]
+
+    @personaje.command(name="aprobar", description="Aprueba un personaje (solo admins)")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.autocomplete(nombre=personaje_autocomplete)
+    async def aprobar_personaje(self, interaction: discord.Interaction, nombre: str):
+        async with await self.db.cursor() as cur:
+            await cur.execute("""
+                UPDATE characters
+                SET approved = TRUE
+                WHERE guild_id=%s AND name=%s
+                RETURNING name
+            """, (str(interaction.guild.id), nombre))
+            result = cur.fetchone()
+            await cur.commit()
+
+        # La respuesta se envía con la conexión ya devuelta al pool
         if not result:
             await interaction.response.send_message("No encontré ese personaje.", ephemeral=True)
             return
@@ -331,14 +324,13 @@ class Personajes(commands.Cog):
 
     @personaje.command(name="lista", description="Lista todos los personajes del servidor")
     async def lista_personajes(self, interaction: discord.Interaction):
-        cur = self.conn.cursor()
-        cur.execute("""
-            SELECT name, approved FROM characters
-            WHERE guild_id=%s
-            ORDER BY name
-        """, (str(interaction.guild.id),))
-        rows = cur.fetchall()
-        cur.close()
+        async with await self.db.cursor() as cur:
+            await cur.execute("""
+                SELECT name, approved FROM characters
+                WHERE guild_id=%s
+                ORDER BY name
+            """, (str(interaction.guild.id),))
+            rows = cur.fetchall()
 
         if not rows:
             await interaction.response.send_message("No hay personajes registrados en este servidor.", ephemeral=True)
@@ -2,20 +2,19 @@
 import os
 import asyncio
 import discord
-import time
 from dotenv import load_dotenv
 from discord.ext import commands
+from utils.db import Database
 from utils.db_init import init_db
-import psycopg2
+from utils.autocomplete import NameIndex
+from utils.effects import EffectScheduler
+from utils.item_catalog import ItemCatalog
+from utils.ratelimit import RateLimiter, cargar_limites, instalar
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Conexión DB (la dejamos global y la guardamos en bot)
-conn = psycopg2.connect(DATABASE_URL, sslmode="require")
-init_db(conn)
-
 intents = discord.Intents.default()
 intents.message_content = True
 
@@ -27,8 +26,27 @@ bot = commands.Bot(
     status=discord.Status.do_not_disturb,
 )
 
-# Exponer conexión al resto de cogs
-bot.conn = conn
+# Pool de conexiones compartido por todos los cogs
+bot.db = Database(
+    DATABASE_URL,
+    minsize=int(os.getenv("DB_POOL_MIN", "1")),
+    maxsize=int(os.getenv("DB_POOL_MAX", "5")),
+    acquire_timeout=float(os.getenv("DB_ACQUIRE_TIMEOUT", "10")),
+    sslmode="require",
+)
+
+# Catálogo de items en memoria (búsquedas por id/nombre sin ir a la base de datos)
+bot.items = ItemCatalog(bot.db)
+
+# Nombres por servidor para el autocompletado de personajes, items, mercados y ranuras
+bot.names = NameIndex(bot.db)
+
+# Caducidad de los efectos temporales (un solo temporizador sobre un montículo)
+bot.effects = EffectScheduler(bot)
+
+# Cubos de tokens por usuario y servidor delante de todos los comandos
+bot.limits = RateLimiter(cargar_limites(os.getenv("RATE_LIMITS", "")))
+instalar(bot, bot.limits)
 
 # Lista de cogs que vas a cargar (ajusta nombres si tus ficheros son distintos)
 COGS = [
@@ -83,12 +101,24 @@ async def ping(interaction: discord.Interaction):
 
 async def main():
     async with bot:
-        # cargar extensiones antes de start evita condiciones raras
-        await load_cogs()
-        await bot.start(TOKEN)
+        await bot.db.open()
+        try:
+            await init_db(bot.db)
+            await bot.effects.start()
+            # cargar extensiones antes de start evita condiciones raras
+            await load_cogs()
+            await bot.start(TOKEN)
+        finally:
+            bot.effects.stop()
+            await bot.db.close()
 
 if __name__ == "__main__":
-    from webserver import keep_alive
+    from webserver import keep_alive, register_metrics
+    register_metrics("db", bot.db.stats.snapshot)
+    register_metrics("items", bot.items.stats)
+    register_metrics("autocomplete", bot.names.stats)
+    register_metrics("effects", bot.effects.stats)
+    register_metrics("ratelimit", bot.limits.stats)
     keep_alive()
     asyncio.run(main())
 
@@ -0,0 +1,59 @@
+"""Copia los precios JSONB de market_listings a la tabla listing_prices.
+
+Uso: python scripts/backfill_listing_prices.py
+
+Es idempotente: solo migra listados que todavía no tienen filas en
+listing_prices, así que se puede ejecutar varias veces sin duplicar nada.
+"""
+import os
+
+import psycopg2
+from dotenv import load_dotenv
+
+# Componentes de un precio JSONB agrupados por item. Acepta arrays y arrays
+# guardados como texto JSON; cualquier otra cosa cuenta como precio vacío.
+COMPONENTES = """
+    SELECT (e->>'item_id')::int AS item_id, sum((e->>'qty')::int) AS qty
+    FROM jsonb_array_elements(
+        CASE jsonb_typeof({col})
+            WHEN 'array' THEN {col}
+            WHEN 'string' THEN ({col} #>> '{{}}')::jsonb
+            ELSE '[]'::jsonb
+        END
+    ) AS e
+    GROUP BY 1
+"""
+
+BACKFILL_SQL = f"""
+    INSERT INTO listing_prices (listing_id, price_slot, item_id, qty, initial_qty)
+    SELECT ml.id, s.slot, comp.item_id, comp.qty, comp.initial_qty
+    FROM market_listings ml
+    CROSS JOIN LATERAL (VALUES
+        (1, ml.price, ml.initial_price),
+        (2, ml.price2, ml.initial_price2),
+        (3, ml.price3, ml.initial_price3)
+    ) AS s(slot, price, initial)
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(c.item_id, i.item_id) AS item_id, c.qty, i.qty AS initial_qty
+        FROM ({COMPONENTES.format(col="s.price")}) c
+        FULL JOIN ({COMPONENTES.format(col="s.initial")}) i ON i.item_id = c.item_id
+    ) AS comp
+    WHERE NOT EXISTS (SELECT 1 FROM listing_prices lp WHERE lp.listing_id = ml.id)
+      AND EXISTS (SELECT 1 FROM items WHERE items.id = comp.item_id)
+    ON CONFLICT DO NOTHING
+"""
+
+
+def main():
+    load_dotenv()
+    conn = psycopg2.connect(os.getenv("DATABASE_URL"), sslmode="require")
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(BACKFILL_SQL)
+            print(f"Componentes migrados: {cur.rowcount}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Mide cuántos mensajes por segundo descarta el listener de comandos personalizados.
+
+Uso: python scripts/bench_custom_commands.py [mensajes]
+
+Pasa mensajes normales de chat (y algunos con prefijo pero sin comando, o
+solo con el prefijo seguido de espacios) por CustomCommands.on_message con
+1000 comandos cargados en memoria. No necesita base de datos ni conexión a
+Discord: si un mensaje llegara a la base de datos el script falla.
+"""
+import asyncio
+import os
+import random
+import string
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.custom_commands import CustomCommands  # noqa: E402
+
+
+class SinBaseDeDatos:
+    async def cursor(self):
+        raise AssertionError("Un mensaje sin comando no debe tocar la base de datos")
+
+    async def run(self, *args, **kwargs):
+        raise AssertionError("Un mensaje sin comando no debe tocar la base de datos")
+
+
+def _mensajes(n, guild):
+    autor = SimpleNamespace(bot=False)
+    palabras = ["hola", "qué tal", "vamos al mercado", "tiro iniciativa", "jajaja", "gg"]
+    mensajes = []
+    for i in range(n):
+        if i % 50 == 0:
+            # Solo el prefijo seguido de espacios o saltos de línea
+            texto = "." + random.choice([" ", "\n", "  \t", ""])
+        elif i % 10 == 0:
+            texto = "." + "".join(random.choices(string.ascii_lowercase, k=8)) + " algo"
+        else:
+            texto = " ".join(random.choices(palabras, k=random.randint(1, 12)))
+        mensajes.append(SimpleNamespace(content=texto, author=autor, guild=guild))
+    return mensajes
+
+
+async def main(n):
+    bot = SimpleNamespace(db=SinBaseDeDatos(), get_command=lambda nombre: None)
+    cog = CustomCommands(bot)
+    guild = SimpleNamespace(id=1)
+    cog._nombres = {"1": {f"comando{i}" for i in range(1000)}}
+    mensajes = _mensajes(n, guild)
+
+    inicio = time.perf_counter()
+    for message in mensajes:
+        await cog.on_message(message)
+    duracion = time.perf_counter() - inicio
+    print(f"{n} mensajes en {duracion * 1000:.1f} ms -> {n / duracion:,.0f} mensajes/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000))
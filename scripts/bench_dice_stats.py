@@ -0,0 +1,81 @@
+"""Comprueba que /dados stats cumple el presupuesto de 50 ms por expresión.
+
+Uso: python scripts/bench_dice_stats.py [presupuesto_ms]
+
+Recorre una rejilla de expresiones (sumas, explosiones, éxitos y kh/kl/dh/dl
+con hasta 999 dados y hasta 10000 caras) más las más caras conocidas. Cada
+expresión se calcula en frío (sin la caché de distribuciones) y se toma la
+mediana de tres vueltas. Las expresiones que rechaza el estimador de coste no
+se calculan; todas las demás deben quedar por debajo del presupuesto. Sale con
+código 1 si alguna lo supera.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import dice_stats  # noqa: E402
+from utils.dice import DiceError  # noqa: E402
+
+CONOCIDAS = [
+    "100d20kh50", "40d100kh25", "100d1000kh1", "999d1000", "100d20kh99",
+    "100d1000", "100d100kh50", "100d6!kh50", "4d6kh3", "2d20kh1", "3d8+2",
+    "50d20kh10+50d20kl10", "1d1000*100+100d1000", "100d10!",
+]
+
+
+def _rejilla():
+    for cantidad in (1, 2, 5, 10, 20, 50, 100, 200, 500, 999):
+        for caras in (4, 6, 20, 100, 1000, 10000):
+            base = f"{cantidad}d{caras}"
+            yield base
+            yield base + "!"
+            yield f"{base}>={max(caras // 2, 1)}"
+            for n in sorted({1, cantidad // 4, cantidad // 2, cantidad - 1}):
+                if 0 < n < cantidad:
+                    yield f"{base}kh{n}"
+                    yield f"{base}dl{n}"
+
+
+def _medir(expresion):
+    tiempos = []
+    for _ in range(3):
+        dice_stats._distribucion.cache_clear()
+        inicio = time.perf_counter()
+        dice_stats.distribucion(expresion)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main(presupuesto):
+    aceptadas, rechazadas, lentas = [], 0, []
+    for expresion in CONOCIDAS + list(_rejilla()):
+        try:
+            ms = _medir(expresion)
+        except DiceError:
+            rechazadas += 1
+            continue
+        aceptadas.append((ms, expresion))
+        if ms > presupuesto:
+            lentas.append((ms, expresion))
+
+    aceptadas.sort(reverse=True)
+    print(f"{len(aceptadas)} aceptadas, {rechazadas} rechazadas por el estimador")
+    print("Más lentas:")
+    for ms, expresion in aceptadas[:10]:
+        print(f"  {expresion:<24} {ms:7.1f} ms")
+    for expresion in CONOCIDAS:
+        estado = next((f"{ms:.1f} ms" for ms, e in aceptadas if e == expresion), "rechazada")
+        print(f"  {expresion:<24} {estado}")
+
+    if lentas:
+        print(f"FALLO: {len(lentas)} expresiones aceptadas superan {presupuesto} ms")
+        return 1
+    print(f"OK: todas las expresiones aceptadas bajan de {presupuesto} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(float(sys.argv[1]) if len(sys.argv) > 1 else 50.0))
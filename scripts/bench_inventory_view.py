@@ -0,0 +1,145 @@
+"""Mide /inventario ver sobre un personaje con 200 items distintos y 15 ranuras.
+
+Uso: python scripts/bench_inventory_view.py [items] [ranuras]
+
+Necesita la base de datos de DATABASE_URL con las migraciones aplicadas. Crea
+un servidor ficticio con un personaje que tiene 200 items distintos (por
+defecto), dos equipados en cada una de las 15 ranuras y el resto en el
+inventario general. Compara el camino anterior (personaje, ranuras, una
+consulta por ranura y otra para el inventario general) con el comando
+actual en frío (una consulta) y con la tabla ya en la caché. Toma la
+mediana de veinte vueltas. Sale con código 1 si las tablas no coinciden.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.inventario import Inventario  # noqa: E402
+from scripts.datos_prueba import (  # noqa: E402
+    borrar_servidor, conectar, crear_items, crear_personajes, dar_items, servidor_prueba,
+)
+
+PERSONAJE = "Cargado"
+POR_RANURA = 2
+VUELTAS = 20
+
+
+class Respuesta:
+    async def send_message(self, *args, **kwargs):
+        self.kwargs = kwargs
+
+
+def _preparar(cur, guild_id, items, ranuras):
+    char_id = crear_personajes(cur, guild_id, [PERSONAJE])[PERSONAJE]
+    item_ids = list(crear_items(cur, guild_id, [f"objeto {i:03d}" for i in range(items)], max_usos=5).values())
+    dar_items(cur, [(char_id, item_id, 1 + n % 7) for n, item_id in enumerate(item_ids)])
+
+    nombres = [f"ranura {r:02d}" for r in range(ranuras)]
+    cur.execute("""
+        INSERT INTO equipment_slots (guild_id, name, slot_limit)
+        SELECT %s, n, %s FROM unnest(%s::text[]) AS n
+    """, (guild_id, POR_RANURA, nombres))
+    equipados = [(item_ids[r * POR_RANURA + k], nombre) for r, nombre in enumerate(nombres) for k in range(POR_RANURA)
+                 if r * POR_RANURA + k < len(item_ids)]
+    cur.execute("""
+        UPDATE inventory inv SET equipped_slot = e.ranura, current_uses = 3
+        FROM unnest(%s::int[], %s::text[]) AS e(item_id, ranura)
+        WHERE inv.character_id = %s AND inv.item_id = e.item_id
+    """, ([e[0] for e in equipados], [e[1] for e in equipados], char_id))
+
+
+async def _ruta_antigua(cog, db, guild_id):
+    """Como antes de agrupar: 2 consultas más una por ranura y otra para lo no equipado"""
+    async with await db.cursor() as cur:
+        await cur.execute("SELECT id FROM characters WHERE guild_id=%s AND name=%s", (guild_id, PERSONAJE))
+        char_id = cur.fetchone()[0]
+        await cur.execute("SELECT name FROM equipment_slots WHERE guild_id=%s ORDER BY name", (guild_id,))
+        ranuras = [row[0] for row in cur.fetchall()]
+
+        table_lines = ["```", "ITEM                 | CANT | USOS | RANURA", "-" * 50]
+        for ranura in ranuras:
+            await cur.execute("""
+                SELECT i.name, inv.quantity, i.max_uses, inv.current_uses
+                FROM inventory inv JOIN items i ON inv.item_id = i.id
+                WHERE inv.character_id=%s AND inv.equipped_slot=%s AND inv.quantity > 0
+                ORDER BY i.name
+            """, (char_id, ranura))
+            filas = cur.fetchall()
+            if filas:
+                table_lines.append(f"--- {ranura.upper()} ---")
+                table_lines.extend(cog._fila_inventario(*fila, ranura[:6]) for fila in filas)
+
+        await cur.execute("""
+            SELECT i.name, inv.quantity, i.max_uses, inv.current_uses
+            FROM inventory inv JOIN items i ON inv.item_id = i.id
+            WHERE inv.character_id=%s AND inv.equipped_slot IS NULL AND inv.quantity > 0
+            ORDER BY i.name
+        """, (char_id,))
+        filas = cur.fetchall()
+        if filas:
+            table_lines.append("--- INVENTARIO GENERAL ---")
+            table_lines.extend(cog._fila_inventario(*fila, "LIBRE") for fila in filas)
+        table_lines.append("```")
+        return table_lines, len(ranuras) + 3
+
+
+async def _ver(cog, guild_id):
+    interaction = SimpleNamespace(guild=SimpleNamespace(id=guild_id), response=Respuesta())
+    await Inventario.ver_inventario.callback(cog, interaction, PERSONAJE)
+    embed = interaction.response.kwargs.get("embed")
+    if embed is None:
+        raise RuntimeError(f"/inventario ver falló: {interaction.response.kwargs}")
+    return embed.description.split("\n")
+
+
+async def _mediana(fn):
+    tiempos = []
+    for _ in range(VUELTAS):
+        inicio = time.perf_counter()
+        resultado = await fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), resultado
+
+
+async def main(items, ranuras):
+    db = conectar()
+    await db.open()
+    cog = Inventario(SimpleNamespace(db=db))
+    guild_id = servidor_prueba()
+    try:
+        await db.run(_preparar, guild_id, items, ranuras)
+
+        ms_antes, (tabla_antes, consultas) = await _mediana(lambda: _ruta_antigua(cog, db, guild_id))
+
+        async def en_frio():
+            cog._vistas.clear()
+            cog._personajes.clear()
+            return await _ver(cog, guild_id)
+
+        ms_frio, tabla_ahora = await _mediana(en_frio)
+        ms_cache, tabla_cache = await _mediana(lambda: _ver(cog, guild_id))
+
+        print(f"/inventario ver: {items} items distintos, {ranuras} ranuras (mediana de {VUELTAS} vueltas)")
+        print(f"  antes:        {consultas:3d} consultas {ms_antes:8.2f} ms")
+        print(f"  ahora, frío:    1 consulta  {ms_frio:8.2f} ms")
+        print(f"  ahora, caché:   0 consultas {ms_cache:8.3f} ms")
+
+        if sorted(tabla_antes) != sorted(tabla_ahora) or tabla_ahora != tabla_cache:
+            print("FALLO: las tablas no coinciden")
+            return 1
+        print("OK: misma tabla en los tres caminos")
+        return 0
+    finally:
+        await db.run(borrar_servidor, guild_id)
+        await db.close()
+
+
+if __name__ == "__main__":
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ranuras = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    sys.exit(asyncio.run(main(items, ranuras)))
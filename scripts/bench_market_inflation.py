@@ -0,0 +1,137 @@
+"""Compara /mercado inflacion listado a listado con el UPDATE único sobre 10k listados.
+
+Uso: python scripts/bench_market_inflation.py [listados] [porcentaje]
+
+Necesita la base de datos de DATABASE_URL con las migraciones aplicadas. Crea
+un servidor ficticio con 10 mercados que suman los listados pedidos (por
+defecto 10000), cada uno con tres precios de 1 a 3 componentes. Aplica la
+inflación primero como lo hacía el comando antes (leer todos los precios,
+calcular max(1, ceil(qty * ratio)) en Python y un UPDATE por listado, cada
+uno con su viaje al executor) y después con Market._inflacion_tx. Entre las
+dos vueltas se reinician los precios. Sale con código 1 si los precios
+resultantes no son idénticos.
+"""
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.market import Market  # noqa: E402
+from scripts.datos_prueba import (  # noqa: E402
+    borrar_servidor, conectar, crear_items, crear_listados, crear_mercado, servidor_prueba,
+)
+
+MERCADOS = 10
+MONEDAS = 20
+
+
+def _preparar(cur, guild_id, listados):
+    rng = random.Random(7)
+    por_mercado = math.ceil(listados / MERCADOS)
+    productos = list(crear_items(cur, guild_id, [f"Producto {i}" for i in range(por_mercado)]).values())
+    monedas = list(crear_items(cur, guild_id, [f"Moneda {i}" for i in range(MONEDAS)]).values())
+    for m in range(MERCADOS):
+        market_id = crear_mercado(cur, guild_id, f"Mercado {m}")
+        cuantos = max(0, min(por_mercado, listados - m * por_mercado))
+        crear_listados(cur, market_id, [
+            (item_id, 10, {
+                ranura: [(moneda, rng.randint(1, 50)) for moneda in rng.sample(monedas, rng.randint(1, 3))]
+                for ranura in (1, 2, 3)
+            })
+            for item_id in productos[:cuantos]
+        ])
+
+
+def _precios(cur, guild_id):
+    cur.execute("""
+        SELECT lp.listing_id, lp.price_slot, lp.item_id, lp.qty
+        FROM listing_prices lp
+        JOIN market_listings ml ON ml.id = lp.listing_id
+        JOIN markets m ON m.id = ml.market_id
+        WHERE m.guild_id = %s
+        ORDER BY 1, 2, 3
+    """, (guild_id,))
+    return cur.fetchall()
+
+
+def _reiniciar(cur, guild_id):
+    cur.execute("""
+        UPDATE listing_prices lp SET qty = lp.initial_qty
+        FROM market_listings ml, markets m
+        WHERE lp.listing_id = ml.id AND ml.market_id = m.id AND m.guild_id = %s
+    """, (guild_id,))
+
+
+async def _ruta_antigua(db, guild_id, ratio):
+    """Lectura completa, cálculo en Python y un UPDATE por listado"""
+    cur = await db.cursor()
+    try:
+        await cur.execute("""
+            SELECT lp.listing_id, lp.price_slot, lp.item_id, lp.qty
+            FROM listing_prices lp
+            JOIN market_listings ml ON ml.id = lp.listing_id
+            JOIN markets m ON m.id = ml.market_id
+            WHERE m.guild_id = %s AND lp.qty IS NOT NULL
+        """, (guild_id,))
+        por_listado = {}
+        for listing_id, ranura, item_id, qty in cur.fetchall():
+            por_listado.setdefault(listing_id, []).append((ranura, item_id, max(1, math.ceil(qty * ratio))))
+
+        for listing_id, componentes in por_listado.items():
+            ranuras, item_ids, qtys = zip(*componentes)
+            await cur.execute("""
+                UPDATE listing_prices lp SET qty = c.q
+                FROM unnest(%s::int[], %s::int[], %s::int[]) AS c(s, i, q)
+                WHERE lp.listing_id = %s AND lp.price_slot = c.s AND lp.item_id = c.i
+            """, (list(ranuras), list(item_ids), list(qtys), listing_id))
+        await cur.commit()
+        return len(por_listado)
+    finally:
+        await cur.close()
+
+
+async def main(listados, porcentaje):
+    db = conectar()
+    await db.open()
+    market = Market(SimpleNamespace(db=db))
+    guild_id = servidor_prueba()
+    ratio = 1.0 + porcentaje / 100.0
+    try:
+        await db.run(_preparar, guild_id, listados)
+
+        inicio = time.perf_counter()
+        antiguos = await _ruta_antigua(db, guild_id, ratio)
+        t_antigua = time.perf_counter() - inicio
+        precios_antiguos = await db.run(_precios, guild_id)
+
+        await db.run(_reiniciar, guild_id)
+
+        inicio = time.perf_counter()
+        nuevos = await db.run(market._inflacion_tx, guild_id, ratio)
+        t_nueva = time.perf_counter() - inicio
+        precios_nuevos = await db.run(_precios, guild_id)
+
+        print(f"Inflación de {porcentaje}% sobre {listados} listados ({len(precios_nuevos)} componentes)")
+        print(f"  antes (UPDATE por listado): {t_antigua * 1000:8.0f} ms, {antiguos} listados")
+        print(f"  ahora (un UPDATE):          {t_nueva * 1000:8.0f} ms, {nuevos} listados")
+        print(f"  mejora: x{t_antigua / t_nueva:.1f}")
+
+        if precios_antiguos != precios_nuevos or antiguos != nuevos:
+            print("FALLO: los dos caminos no dejan los mismos precios")
+            return 1
+        print("OK: precios idénticos en los dos caminos")
+        return 0
+    finally:
+        await db.run(borrar_servidor, guild_id)
+        await db.close()
+
+
+if __name__ == "__main__":
+    listados = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    porcentaje = float(sys.argv[2]) if len(sys.argv) > 2 else 7.0
+    sys.exit(asyncio.run(main(listados, porcentaje)))
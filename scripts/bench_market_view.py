@@ -0,0 +1,136 @@
+"""Compara consultas y latencia de /mercado ver antes y después de agrupar los nombres de los precios.
+
+Uso: python scripts/bench_market_view.py [listados]
+
+Necesita la base de datos de DATABASE_URL con las migraciones aplicadas. Crea
+un servidor ficticio con un mercado de 500 listados (por defecto), cada uno
+con tres precios de 1 a 3 componentes. Mide el camino anterior, que leía los
+listados y después buscaba el nombre de cada componente con su propio
+SELECT, frente a Market._listados_sql, que lo resuelve todo en una consulta.
+Cuenta las consultas de cada camino y toma la mediana de cinco vueltas. Sale
+con código 1 si las dos tablas no coinciden.
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.market import Market  # noqa: E402
+from scripts.datos_prueba import (  # noqa: E402
+    borrar_servidor, conectar, crear_items, crear_listados, crear_mercado, servidor_prueba,
+)
+
+MONEDAS = 30
+VUELTAS = 5
+
+
+class CursorContado:
+    """Cursor asíncrono que cuenta las consultas que pasan por él"""
+
+    def __init__(self, cur):
+        self._cur = cur
+        self.consultas = 0
+
+    async def execute(self, query, params=None):
+        self.consultas += 1
+        await self._cur.execute(query, params)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+
+def _preparar(cur, guild_id, listados):
+    rng = random.Random(3)
+    productos = crear_items(cur, guild_id, [f"Producto {i:04d}" for i in range(listados)]).values()
+    monedas = list(crear_items(cur, guild_id, [f"Moneda {i:02d}" for i in range(MONEDAS)]).values())
+    market_id = crear_mercado(cur, guild_id, "Mercado Grande")
+    crear_listados(cur, market_id, [
+        (item_id, 10, {
+            ranura: [(moneda, rng.randint(1, 50)) for moneda in rng.sample(monedas, rng.randint(1, 3))]
+            for ranura in (1, 2, 3)
+        })
+        for item_id in productos
+    ])
+    return market_id
+
+
+async def _ruta_antigua(cur, market_id):
+    """Listados y componentes en bloque, pero un SELECT por nombre de componente"""
+    await cur.execute("""
+        SELECT ml.id, i.name, ml.current_stock
+        FROM market_listings ml JOIN items i ON i.id = ml.item_id
+        WHERE ml.market_id = %s
+        ORDER BY i.name
+    """, (market_id,))
+    listados = cur.fetchall()
+    await cur.execute("""
+        SELECT lp.listing_id, lp.price_slot, lp.item_id, lp.qty
+        FROM listing_prices lp JOIN market_listings ml ON ml.id = lp.listing_id
+        WHERE ml.market_id = %s AND lp.qty IS NOT NULL
+    """, (market_id,))
+    precios = {}
+    for listing_id, ranura, item_id, qty in cur.fetchall():
+        precios.setdefault((listing_id, ranura), []).append((item_id, qty))
+
+    filas = []
+    for listing_id, nombre, stock in listados:
+        textos = []
+        for ranura in (1, 2, 3):
+            partes = []
+            for item_id, qty in precios.get((listing_id, ranura), []):
+                await cur.execute("SELECT name FROM items WHERE id = %s", (item_id,))
+                partes.append((cur.fetchone()[0], qty))
+            textos.append(", ".join(f"{qty}x{n}" for n, qty in sorted(partes)) or None)
+        filas.append((nombre, *textos, stock))
+    return filas
+
+
+async def _ruta_nueva(cur, market_id):
+    await cur.execute(Market._listados_sql(), (market_id,))
+    return [tuple(fila) for fila in cur.fetchall()]
+
+
+async def _medir(db, ruta, market_id):
+    tiempos = []
+    for _ in range(VUELTAS):
+        async with await db.cursor() as cur:
+            contado = CursorContado(cur)
+            inicio = time.perf_counter()
+            filas = await ruta(contado, market_id)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), contado.consultas, filas
+
+
+async def main(listados):
+    db = conectar()
+    await db.open()
+    guild_id = servidor_prueba()
+    try:
+        market_id = await db.run(_preparar, guild_id, listados)
+
+        ms_antes, consultas_antes, filas_antes = await _medir(db, _ruta_antigua, market_id)
+        ms_ahora, consultas_ahora, filas_ahora = await _medir(db, _ruta_nueva, market_id)
+
+        print(f"/mercado ver sobre un mercado de {listados} listados (mediana de {VUELTAS} vueltas)")
+        print(f"  antes: {consultas_antes:6d} consulta(s) {ms_antes:8.1f} ms")
+        print(f"  ahora: {consultas_ahora:6d} consulta(s) {ms_ahora:8.1f} ms")
+
+        if filas_antes != filas_ahora:
+            print("FALLO: las dos rutas no producen la misma tabla")
+            return 1
+        print("OK: misma tabla en las dos rutas")
+        return 0
+    finally:
+        await db.run(borrar_servidor, guild_id)
+        await db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)))
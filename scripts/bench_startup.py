@@ -0,0 +1,81 @@
+"""Mide lo que tarda el arranque en preparar el esquema según crece la base de datos.
+
+Uso: python scripts/bench_startup.py [filas,filas,...]
+
+Necesita la base de datos de DATABASE_URL. Úsalo contra una base de
+desarrollo: la ruta anterior reescribe characters y bloquea las tablas
+mientras dura, aunque al final se deshace. Crea un servidor ficticio y lo va
+llenando hasta cada tamaño pedido (por defecto 10000 y 100000 personajes, con
+una fila de inventario cada uno). En cada tamaño compara:
+
+- antes: ejecutar el esquema completo en cada arranque, como hacía init_db
+  con sql/schema.sql (aquí 0001_esquema_inicial.sql dentro de una
+  transacción que se deshace);
+- ahora: init_db con todas las migraciones ya aplicadas, que solo lee
+  schema_migrations.
+
+Toma la mediana de tres vueltas.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.datos_prueba import (  # noqa: E402
+    borrar_servidor, conectar, crear_items, crear_personajes, dar_items, servidor_prueba,
+)
+from utils.db_init import init_db  # noqa: E402
+from utils.migrations import load_migrations  # noqa: E402
+
+VUELTAS = 3
+
+
+def _llenar(cur, guild_id, item_id, desde, hasta):
+    personajes = crear_personajes(cur, guild_id, [f"pj{i}" for i in range(desde, hasta)])
+    dar_items(cur, [(char_id, item_id, 1) for char_id in personajes.values()])
+
+
+def _esquema_completo(cur, sql):
+    cur.execute(sql)
+    cur.connection.rollback()
+
+
+async def _mediana(fn):
+    tiempos = []
+    for _ in range(VUELTAS):
+        inicio = time.perf_counter()
+        await fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+async def main(tamanos):
+    db = conectar()
+    await db.open()
+    guild_id = servidor_prueba()
+    esquema = load_migrations()[0].sql
+    try:
+        await init_db(db)
+        item_id = (await db.run(crear_items, guild_id, ["Antorcha"]))["Antorcha"]
+
+        print(f"{'personajes':>10} | {'antes (esquema completo)':>24} | {'ahora (init_db)':>15}")
+        actual = 0
+        for tamano in tamanos:
+            if tamano > actual:
+                await db.run(_llenar, guild_id, item_id, actual, tamano)
+                actual = tamano
+            antes = await _mediana(lambda: db.run(_esquema_completo, esquema))
+            ahora = await _mediana(lambda: init_db(db))
+            print(f"{actual:>10} | {antes:>21.0f} ms | {ahora:>12.1f} ms")
+        return 0
+    finally:
+        await db.run(borrar_servidor, guild_id)
+        await db.close()
+
+
+if __name__ == "__main__":
+    tamanos = [int(t) for t in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000]
+    sys.exit(asyncio.run(main(sorted(tamanos))))
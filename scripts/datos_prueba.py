@@ -0,0 +1,97 @@
+"""Datos sintéticos para los scripts de medición que necesitan PostgreSQL.
+
+No se ejecuta directamente: lo importan los scripts de scripts/. Cada script
+crea su propio servidor ficticio (guild_id "bench-<hex>") en la base de datos
+de DATABASE_URL, con las migraciones ya aplicadas, y lo borra al terminar con
+borrar_servidor(), así que se puede usar una base de desarrollo con datos.
+
+Las funciones que reciben cur son unidades de trabajo para Database.run.
+"""
+import os
+import uuid
+
+from dotenv import load_dotenv
+
+from utils.db import Database
+
+
+def conectar(maxsize=5):
+    """Database sin abrir contra DATABASE_URL (PGSSLMODE=disable para una base local)"""
+    load_dotenv()
+    return Database(
+        os.getenv("DATABASE_URL"),
+        minsize=1,
+        maxsize=maxsize,
+        sslmode=os.getenv("PGSSLMODE", "require"),
+    )
+
+
+def servidor_prueba():
+    return f"bench-{uuid.uuid4().hex[:12]}"
+
+
+def crear_items(cur, guild_id, nombres, categoria=None, max_usos=0):
+    """Inserta los items en una sentencia. Devuelve {nombre: id}"""
+    cur.execute("""
+        INSERT INTO items (guild_id, name, category, max_uses)
+        SELECT %s, n, %s, %s FROM unnest(%s::text[]) AS n
+        RETURNING name, id
+    """, (guild_id, categoria, max_usos, list(nombres)))
+    return dict(cur.fetchall())
+
+
+def crear_personajes(cur, guild_id, nombres, user_id="0"):
+    """Inserta personajes aprobados. Devuelve {nombre: id}"""
+    cur.execute("""
+        INSERT INTO characters (guild_id, user_id, name, approved)
+        SELECT %s, %s, n, TRUE FROM unnest(%s::text[]) AS n
+        RETURNING name, id
+    """, (guild_id, user_id, list(nombres)))
+    return dict(cur.fetchall())
+
+
+def crear_mercado(cur, guild_id, nombre):
+    cur.execute("INSERT INTO markets (guild_id, name) VALUES (%s, %s) RETURNING id", (guild_id, nombre))
+    return cur.fetchone()[0]
+
+
+def crear_listados(cur, market_id, listados):
+    """listados: [(item_id, stock, {ranura: [(item_id, qty), ...]})]. Devuelve los ids.
+
+    Los precios van a listing_prices con qty e initial_qty iguales, como los
+    deja /mercado add_item.
+    """
+    cur.execute("""
+        INSERT INTO market_listings (market_id, item_id, initial_stock, base_stock, current_stock)
+        SELECT %s, i, s, s, s FROM unnest(%s::int[], %s::int[]) AS l(i, s)
+        RETURNING item_id, id
+    """, (market_id, [l[0] for l in listados], [l[1] for l in listados]))
+    ids = dict(cur.fetchall())
+
+    filas = [
+        (ids[item_id], ranura, componente, qty)
+        for item_id, _, precios in listados
+        for ranura, componentes in precios.items()
+        for componente, qty in componentes
+    ]
+    if filas:
+        cur.execute("""
+            INSERT INTO listing_prices (listing_id, price_slot, item_id, qty, initial_qty)
+            SELECT l, r, i, q, q FROM unnest(%s::int[], %s::int[], %s::int[], %s::int[]) AS p(l, r, i, q)
+        """, tuple(list(columna) for columna in zip(*filas)))
+    return [ids[l[0]] for l in listados]
+
+
+def dar_items(cur, filas):
+    """filas: [(character_id, item_id, cantidad)]"""
+    cur.execute("""
+        INSERT INTO inventory (character_id, item_id, quantity)
+        SELECT c, i, q FROM unnest(%s::int[], %s::int[], %s::int[]) AS f(c, i, q)
+        ON CONFLICT (character_id, item_id) DO UPDATE SET quantity = inventory.quantity + EXCLUDED.quantity
+    """, tuple(list(columna) for columna in zip(*filas)))
+
+
+def borrar_servidor(cur, guild_id):
+    """Borra todo lo creado para el servidor ficticio (el resto cae en cascada)"""
+    for tabla in ("encounters", "custom_commands", "equipment_slots", "characters", "markets", "items"):
+        cur.execute(f"DELETE FROM {tabla} WHERE guild_id = %s", (guild_id,))
@@ -0,0 +1,171 @@
+"""Comprueba con EXPLAIN que las consultas principales de los cogs usan índices.
+
+Uso: python scripts/explain_indices.py [personajes]
+
+Necesita la base de datos de DATABASE_URL con las migraciones aplicadas. Crea
+un servidor ficticio con 20000 personajes (por defecto), 2000 items, 500
+mercados de 20 listados, cinco filas de inventario por personaje (un 2 %
+equipadas) y recetas, ejecuta VACUUM ANALYZE y pide el plan de cada consulta
+con los valores del propio servidor. Una consulta pasa si su tabla principal se lee con un índice
+(Index Scan, Index Only Scan o Bitmap Index Scan) y nunca con Seq Scan. Sale
+con código 1 si alguna no pasa.
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.datos_prueba import (  # noqa: E402
+    borrar_servidor, conectar, crear_items, crear_listados, crear_mercado, crear_personajes, dar_items,
+    servidor_prueba,
+)
+
+ITEMS = 2000
+MERCADOS = 500
+LISTADOS_POR_MERCADO = 20
+INVENTARIO_POR_PERSONAJE = 5
+ATRIBUTO_RARO = "Clarividencia"
+
+# (cog, descripción, tabla que debe leerse por índice, consulta). Los
+# parámetros con nombre se rellenan con datos del servidor ficticio.
+CONSULTAS = [
+    ("personajes", "personaje por nombre", "characters",
+     "SELECT id FROM characters WHERE guild_id=%(guild_id)s AND name=%(personaje)s"),
+    ("atributos", "personajes con un atributo", "characters",
+     "SELECT COUNT(*) FROM characters WHERE guild_id = %(guild_id)s AND attributes ? %(atributo)s"),
+    ("item", "item sin distinguir mayúsculas", "items",
+     "SELECT id FROM items WHERE guild_id = %(guild_id)s AND lower(name) = lower(%(item)s)"),
+    ("market", "mercado sin distinguir mayúsculas", "markets",
+     "SELECT id FROM markets WHERE guild_id=%(guild_id)s AND lower(name)=lower(%(mercado)s)"),
+    ("market", "listados de un mercado", "market_listings",
+     "SELECT id, item_id, current_stock FROM market_listings WHERE market_id = %(market_id)s"),
+    ("market", "precios de un listado", "listing_prices",
+     "SELECT item_id, qty FROM listing_prices WHERE listing_id = %(listing_id)s AND price_slot = 1"),
+    ("inventario", "inventario de un personaje", "inventory",
+     "SELECT item_id, quantity FROM inventory WHERE character_id = %(char_id)s AND quantity > 0"),
+    ("inventario", "ocupación de una ranura", "inventory",
+     "SELECT COUNT(*) FROM inventory WHERE character_id=%(char_id)s AND equipped_slot=%(ranura)s"),
+    ("craft", "receta de un objeto", "recipes",
+     "SELECT components FROM recipes WHERE result_item_id=%(item_id)s"),
+]
+
+ESCANEOS_INDICE = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+
+def _preparar(cur, guild_id, personajes):
+    rng = random.Random(11)
+    char_ids = list(crear_personajes(cur, guild_id, [f"pj{i}" for i in range(personajes)]).values())
+    # Un atributo que solo tiene el 1 % de los personajes
+    cur.execute("""
+        UPDATE characters SET attributes = attributes || jsonb_build_object(%s, 1)
+        WHERE id = ANY(%s)
+    """, (ATRIBUTO_RARO, char_ids[::100]))
+
+    items = crear_items(cur, guild_id, [f"Item {i}" for i in range(ITEMS)])
+    item_ids = list(items.values())
+    dar_items(cur, [(char_id, item_id, 1) for char_id in char_ids
+                    for item_id in rng.sample(item_ids, INVENTARIO_POR_PERSONAJE)])
+    cur.execute("""
+        UPDATE inventory SET equipped_slot = 'mano'
+        WHERE character_id = ANY(%s)
+    """, (char_ids[::50],))
+
+    market_ids = []
+    for m in range(MERCADOS):
+        market_id = crear_mercado(cur, guild_id, f"Mercado {m}")
+        listing_ids = crear_listados(cur, market_id, [
+            (item_id, 10, {1: [(rng.choice(item_ids), rng.randint(1, 9))]})
+            for item_id in rng.sample(item_ids, LISTADOS_POR_MERCADO)
+        ])
+        market_ids.append((market_id, listing_ids[0]))
+
+    cur.execute("""
+        INSERT INTO recipes (result_item_id, components)
+        SELECT i, jsonb_build_array(jsonb_build_object('item_id', i, 'qty', 1))
+        FROM unnest(%s::int[]) AS i
+    """, (item_ids[::2],))
+
+    # VACUUM vuelca la lista pendiente del índice GIN de attributes, como haría
+    # autovacuum en una base asentada; sin él el planificador lo ve demasiado caro.
+    # No puede ir dentro de una transacción.
+    cur.connection.commit()
+    cur.connection.autocommit = True
+    try:
+        for tabla in ("characters", "items", "markets", "market_listings", "listing_prices", "inventory", "recipes"):
+            cur.execute(f"VACUUM ANALYZE {tabla}")
+    finally:
+        cur.connection.autocommit = False
+
+    market_id, listing_id = market_ids[MERCADOS // 2]
+    return {
+        "guild_id": guild_id,
+        "personaje": f"pj{personajes // 2}",
+        "atributo": ATRIBUTO_RARO,
+        "item": f"ITEM {ITEMS // 2}",
+        "item_id": items[f"Item {ITEMS // 2}"],
+        "mercado": f"mercado {MERCADOS // 2}",
+        "market_id": market_id,
+        "listing_id": listing_id,
+        "char_id": char_ids[0],
+        "ranura": "mano",
+    }
+
+
+def _nodos(plan):
+    yield plan
+    for hijo in plan.get("Plans", []):
+        yield from _nodos(hijo)
+
+
+def _planes(cur, valores):
+    resultados = []
+    for cog, descripcion, tabla, sql in CONSULTAS:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, valores)
+        plan = cur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        lecturas = [n for n in _nodos(plan[0]["Plan"]) if n.get("Relation Name") == tabla]
+        indices = set()
+        for nodo in lecturas:
+            # Un Bitmap Heap Scan lee la tabla con los Bitmap Index Scan que cuelgan de él
+            for n in _nodos(nodo) if nodo["Node Type"] == "Bitmap Heap Scan" else [nodo]:
+                if n["Node Type"] in ESCANEOS_INDICE:
+                    indices.add(n["Index Name"])
+        indices = sorted(indices)
+        secuencial = any(n["Node Type"] == "Seq Scan" for n in lecturas)
+        resultados.append((cog, descripcion, tabla, indices, secuencial))
+    return resultados
+
+
+async def main(personajes):
+    db = conectar()
+    await db.open()
+    guild_id = servidor_prueba()
+    try:
+        valores = await db.run(_preparar, guild_id, personajes)
+        resultados = await db.run(_planes, valores)
+
+        fallos = 0
+        for cog, descripcion, tabla, indices, secuencial in resultados:
+            ok = bool(indices) and not secuencial
+            fallos += not ok
+            detalle = ", ".join(indices) if indices else "sin índice"
+            if secuencial:
+                detalle += " + Seq Scan"
+            print(f"{'OK   ' if ok else 'FALLO'} {cog:<11} {descripcion:<34} {tabla:<16} {detalle}")
+
+        if fallos:
+            print(f"FALLO: {fallos} consultas no usan índice")
+            return 1
+        print("OK: todas las consultas usan índice")
+        return 0
+    finally:
+        await db.run(borrar_servidor, guild_id)
+        await db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)))
@@ -0,0 +1,98 @@
+"""Lanza compras simultáneas contra un listado con poco stock y comprueba que no se vende de más.
+
+Uso: python scripts/stress_market_purchases.py [compras] [stock]
+
+Necesita la base de datos de DATABASE_URL con las migraciones aplicadas. Crea
+un servidor ficticio con un mercado, un listado (por defecto stock 10) que
+cuesta 1 moneda y un personaje con 1 moneda por compra (por defecto 100), y
+las lanza todas a la vez por Market._comprar_tx, la misma unidad de trabajo
+que /mercado comprar, sobre un pool de 20 conexiones. Los nombres del mercado
+y del item se escriben con otras mayúsculas para comprobar también la
+búsqueda sin distinguirlas. Sale con código 1 si no tienen éxito exactamente
+tantas compras como stock o si el stock, los inventarios o las monedas no
+cuadran al terminar.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.market import Market  # noqa: E402
+from scripts.datos_prueba import (  # noqa: E402
+    borrar_servidor, conectar, crear_items, crear_listados, crear_mercado, crear_personajes, dar_items,
+    servidor_prueba,
+)
+
+USER_ID = "1"
+
+
+def _preparar(cur, guild_id, compras, stock):
+    items = crear_items(cur, guild_id, ["Espada", "Moneda"])
+    personajes = crear_personajes(cur, guild_id, [f"pj{i}" for i in range(compras)], USER_ID)
+    market_id = crear_mercado(cur, guild_id, "Mercado Prueba")
+    crear_listados(cur, market_id, [(items["Espada"], stock, {1: [(items["Moneda"], 1)]})])
+    dar_items(cur, [(char_id, items["Moneda"], 1) for char_id in personajes.values()])
+    return items
+
+
+def _recuento(cur, guild_id, items):
+    cur.execute("""
+        SELECT ml.current_stock,
+               (SELECT COALESCE(sum(inv.quantity), 0) FROM inventory inv JOIN characters c ON c.id = inv.character_id
+                WHERE c.guild_id = %s AND inv.item_id = %s),
+               (SELECT COALESCE(sum(inv.quantity), 0) FROM inventory inv JOIN characters c ON c.id = inv.character_id
+                WHERE c.guild_id = %s AND inv.item_id = %s)
+        FROM market_listings ml
+        WHERE ml.item_id = %s
+    """, (guild_id, items["Espada"], guild_id, items["Moneda"], items["Espada"]))
+    return cur.fetchone()
+
+
+async def main(compras, stock):
+    db = conectar(maxsize=20)
+    await db.open()
+    market = Market(SimpleNamespace(db=db))
+    guild_id = servidor_prueba()
+    try:
+        items = await db.run(_preparar, guild_id, compras, stock)
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(
+            db.run(market._comprar_tx, guild_id, USER_ID, False, "mercado PRUEBA", f"pj{i}", "ESPADA", 1, 1)
+            for i in range(compras)
+        ), return_exceptions=True)
+        duracion = time.perf_counter() - inicio
+
+        exitos = sum(1 for r in resultados if not isinstance(r, Exception) and r[0] is None)
+        motivos = Counter(
+            repr(r) if isinstance(r, Exception) else r[0] for r in resultados
+            if isinstance(r, Exception) or r[0] is not None
+        )
+        stock_final, espadas, monedas = await db.run(_recuento, guild_id, items)
+
+        print(f"{compras} compras simultáneas en {duracion * 1000:.0f} ms sobre stock {stock}")
+        print(f"  con éxito: {exitos}")
+        for motivo, veces in motivos.most_common():
+            print(f"  rechazadas ({veces}): {motivo}")
+        print(f"  stock final: {stock_final} · espadas repartidas: {espadas} · monedas restantes: {monedas}")
+
+        esperado = min(compras, stock)
+        if (exitos, stock_final, espadas, monedas) != (esperado, stock - esperado, esperado, compras - esperado):
+            print(f"FALLO: se esperaban {esperado} compras, stock {stock - esperado}, "
+                  f"{esperado} espadas y {compras - esperado} monedas")
+            return 1
+        print("OK: ninguna venta por encima del stock")
+        return 0
+    finally:
+        await db.run(borrar_servidor, guild_id)
+        await db.close()
+
+
+if __name__ == "__main__":
+    compras = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    stock = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    sys.exit(asyncio.run(main(compras, stock)))
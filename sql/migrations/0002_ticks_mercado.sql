@@ -0,0 +1,17 @@
+-- =============================
+-- ACTUALIZACIÓN AUTOMÁTICA DE MERCADOS
+-- =============================
+-- Intervalo en minutos entre actualizaciones automáticas (NULL = solo manual)
+ALTER TABLE markets ADD COLUMN IF NOT EXISTS tick_interval_minutes INTEGER;
+-- Última actualización (manual o automática) aplicada al mercado
+ALTER TABLE markets ADD COLUMN IF NOT EXISTS last_tick_at TIMESTAMPTZ;
+
+-- Registro de cada actualización para vigilar su coste
+CREATE TABLE IF NOT EXISTS market_ticks (
+    id SERIAL PRIMARY KEY,
+    market_id INT NOT NULL REFERENCES markets(id) ON DELETE CASCADE,
+    started_at TIMESTAMPTZ DEFAULT now(),
+    duration_ms NUMERIC NOT NULL,
+    rows_touched INT NOT NULL,
+    manual BOOLEAN DEFAULT FALSE
+);
@@ -0,0 +1,20 @@
+-- =============================
+-- COMPONENTES DE PRECIO DE LOS LISTADOS
+-- =============================
+-- Sustituye a las columnas JSONB price/price2/price3 e initial_price*.
+-- qty es NULL si el componente solo forma parte del precio inicial;
+-- initial_qty es NULL si no formaba parte del precio inicial.
+CREATE TABLE IF NOT EXISTS listing_prices (
+    listing_id INT NOT NULL REFERENCES market_listings(id) ON DELETE CASCADE,
+    price_slot SMALLINT NOT NULL CHECK (price_slot BETWEEN 1 AND 3),
+    item_id INT NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+    qty INT,
+    initial_qty INT,
+    PRIMARY KEY (listing_id, price_slot, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS listing_prices_item_id_idx ON listing_prices (item_id);
+
+-- Las columnas JSONB se conservan solo como origen de scripts/backfill_listing_prices.py
+ALTER TABLE market_listings ALTER COLUMN price DROP NOT NULL;
+ALTER TABLE market_listings ALTER COLUMN initial_price DROP NOT NULL;
@@ -0,0 +1,41 @@
+-- =============================
+-- ÍNDICES PARA LAS BÚSQUEDAS MÁS FRECUENTES
+-- =============================
+-- characters (guild_id, name), markets (guild_id, name) y
+-- inventory (character_id, item_id) ya tienen índice por sus UNIQUE.
+
+-- Búsquedas de items por nombre exacto y sin distinguir mayúsculas
+CREATE INDEX IF NOT EXISTS items_name_idx ON items (name);
+CREATE INDEX IF NOT EXISTS items_lower_name_idx ON items (lower(name));
+
+-- Filtro por categoría en /mercado inflacion
+CREATE INDEX IF NOT EXISTS items_lower_category_idx ON items (lower(category));
+
+-- Mercados por nombre sin distinguir mayúsculas: lower(name)=lower(%s)
+CREATE INDEX IF NOT EXISTS markets_guild_lower_name_idx ON markets (guild_id, lower(name));
+
+-- Solo una pequeña parte del inventario está equipada
+CREATE INDEX IF NOT EXISTS inventory_equipped_idx ON inventory (character_id, equipped_slot)
+    WHERE equipped_slot IS NOT NULL;
+
+-- Recetas por objeto resultante (/crafteo ver y /crafteo usar)
+CREATE INDEX IF NOT EXISTS recipes_result_item_id_idx ON recipes (result_item_id);
+
+-- Consultas "attributes ? 'clave'" sobre los atributos de los personajes
+CREATE INDEX IF NOT EXISTS characters_attributes_gin_idx ON characters USING gin (attributes);
+
+-- items.name ILIKE necesita trigramas. pg_trgm puede no estar permitido en
+-- algunos proveedores: en ese caso se omite el índice sin romper el arranque.
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN insufficient_privilege OR undefined_file OR feature_not_supported THEN
+    RAISE NOTICE 'pg_trgm no disponible: se omite el índice trigram de items.name';
+END $$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        EXECUTE 'CREATE INDEX IF NOT EXISTS items_name_trgm_idx ON items USING gin (name gin_trgm_ops)';
+    END IF;
+END $$;
@@ -0,0 +1,159 @@
+-- =============================
+-- ITEMS POR SERVIDOR
+-- =============================
+-- Cada item pasa a pertenecer a un servidor. Los items existentes se asignan
+-- a los servidores que los usan (inventarios, mercados y, de forma
+-- transitiva, recetas y descomposiciones). Si varios servidores usan el mismo
+-- item, el de menor guild_id se queda con la fila original y el resto recibe
+-- una copia; todas sus referencias se reapuntan a la copia de su servidor,
+-- también las de los precios JSONB de market_listings que todavía no ha
+-- copiado scripts/backfill_listing_prices.py.
+-- Los items que no usa nadie se copian a todos los servidores conocidos.
+
+ALTER TABLE items ADD COLUMN IF NOT EXISTS guild_id TEXT;
+
+-- Componentes [{"item_id": X, ...}] de un JSONB (vacío si no es un array)
+CREATE FUNCTION pg_temp.componentes(data jsonb) RETURNS SETOF int LANGUAGE sql AS $$
+    SELECT (e->>'item_id')::int
+    FROM jsonb_array_elements(CASE WHEN jsonb_typeof(data) = 'array' THEN data ELSE '[]'::jsonb END) AS e
+    WHERE e ? 'item_id'
+$$;
+
+-- Precio JSONB de market_listings: array o array guardado como texto JSON
+CREATE FUNCTION pg_temp.precio(data jsonb) RETURNS jsonb LANGUAGE sql AS $$
+    SELECT CASE WHEN jsonb_typeof(data) = 'string' THEN (data #>> '{}')::jsonb ELSE data END
+$$;
+
+-- Relación item -> item que necesita (recetas, descomposiciones, craft/decompose)
+CREATE TEMP TABLE item_edges ON COMMIT DROP AS
+    SELECT r.result_item_id AS parent, c AS child FROM recipes r, pg_temp.componentes(r.components) AS c
+    UNION SELECT d.source_item_id, c FROM decompositions d, pg_temp.componentes(d.results) AS c
+    UNION SELECT i.id, c FROM items i, pg_temp.componentes(i.craft) AS c
+    UNION SELECT i.id, c FROM items i, pg_temp.componentes(i.decompose) AS c;
+
+-- Servidores que usan cada item sin servidor asignado
+CREATE TEMP TABLE item_guilds ON COMMIT DROP AS
+WITH RECURSIVE refs(item_id, guild_id) AS (
+    SELECT inv.item_id, ch.guild_id
+    FROM inventory inv JOIN characters ch ON ch.id = inv.character_id
+    UNION
+    SELECT ml.item_id, m.guild_id
+    FROM market_listings ml JOIN markets m ON m.id = ml.market_id
+    UNION
+    SELECT lp.item_id, m.guild_id
+    FROM listing_prices lp
+    JOIN market_listings ml ON ml.id = lp.listing_id
+    JOIN markets m ON m.id = ml.market_id
+    UNION
+    SELECT c, m.guild_id
+    FROM market_listings ml
+    JOIN markets m ON m.id = ml.market_id
+    CROSS JOIN LATERAL (VALUES (ml.price), (ml.price2), (ml.price3),
+                               (ml.initial_price), (ml.initial_price2), (ml.initial_price3)) AS p(data)
+    CROSS JOIN LATERAL pg_temp.componentes(pg_temp.precio(p.data)) AS c
+    UNION
+    SELECT e.child, r.guild_id
+    FROM refs r JOIN item_edges e ON e.parent = r.item_id
+)
+SELECT refs.item_id, refs.guild_id
+FROM refs JOIN items i ON i.id = refs.item_id
+WHERE i.guild_id IS NULL AND refs.guild_id IS NOT NULL;
+
+INSERT INTO item_guilds (item_id, guild_id)
+SELECT i.id, g.guild_id
+FROM items i
+CROSS JOIN (
+    SELECT guild_id FROM characters
+    UNION SELECT guild_id FROM markets
+    UNION SELECT guild_id FROM equipment_slots
+    UNION SELECT guild_id FROM custom_commands
+    UNION SELECT guild_id FROM inventory_limits
+) AS g
+WHERE i.guild_id IS NULL
+  AND NOT EXISTS (SELECT 1 FROM item_guilds ig WHERE ig.item_id = i.id);
+
+-- La fila original se queda en el primer servidor
+UPDATE items i SET guild_id = ig.guild_id
+FROM (SELECT item_id, min(guild_id) AS guild_id FROM item_guilds GROUP BY item_id) AS ig
+WHERE ig.item_id = i.id;
+
+-- Copias para el resto de servidores
+CREATE TEMP TABLE item_copies ON COMMIT DROP AS
+SELECT ig.item_id AS old_id, ig.guild_id, nextval(pg_get_serial_sequence('items', 'id'))::int AS new_id
+FROM item_guilds ig JOIN items i ON i.id = ig.item_id
+WHERE ig.guild_id <> i.guild_id;
+
+INSERT INTO items (id, guild_id, name, category, description, image, effects, uses, craft, decompose,
+                   equipable, attack, defense, max_uses, created_at)
+SELECT c.new_id, c.guild_id, i.name, i.category, i.description, i.image, i.effects, i.uses, i.craft, i.decompose,
+       i.equipable, i.attack, i.defense, i.max_uses, i.created_at
+FROM item_copies c JOIN items i ON i.id = c.old_id;
+
+-- Reapuntar las referencias de cada servidor a su copia
+UPDATE inventory inv SET item_id = c.new_id
+FROM characters ch, item_copies c
+WHERE ch.id = inv.character_id AND c.old_id = inv.item_id AND c.guild_id = ch.guild_id;
+
+UPDATE market_listings ml SET item_id = c.new_id
+FROM markets m, item_copies c
+WHERE m.id = ml.market_id AND c.old_id = ml.item_id AND c.guild_id = m.guild_id;
+
+UPDATE listing_prices lp SET item_id = c.new_id
+FROM market_listings ml, markets m, item_copies c
+WHERE ml.id = lp.listing_id AND m.id = ml.market_id AND c.old_id = lp.item_id AND c.guild_id = m.guild_id;
+
+-- Las recetas y descomposiciones se duplican junto con su item
+INSERT INTO recipes (result_item_id, components, station, time_seconds, created_at)
+SELECT c.new_id, r.components, r.station, r.time_seconds, r.created_at
+FROM recipes r JOIN item_copies c ON c.old_id = r.result_item_id;
+
+INSERT INTO decompositions (source_item_id, results, created_at)
+SELECT c.new_id, d.results, d.created_at
+FROM decompositions d JOIN item_copies c ON c.old_id = d.source_item_id;
+
+-- Cambia los item_id de una lista de componentes por los del servidor indicado
+CREATE FUNCTION pg_temp.reapuntar(data jsonb, servidor text) RETURNS jsonb LANGUAGE sql AS $$
+    SELECT CASE WHEN jsonb_typeof(data) = 'array' THEN (
+        SELECT COALESCE(jsonb_agg(
+            CASE WHEN c.new_id IS NULL THEN e ELSE jsonb_set(e, '{item_id}', to_jsonb(c.new_id)) END
+            ORDER BY ord), '[]'::jsonb)
+        FROM jsonb_array_elements(data) WITH ORDINALITY AS t(e, ord)
+        LEFT JOIN item_copies c
+            ON e ? 'item_id' AND c.old_id = (e->>'item_id')::int AND c.guild_id = servidor
+    ) ELSE data END
+$$;
+
+UPDATE recipes r SET components = pg_temp.reapuntar(r.components, i.guild_id)
+FROM items i WHERE i.id = r.result_item_id AND i.guild_id IS NOT NULL;
+
+UPDATE decompositions d SET results = pg_temp.reapuntar(d.results, i.guild_id)
+FROM items i WHERE i.id = d.source_item_id AND i.guild_id IS NOT NULL;
+
+UPDATE items SET craft = pg_temp.reapuntar(craft, guild_id), decompose = pg_temp.reapuntar(decompose, guild_id)
+WHERE guild_id IS NOT NULL;
+
+-- Precios JSONB: el backfill a listing_prices se ejecuta después de esta
+-- migración y tiene que encontrar ya los items del servidor del mercado
+UPDATE market_listings ml SET
+    price = pg_temp.reapuntar(pg_temp.precio(ml.price), m.guild_id),
+    price2 = pg_temp.reapuntar(pg_temp.precio(ml.price2), m.guild_id),
+    price3 = pg_temp.reapuntar(pg_temp.precio(ml.price3), m.guild_id),
+    initial_price = pg_temp.reapuntar(pg_temp.precio(ml.initial_price), m.guild_id),
+    initial_price2 = pg_temp.reapuntar(pg_temp.precio(ml.initial_price2), m.guild_id),
+    initial_price3 = pg_temp.reapuntar(pg_temp.precio(ml.initial_price3), m.guild_id)
+FROM markets m
+WHERE m.id = ml.market_id
+  AND EXISTS (SELECT 1 FROM item_copies c WHERE c.guild_id = m.guild_id);
+
+-- Nombres repetidos dentro de un mismo servidor: se renombran los más nuevos
+UPDATE items i SET name = i.name || ' #' || i.id
+FROM (
+    SELECT id, row_number() OVER (PARTITION BY guild_id, lower(name) ORDER BY id) AS n
+    FROM items
+) AS dup
+WHERE dup.id = i.id AND dup.n > 1;
+
+-- Búsqueda por servidor y nombre; sustituye a los índices globales de 0004
+CREATE UNIQUE INDEX IF NOT EXISTS items_guild_lower_name_key ON items (guild_id, lower(name));
+DROP INDEX IF EXISTS items_name_idx;
+DROP INDEX IF EXISTS items_lower_name_idx;
@@ -0,0 +1,157 @@
+-- =============================
+-- ESTADÍSTICAS EFECTIVAS POR PERSONAJE
+-- =============================
+-- Resultado precalculado de atributos + efectos de los items equipados.
+-- Lo mantienen los triggers de más abajo al equipar/desequipar, editar un
+-- item o cambiar los atributos, así que /dado y /personaje ver lo leen con
+-- una sola búsqueda por clave.
+--
+-- attack/defense/agility siguen la regla de las tiradas de combate: valor
+-- del atributo (5 si no existe) más todos los efectos numéricos cuyo nombre
+-- contiene el del atributo sin distinguir mayúsculas.
+CREATE TABLE IF NOT EXISTS character_stats (
+    character_id INT PRIMARY KEY REFERENCES characters(id) ON DELETE CASCADE,
+    attack NUMERIC NOT NULL,
+    defense NUMERIC NOT NULL,
+    agility NUMERIC NOT NULL,
+    attack_die TEXT,                         -- dado de ataque del primer item equipado que lo tenga
+    defense_die TEXT,                        -- dado de defensa, igual
+    bonuses JSONB NOT NULL DEFAULT '{}'::jsonb,   -- {"fuerza": 3} suma por efecto
+    modifiers JSONB NOT NULL DEFAULT '[]'::jsonb, -- [{"slot", "efecto", "valor"}] para mostrar
+    equipped_slots TEXT[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION refresh_character_stats(p_character_id INT) RETURNS void
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_attributes JSONB;
+BEGIN
+    SELECT COALESCE(attributes, '{}'::jsonb) INTO v_attributes
+    FROM characters WHERE id = p_character_id;
+
+    -- Personaje borrado (p. ej. el borrado en cascada de su inventario)
+    IF NOT FOUND THEN
+        DELETE FROM character_stats WHERE character_id = p_character_id;
+        RETURN;
+    END IF;
+
+    INSERT INTO character_stats (character_id, attack, defense, agility, attack_die, defense_die,
+                                 bonuses, modifiers, equipped_slots, updated_at)
+    WITH equipado AS (
+        SELECT inv.id, inv.equipped_slot AS slot, i.effects, i.attack, i.defense
+        FROM inventory inv
+        JOIN items i ON i.id = inv.item_id
+        WHERE inv.character_id = p_character_id AND inv.equipped_slot IS NOT NULL
+    ),
+    efectos AS (
+        SELECT e.id, e.slot, ef.key AS efecto, (ef.value #>> '{}')::numeric AS valor
+        FROM equipado e,
+             jsonb_each(CASE WHEN jsonb_typeof(e.effects) = 'object' THEN e.effects ELSE '{}'::jsonb END) AS ef
+        WHERE jsonb_typeof(ef.value) = 'number'
+    ),
+    base AS (
+        SELECT k.nombre,
+               CASE WHEN jsonb_typeof(v_attributes -> k.nombre) = 'number'
+                    THEN (v_attributes ->> k.nombre)::numeric ELSE 5 END
+               + COALESCE((SELECT sum(valor) FROM efectos
+                           WHERE strpos(lower(efecto), lower(k.nombre)) > 0), 0) AS valor
+        FROM (VALUES ('Ataque'), ('Defensa'), ('Agilidad')) AS k(nombre)
+    )
+    SELECT
+        p_character_id,
+        (SELECT valor FROM base WHERE nombre = 'Ataque'),
+        (SELECT valor FROM base WHERE nombre = 'Defensa'),
+        (SELECT valor FROM base WHERE nombre = 'Agilidad'),
+        (SELECT attack FROM equipado WHERE attack IS NOT NULL AND attack <> '' ORDER BY id LIMIT 1),
+        (SELECT defense FROM equipado WHERE defense IS NOT NULL AND defense <> '' ORDER BY id LIMIT 1),
+        COALESCE((SELECT jsonb_object_agg(efecto, total)
+                  FROM (SELECT efecto, sum(valor) AS total FROM efectos GROUP BY efecto) AS s), '{}'::jsonb),
+        COALESCE((SELECT jsonb_agg(jsonb_build_object('slot', slot, 'efecto', efecto, 'valor', valor)
+                                   ORDER BY id, efecto)
+                  FROM efectos), '[]'::jsonb),
+        COALESCE((SELECT array_agg(slot ORDER BY id) FROM equipado), '{}'),
+        now()
+    ON CONFLICT (character_id) DO UPDATE SET
+        attack = EXCLUDED.attack,
+        defense = EXCLUDED.defense,
+        agility = EXCLUDED.agility,
+        attack_die = EXCLUDED.attack_die,
+        defense_die = EXCLUDED.defense_die,
+        bonuses = EXCLUDED.bonuses,
+        modifiers = EXCLUDED.modifiers,
+        equipped_slots = EXCLUDED.equipped_slots,
+        updated_at = EXCLUDED.updated_at;
+END $$;
+
+-- Cambios de atributos y personajes nuevos
+CREATE OR REPLACE FUNCTION character_stats_on_character() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM refresh_character_stats(NEW.id);
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS character_stats_character_trg ON characters;
+CREATE TRIGGER character_stats_character_trg
+    AFTER INSERT OR UPDATE OF attributes ON characters
+    FOR EACH ROW EXECUTE FUNCTION character_stats_on_character();
+
+-- Equipar, desequipar y quitar items equipados. Los cambios de cantidad o
+-- usos no tocan las estadísticas y no disparan nada.
+CREATE OR REPLACE FUNCTION character_stats_on_inventory() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_character_stats(OLD.character_id);
+    END IF;
+    IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.character_id <> OLD.character_id) THEN
+        PERFORM refresh_character_stats(NEW.character_id);
+    END IF;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS character_stats_inventory_ins_trg ON inventory;
+CREATE TRIGGER character_stats_inventory_ins_trg
+    AFTER INSERT ON inventory
+    FOR EACH ROW WHEN (NEW.equipped_slot IS NOT NULL)
+    EXECUTE FUNCTION character_stats_on_inventory();
+
+DROP TRIGGER IF EXISTS character_stats_inventory_upd_trg ON inventory;
+CREATE TRIGGER character_stats_inventory_upd_trg
+    AFTER UPDATE OF equipped_slot, item_id, character_id ON inventory
+    FOR EACH ROW WHEN (
+        OLD.equipped_slot IS DISTINCT FROM NEW.equipped_slot
+        OR (NEW.equipped_slot IS NOT NULL
+            AND (OLD.item_id <> NEW.item_id OR OLD.character_id <> NEW.character_id))
+    )
+    EXECUTE FUNCTION character_stats_on_inventory();
+
+DROP TRIGGER IF EXISTS character_stats_inventory_del_trg ON inventory;
+CREATE TRIGGER character_stats_inventory_del_trg
+    AFTER DELETE ON inventory
+    FOR EACH ROW WHEN (OLD.equipped_slot IS NOT NULL)
+    EXECUTE FUNCTION character_stats_on_inventory();
+
+-- Editar un item recalcula solo a quien lo tiene equipado
+CREATE OR REPLACE FUNCTION character_stats_on_item() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM refresh_character_stats(ch.character_id)
+    FROM (SELECT DISTINCT character_id FROM inventory
+          WHERE item_id = NEW.id AND equipped_slot IS NOT NULL) AS ch;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS character_stats_item_trg ON items;
+CREATE TRIGGER character_stats_item_trg
+    AFTER UPDATE OF effects, attack, defense ON items
+    FOR EACH ROW WHEN (
+        OLD.effects IS DISTINCT FROM NEW.effects
+        OR OLD.attack IS DISTINCT FROM NEW.attack
+        OR OLD.defense IS DISTINCT FROM NEW.defense
+    )
+    EXECUTE FUNCTION character_stats_on_item();
+
+-- Personajes existentes
+SELECT refresh_character_stats(id) FROM characters;
@@ -0,0 +1,35 @@
+-- =============================
+-- ENCUENTROS DE COMBATE
+-- =============================
+-- Un encuentro por canal. Las acciones se encolan para la ronda actual y
+-- /combate resolver las procesa todas juntas antes de pasar a la siguiente.
+CREATE TABLE IF NOT EXISTS encounters (
+    id SERIAL PRIMARY KEY,
+    guild_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL UNIQUE,
+    round INT NOT NULL DEFAULT 1,
+    created_by TEXT,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS encounter_participants (
+    id SERIAL PRIMARY KEY,
+    encounter_id INT NOT NULL REFERENCES encounters(id) ON DELETE CASCADE,
+    character_id INT NOT NULL REFERENCES characters(id) ON DELETE CASCADE,
+    initiative INT NOT NULL,
+    hp INT NOT NULL,
+    max_hp INT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'activo',   -- activo | derrotado
+    UNIQUE (encounter_id, character_id)
+);
+
+CREATE TABLE IF NOT EXISTS encounter_actions (
+    id SERIAL PRIMARY KEY,
+    encounter_id INT NOT NULL REFERENCES encounters(id) ON DELETE CASCADE,
+    round INT NOT NULL,
+    actor_id INT NOT NULL REFERENCES encounter_participants(id) ON DELETE CASCADE,
+    action TEXT NOT NULL,                    -- atacar | defender | esquivar
+    target_id INT REFERENCES encounter_participants(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    UNIQUE (encounter_id, round, actor_id)   -- una acción por participante y ronda
+);
@@ -0,0 +1,23 @@
+-- =============================
+-- EFECTOS TEMPORALES
+-- =============================
+-- Bonificaciones y penalizaciones con caducidad (acción efecto@ de los
+-- comandos personalizados). Las tiradas de combate y /personaje ver solo
+-- suman las filas con expires_at > now(), así que un efecto caducado deja de
+-- contar aunque el planificador todavía no lo haya borrado.
+CREATE TABLE IF NOT EXISTS active_effects (
+    id SERIAL PRIMARY KEY,
+    character_id INT NOT NULL REFERENCES characters(id) ON DELETE CASCADE,
+    attribute TEXT NOT NULL,
+    delta NUMERIC NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    channel_id TEXT,                 -- canal donde se avisa al caducar
+    source TEXT,                     -- comando que lo aplicó
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Efectos vigentes de un personaje (tiradas y ficha)
+CREATE INDEX IF NOT EXISTS active_effects_character_idx ON active_effects (character_id, expires_at);
+
+-- Carga de caducidades pendientes al arrancar, ya ordenada por el índice
+CREATE INDEX IF NOT EXISTS active_effects_expires_at_idx ON active_effects (expires_at, id);
@@ -0,0 +1,140 @@
+import asyncio
+from bisect import bisect_left
+
+from discord import app_commands
+
+# Discord muestra como mucho 25 opciones de autocompletado
+MAX_SUGERENCIAS = 25
+
+# Consulta que carga cada tipo de nombre de un servidor
+FUENTES = {
+    "personajes": "SELECT name FROM characters WHERE guild_id=%s",
+    "items": "SELECT name FROM items WHERE guild_id=%s",
+    "mercados": "SELECT name FROM markets WHERE guild_id=%s",
+    "ranuras": "SELECT name FROM equipment_slots WHERE guild_id=%s",
+}
+
+
+class PrefixIndex:
+    """Nombres ordenados por su versión en minúsculas; el prefijo se busca con bisect"""
+
+    def __init__(self, nombres=()):
+        pares = sorted({(n.lower(), n) for n in nombres})
+        self._claves = [clave for clave, _ in pares]
+        self._nombres = [nombre for _, nombre in pares]
+
+    def __len__(self):
+        return len(self._nombres)
+
+    def add(self, nombre):
+        par = (nombre.lower(), nombre)
+        i = self._posicion(par)
+        if i < len(self._nombres) and (self._claves[i], self._nombres[i]) == par:
+            return
+        self._claves.insert(i, par[0])
+        self._nombres.insert(i, nombre)
+
+    def remove(self, nombre):
+        par = (nombre.lower(), nombre)
+        i = self._posicion(par)
+        if i < len(self._nombres) and (self._claves[i], self._nombres[i]) == par:
+            del self._claves[i]
+            del self._nombres[i]
+
+    def _posicion(self, par):
+        clave, nombre = par
+        i = bisect_left(self._claves, clave)
+        while i < len(self._claves) and self._claves[i] == clave and self._nombres[i] < nombre:
+            i += 1
+        return i
+
+    def buscar(self, prefijo, limite=MAX_SUGERENCIAS):
+        """Nombres que empiezan por el prefijo (sin distinguir mayúsculas), en orden"""
+        prefijo = prefijo.strip().lower()
+        i = bisect_left(self._claves, prefijo)
+        resultado = []
+        while i < len(self._claves) and len(resultado) < limite and self._claves[i].startswith(prefijo):
+            resultado.append(self._nombres[i])
+            i += 1
+        return resultado
+
+
+class NameIndex:
+    """Índices de nombres por servidor y tipo para el autocompletado.
+
+    Cada (servidor, tipo) se carga de la base de datos la primera vez que se
+    consulta; después las sugerencias salen de memoria. Los comandos que
+    crean o borran nombres los mantienen al día con add() y remove().
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._indices = {}
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def _indice(self, guild_id, tipo):
+        clave = (str(guild_id), tipo)
+        indice = self._indices.get(clave)
+        if indice is not None:
+            self.hits += 1
+            return indice
+        self.misses += 1
+        async with self._lock:
+            indice = self._indices.get(clave)
+            if indice is None:
+                nombres = await self.db.run(self._fetch, FUENTES[tipo], clave[0])
+                indice = PrefixIndex(nombres)
+                self._indices[clave] = indice
+                self.loads += 1
+        return indice
+
+    def _fetch(self, cur, consulta, guild_id):
+        cur.execute(consulta, (guild_id,))
+        return [fila[0] for fila in cur.fetchall()]
+
+    async def buscar(self, guild_id, tipo, prefijo, limite=MAX_SUGERENCIAS):
+        indice = await self._indice(guild_id, tipo)
+        return indice.buscar(prefijo, limite)
+
+    def add(self, guild_id, tipo, nombre):
+        indice = self._indices.get((str(guild_id), tipo))
+        if indice is not None:
+            indice.add(nombre)
+
+    def remove(self, guild_id, tipo, nombre):
+        indice = self._indices.get((str(guild_id), tipo))
+        if indice is not None:
+            indice.remove(nombre)
+
+    def invalidate(self, guild_id, tipo=None):
+        """Olvida un tipo (o todos) de un servidor; se recarga en la siguiente consulta"""
+        guild_id = str(guild_id)
+        for clave in [c for c in self._indices if c[0] == guild_id and (tipo is None or c[1] == tipo)]:
+            del self._indices[clave]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "indices": len(self._indices),
+            "size": sum(len(indice) for indice in self._indices.values()),
+        }
+
+
+def _autocompletar(tipo):
+    async def callback(interaction, current: str):
+        if interaction.guild_id is None:
+            return []
+        nombres = await interaction.client.names.buscar(interaction.guild_id, tipo, current)
+        return [app_commands.Choice(name=nombre, value=nombre) for nombre in nombres]
+    return callback
+
+
+personaje_autocomplete = _autocompletar("personajes")
+item_autocomplete = _autocompletar("items")
+mercado_autocomplete = _autocompletar("mercados")
+ranura_autocomplete = _autocompletar("ranuras")
@@ -0,0 +1,87 @@
+from dataclasses import dataclass
+
+from utils.effects import EFECTOS_ACTIVOS_SQL
+
+# Atributo que usa cada tirada de combate y su columna en character_stats
+TIPOS_COMBATE = {"Ataque": "attack", "Defensa": "defense", "Agilidad": "agility"}
+
+
+@dataclass(frozen=True)
+class CharacterStats:
+    """Fila de character_stats: atributos de combate ya sumados con el equipo"""
+    character_id: int
+    name: str
+    attributes: dict
+    attack: float
+    defense: float
+    agility: float
+    attack_die: str
+    defense_die: str
+    bonuses: dict
+    modifiers: list
+    equipped_slots: list
+    effects: list = ()       # efectos temporales vigentes [{"atributo", "valor", "expira"}]
+
+    def temporal(self, tipo):
+        """Suma de los efectos temporales cuyo atributo contiene el de la tirada"""
+        return _numero(sum(e["valor"] for e in self.effects if tipo.lower() in e["atributo"].lower()))
+
+    def valor(self, tipo):
+        return getattr(self, TIPOS_COMBATE[tipo]) + self.temporal(tipo)
+
+    def dado(self, tipo):
+        """Expresión de la tirada y su fuente: el dado del arma o 1d<atributo>
+
+        Con dado de arma los efectos temporales se suman a la tirada; sin él
+        ya van incluidos en el atributo.
+        """
+        personalizado = {"Ataque": self.attack_die, "Defensa": self.defense_die}.get(tipo)
+        if personalizado:
+            temporal = self.temporal(tipo)
+            if temporal:
+                personalizado = f"({personalizado}){'+' if temporal > 0 else ''}{temporal}"
+            return personalizado, "Arma equipada"
+        return f"1d{max(int(self.valor(tipo)), 1)}", f"Atributo {tipo}"
+
+    def modificadores(self, tipo):
+        """Efectos equipados que afectan a la tirada, como 'slot: efecto +2'"""
+        lineas = []
+        for m in self.modifiers:
+            if tipo.lower() in m["efecto"].lower():
+                valor = m["valor"]
+                simbolo = "+" if valor > 0 else ""
+                lineas.append(f"{m['slot']}: {m['efecto']} {simbolo}{valor}")
+        for e in self.effects:
+            if tipo.lower() in e["atributo"].lower():
+                valor = _numero(e["valor"])
+                simbolo = "+" if valor > 0 else ""
+                lineas.append(f"Temporal: {e['atributo']} {simbolo}{valor} (termina <t:{int(e['expira'])}:R>)")
+        return lineas
+
+
+def _numero(valor):
+    valor = float(valor)
+    return int(valor) if valor.is_integer() else valor
+
+
+def load_stats(cur, guild_id, names):
+    """Estadísticas de varios personajes del servidor en una consulta: {nombre: CharacterStats}
+
+    Pensada para Database.run. Los personajes que no existen no aparecen.
+    """
+    cur.execute(f"""
+        SELECT c.id, c.name, c.attributes, cs.attack, cs.defense, cs.agility,
+               cs.attack_die, cs.defense_die, cs.bonuses, cs.modifiers, cs.equipped_slots,
+               {EFECTOS_ACTIVOS_SQL}
+        FROM characters c
+        JOIN character_stats cs ON cs.character_id = c.id
+        WHERE c.guild_id = %s AND c.name = ANY(%s)
+    """, (str(guild_id), list(names)))
+    stats = {}
+    for (char_id, name, attributes, attack, defense, agility,
+         attack_die, defense_die, bonuses, modifiers, slots, effects) in cur.fetchall():
+        stats[name] = CharacterStats(
+            char_id, name, attributes or {}, _numero(attack), _numero(defense), _numero(agility),
+            attack_die, defense_die, bonuses or {}, modifiers or [], slots or [], effects or [],
+        )
+    return stats
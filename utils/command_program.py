@@ -0,0 +1,295 @@
+from dataclasses import dataclass, field
+
+import discord
+
+from utils.dice import procesar_expresion
+from utils.effects import EffectError, aplicar_efectos_tx, parsear_efecto
+
+# Acciones por comando (tipo@params; tipo@params; ...). Discord admite 10 embeds por mensaje
+MAX_ACCIONES = 10
+
+# Personaje con el que juega el usuario en el servidor: el primero aprobado
+PERSONAJE_SQL = """
+    SELECT id FROM characters
+    WHERE user_id = %s AND guild_id = %s AND approved
+    ORDER BY id
+    LIMIT 1
+"""
+
+# Aplica todos los cambios de inventario en una sola sentencia. Devuelve los
+# items que no se pudieron restar por falta de cantidad.
+INVENTARIO_SQL = """
+    WITH d AS (
+        SELECT * FROM unnest(%(items)s::int[], %(deltas)s::int[], %(usos)s::int[]) AS d(item_id, delta, usos)
+    ),
+    sumados AS (
+        INSERT INTO inventory (character_id, item_id, quantity, current_uses)
+        SELECT %(char_id)s, item_id, delta, usos FROM d WHERE delta > 0
+        ON CONFLICT (character_id, item_id) DO UPDATE
+            SET quantity = inventory.quantity + EXCLUDED.quantity,
+                current_uses = COALESCE(inventory.current_uses, EXCLUDED.current_uses)
+        RETURNING item_id
+    ),
+    restados AS (
+        UPDATE inventory inv SET quantity = inv.quantity + d.delta
+        FROM d
+        WHERE inv.character_id = %(char_id)s AND inv.item_id = d.item_id
+          AND d.delta < 0 AND inv.quantity + d.delta > 0
+        RETURNING inv.item_id
+    ),
+    agotados AS (
+        DELETE FROM inventory inv USING d
+        WHERE inv.character_id = %(char_id)s AND inv.item_id = d.item_id
+          AND d.delta < 0 AND inv.quantity + d.delta = 0
+        RETURNING inv.item_id
+    )
+    SELECT d.item_id FROM d
+    WHERE d.delta < 0
+      AND d.item_id NOT IN (SELECT item_id FROM restados UNION ALL SELECT item_id FROM agotados)
+"""
+
+
+class ProgramError(ValueError):
+    """Definición de comando personalizado que no se puede compilar"""
+
+
+@dataclass(frozen=True)
+class RequisitoRol:
+    nombre: str              # se compara al ejecutar: los roles se renombran y recrean
+
+
+@dataclass(frozen=True)
+class RequisitoItem:
+    nombre: str
+    cantidad: int
+    item_id: int = None      # None si el item no existe en el servidor
+
+
+@dataclass(frozen=True)
+class CambioInventario:
+    item_id: int
+    nombre: str
+    delta: int               # positivo para dar_item, negativo para quitar_item
+    usos: int = None         # usos iniciales si el item es nuevo en el inventario
+
+
+@dataclass(frozen=True)
+class Invocacion:
+    """Resultado de ejecutar_tx: personaje afectado y efectos temporales creados"""
+    character_id: int
+    efectos: tuple = ()      # (effect_id, expira_epoch) para el planificador
+
+
+@dataclass
+class CommandProgram:
+    """Comando personalizado ya compilado: requisitos resueltos y acciones listas para ejecutar"""
+    name: str
+    roles: tuple
+    items: tuple
+    acciones: list
+    inventario: tuple = ()
+    efectos: tuple = ()
+    response_message: str = None
+    catalog_version: int = 0
+    definicion: tuple = field(default=None, repr=False)
+
+    def rol_faltante(self, member):
+        """Primer requisito de rol que no cumple el miembro, o None.
+
+        Se resuelve con los roles actuales del miembro y no con ids guardados
+        al compilar, que dejarían de valer al renombrar o recrear un rol.
+        """
+        roles = {r.name for r in getattr(member, "roles", ())}
+        for req in self.roles:
+            if req.nombre not in roles:
+                return req
+        return None
+
+    @property
+    def usa_base_de_datos(self):
+        return bool(self.items or self.inventario or self.efectos)
+
+    def item_faltante(self, cur, character_id):
+        """Primer requisito de item que no cumple el personaje, o None (una sola consulta)"""
+        if not self.items:
+            return None
+        if any(req.item_id is None for req in self.items):
+            return next(req for req in self.items if req.item_id is None)
+        cur.execute("""
+            SELECT r.ord
+            FROM unnest(%s::int[], %s::int[]) WITH ORDINALITY AS r(item_id, qty, ord)
+            LEFT JOIN inventory inv ON inv.character_id = %s AND inv.item_id = r.item_id
+            WHERE COALESCE(inv.quantity, 0) < r.qty
+            ORDER BY r.ord
+            LIMIT 1
+        """, ([req.item_id for req in self.items], [req.cantidad for req in self.items], character_id))
+        fila = cur.fetchone()
+        return self.items[fila[0] - 1] if fila else None
+
+    def ejecutar_tx(self, cur, user_id, guild_id, channel_id=None):
+        """Unidad de trabajo de la invocación. Devuelve (error, Invocacion)
+
+        Comprueba los requisitos de item del personaje aprobado del usuario,
+        aplica todos los dar_item/quitar_item en una sola sentencia y crea los
+        efectos temporales. Si falta cantidad para algún quitar_item no se
+        aplica nada.
+        """
+        cur.execute(PERSONAJE_SQL, (user_id, guild_id))
+        fila = cur.fetchone()
+        if not fila:
+            if self.items:
+                return f"No cumples el requisito **item: {self.items[0].nombre}**.", None
+            return "Necesitas un personaje aprobado para usar este comando.", None
+        char_id = fila[0]
+
+        faltante = self.item_faltante(cur, char_id)
+        if faltante:
+            return f"No cumples el requisito **item: {faltante.nombre}**.", None
+        insuficientes = self._aplicar_inventario(cur, char_id) if self.inventario else []
+        if insuficientes:
+            cur.connection.rollback()
+            return f"No tienes suficiente cantidad de: {', '.join(insuficientes)}.", None
+
+        efectos = aplicar_efectos_tx(cur, char_id, self.efectos, channel_id, self.name) if self.efectos else []
+        return None, Invocacion(char_id, tuple(efectos))
+
+    def _aplicar_inventario(self, cur, char_id):
+        """Aplica los cambios de inventario; devuelve los items que no se pudieron restar"""
+        cur.execute(INVENTARIO_SQL, {
+            "items": [c.item_id for c in self.inventario],
+            "deltas": [c.delta for c in self.inventario],
+            "usos": [c.usos for c in self.inventario],
+            "char_id": char_id,
+        })
+        insuficientes = {fila[0] for fila in cur.fetchall()}
+        return [c.nombre for c in self.inventario if c.item_id in insuficientes]
+
+    def ejecutar(self, message):
+        """Resultados de las acciones (texto o embed) en orden"""
+        return [accion(message) for accion in self.acciones]
+
+
+def _cantidad(texto, formato):
+    try:
+        cantidad = int(texto.strip())
+    except ValueError:
+        raise ProgramError(f"Error en formato: {formato}")
+    if cantidad < 1:
+        raise ProgramError("Las cantidades deben ser enteros positivos")
+    return cantidad
+
+
+def parsear_item(tipo, params):
+    """'Espada,2' de dar_item/quitar_item -> ('Espada', 2)"""
+    formato = f"{tipo}@nombre_item,cantidad"
+    parts = params.split(',')
+    if len(parts) < 2 or not parts[0].strip():
+        raise ProgramError(f"Error en formato: {formato}")
+    return parts[0].strip(), _cantidad(parts[1], formato)
+
+
+def acciones_de(main_action):
+    """main_action guarda una acción (dict) o varias (lista de dicts)"""
+    if isinstance(main_action, dict):
+        return [main_action]
+    return list(main_action or [])
+
+
+def compilar_accion(tipo, params):
+    """Convierte una acción tipo@parametros en una función message -> texto o embed"""
+    if tipo == "mensaje":
+        return lambda message: params
+
+    if tipo == "embed":
+        title, description = params.split('|', 1) if '|' in params else (params, "")
+        title, description = title.strip(), description.strip()
+        return lambda message: discord.Embed(title=title, description=description, color=discord.Color.dark_gold())
+
+    if tipo == "imagen":
+        url = params.strip()
+        return lambda message: url
+
+    if tipo == "dado":
+        expresion = params.strip()
+        if 'd' not in expresion.lower():
+            return lambda message: f"🎲 Dado: {params}"
+        procesar_expresion(expresion)  # valida la expresión al compilar
+
+        def tirar(message):
+            resultado, detalles, _ = procesar_expresion(expresion)
+            return f"🎲 {expresion} = **{resultado}**\n```{detalles}```"
+        return tirar
+
+    if tipo in ("dar_item", "quitar_item"):
+        item_name, quantity = parsear_item(tipo, params)
+        texto = f"Recibes {quantity}x {item_name}" if tipo == "dar_item" else f"Pierdes {quantity}x {item_name}"
+        return lambda message: texto
+
+    if tipo == "efecto":
+        if ',' not in params:
+            # Efecto solo descriptivo (comandos anteriores a los efectos temporales)
+            return lambda message: f"Efecto aplicado: {params}"
+        try:
+            texto = f"Efecto aplicado: {parsear_efecto(params).texto}"
+        except EffectError as e:
+            raise ProgramError(str(e))
+        return lambda message: texto
+
+    if tipo == "teleport":
+        return lambda message: f"Teletransporte a: {params}"
+
+    raise ProgramError(f"Tipo de acción desconocido: {tipo}")
+
+
+async def compilar_programa(name, main_action, requirements, response_message, guild, catalog):
+    """Compila la definición guardada en custom_commands para un servidor.
+
+    Los items se resuelven con el catálogo en memoria, así que compilar no
+    consulta la base de datos; los roles se comprueban por nombre al ejecutar.
+    """
+    guild_id = str(guild.id)
+    version = catalog.version(guild_id)
+
+    roles, items = [], []
+    for req in requirements or []:
+        if req["type"] == "rol":
+            roles.append(RequisitoRol(req["value"]))
+        elif req["type"] == "item":
+            parts = req["value"].split(',')
+            item_name = parts[0].strip()
+            cantidad = _cantidad(parts[1], "item:nombre,cantidad") if len(parts) > 1 else 1
+            item = await catalog.by_name(guild_id, item_name)
+            items.append(RequisitoItem(item.name if item else item_name, cantidad, item.id if item else None))
+
+    definidas = acciones_de(main_action)
+    if not definidas or len(definidas) > MAX_ACCIONES:
+        raise ProgramError(f"Un comando debe tener entre 1 y {MAX_ACCIONES} acciones")
+
+    acciones, deltas, nombres, efectos = [], {}, {}, []
+    for accion in definidas:
+        tipo, params = accion["type"], accion["params"]
+        if tipo in ("dar_item", "quitar_item"):
+            item_name, cantidad = parsear_item(tipo, params)
+            item = await catalog.by_name(guild_id, item_name)
+            if not item:
+                raise ProgramError(f"El item {item_name} no existe")
+            # Varias acciones sobre el mismo item se suman en un único cambio
+            deltas[item.id] = deltas.get(item.id, 0) + (cantidad if tipo == "dar_item" else -cantidad)
+            nombres[item.id] = item
+            params = f"{item.name},{cantidad}"
+        elif tipo == "efecto" and ',' in params:
+            try:
+                efectos.append(parsear_efecto(params))
+            except EffectError as e:
+                raise ProgramError(str(e))
+        acciones.append(compilar_accion(tipo, params))
+
+    inventario = tuple(
+        CambioInventario(item_id, nombres[item_id].name, delta,
+                         nombres[item_id].max_uses if nombres[item_id].max_uses > 0 else None)
+        for item_id, delta in deltas.items() if delta
+    )
+    return CommandProgram(
+        name, tuple(roles), tuple(items), acciones, inventario, tuple(efectos), response_message, version,
+        (name, main_action, requirements, response_message),
+    )
@@ -0,0 +1,256 @@
+import asyncio
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2 import pool as pg_pool
+
+
+class PoolTimeout(Exception):
+    """No se pudo obtener una conexión del pool a tiempo"""
+
+
+class DatabaseStats:
+    """Métricas del executor: profundidad de cola y tiempo de espera"""
+
+    def __init__(self, window=1000):
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._recent_waits = deque(maxlen=window)
+        # started() se llama desde los hilos del executor
+        self._lock = threading.Lock()
+
+    def enqueued(self):
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+    def started(self, wait):
+        with self._lock:
+            self.queue_depth -= 1
+            self.completed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent_waits.append(wait)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent_waits)
+        p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "avg_wait_ms": round(self.total_wait / self.completed * 1000, 3) if self.completed else 0.0,
+            "p95_wait_ms": round(p95 * 1000, 3),
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class Cursor:
+    """Cursor asíncrono sobre una conexión prestada del pool.
+
+    Cada consulta se ejecuta en el executor de la base de datos, nunca en el
+    hilo del event loop. Los resultados de psycopg2 quedan en memoria del
+    cliente, así que fetchone/fetchall no necesitan await.
+    """
+
+    def __init__(self, db, conn):
+        self._db = db
+        self._conn = conn
+        self._cur = conn.cursor()
+        self._broken = False
+        self._closed = False
+
+    async def _run(self, fn, *args):
+        try:
+            return await self._db._call(fn, *args)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # La conexión se cayó: se descarta al devolverla al pool
+            self._broken = True
+            raise
+
+    async def execute(self, query, params=None):
+        await self._run(self._cur.execute, query, params)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    async def commit(self):
+        await self._run(self._conn.commit)
+
+    async def rollback(self):
+        await self._run(self._conn.rollback)
+
+    async def close(self):
+        """Cierra el cursor y devuelve la conexión al pool"""
+        if self._closed:
+            return
+        self._closed = True
+        await self._db._release(self._conn, self._cur, self._broken)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class Database:
+    """Pool de conexiones acotado que mantiene las consultas fuera del event loop"""
+
+    def __init__(self, dsn, minsize=1, maxsize=5, acquire_timeout=10.0,
+                 health_check_interval=30.0, **connect_kwargs):
+        self.dsn = dsn
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+        self._pool = None
+        self._executor = None
+        self._slots = None
+        self._last_used = {}
+        self.stats = DatabaseStats()
+
+    async def open(self):
+        """Crea el pool y las conexiones mínimas"""
+        self._executor = ThreadPoolExecutor(max_workers=self.maxsize, thread_name_prefix="db")
+        self._slots = asyncio.Semaphore(self.maxsize)
+        # run_in_executor no admite argumentos con nombre (sslmode, ...)
+        self._pool = await self._call(
+            functools.partial(pg_pool.ThreadedConnectionPool, **self.connect_kwargs),
+            self.minsize, self.maxsize, self.dsn,
+        )
+
+    async def close(self):
+        if self._pool is not None:
+            await self._call(self._pool.closeall)
+            self._pool = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def _acquire_slot(self):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"No hay conexiones libres tras {self.acquire_timeout}s")
+
+    async def cursor(self):
+        """Presta una conexión del pool y devuelve un cursor asíncrono sobre ella"""
+        await self._acquire_slot()
+        try:
+            conn = await self._call(self._checkout)
+        except BaseException:
+            self._slots.release()
+            raise
+        return Cursor(self, conn)
+
+    async def run(self, fn, *args):
+        """Ejecuta fn(cur, *args) como unidad de trabajo en un hilo del executor.
+
+        La función recibe un cursor psycopg2 normal con su propia transacción:
+        se hace commit si termina sin errores y rollback si lanza una excepción.
+        Devuelve lo que devuelva fn.
+        """
+        enqueued_at = time.monotonic()
+        self.stats.enqueued()
+        try:
+            await self._acquire_slot()
+        except BaseException:
+            self.stats.started(time.monotonic() - enqueued_at)
+            raise
+
+        try:
+            return await self._call(self._run_unit, enqueued_at, fn, args)
+        finally:
+            self._slots.release()
+
+    def _run_unit(self, enqueued_at, fn, args):
+        try:
+            conn = self._checkout()
+        finally:
+            self.stats.started(time.monotonic() - enqueued_at)
+
+        cur = conn.cursor()
+        broken = False
+        try:
+            result = fn(cur, *args)
+            conn.commit()
+            return result
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            # _checkin hace rollback si la transacción quedó abierta
+            self._checkin(conn, cur, broken)
+
+    def _checkout(self):
+        """Obtiene una conexión sana del pool (se ejecuta en el executor)"""
+        conn = self._pool.getconn()
+        if not self._is_healthy(conn):
+            self._discard(conn)
+            conn = self._pool.getconn()
+        return conn
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    async def _release(self, conn, cur, broken):
+        try:
+            await self._call(self._checkin, conn, cur, broken)
+        finally:
+            self._slots.release()
+
+    def _checkin(self, conn, cur, broken):
+        """Devuelve la conexión al pool, deshaciendo cualquier transacción abierta"""
+        if not broken and not conn.closed:
+            try:
+                cur.close()
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+
+        if broken or conn.closed:
+            self._discard(conn)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
@@ -1,10 +1,8 @@
-import psycopg2
-import os
+from utils.migrations import apply_migrations, load_migrations
 
-def init_db(conn):
-    with open("sql/schema.sql", "r", encoding="utf-8") as f:
-        sql = f.read()
-    cur = conn.cursor()
-    cur.execute(sql)
-    conn.commit()
-    cur.close()
+
+async def init_db(db):
+    """Aplica las migraciones de sql/migrations que aún no estén en schema_migrations"""
+    applied = await db.run(apply_migrations, load_migrations())
+    for migration in applied:
+        print(f"[DB] Migración aplicada: {migration.version:04d}_{migration.name}")
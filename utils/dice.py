@@ -0,0 +1,483 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+# Límites duros por grupo de dados y por expresión completa
+MAX_DADOS = 10_000
+MAX_CARAS = 1_000_000
+MAX_DADOS_TOTALES = 100_000
+
+# Tiradas que se listan una a una en los detalles de cada grupo
+MAX_TIRADAS_DETALLE = 50
+
+# Repeticiones de una tirada en lote (30# 1d20+5) y dados tirados en total por el lote
+MAX_REPETICIONES = 500
+MAX_DADOS_LOTE = 1_000_000
+
+# Rondas de explosión por grupo; cada ronda solo vuelve a tirar los dados que sacaron el máximo
+MAX_RONDAS_EXPLOSION = 20
+
+_rng = np.random.default_rng()
+
+
+class DiceError(ValueError):
+    """Expresión de dados inválida o fuera de límites"""
+
+
+# =============================
+# TOKENIZADOR
+# =============================
+# Los modificadores van antes que la "d" para que "dh"/"dl" no se lean como un dado
+_TOKEN = re.compile(
+    r"\s*(?:(\d+(?:\.\d+)?)|(kh|kl|dh|dl|k|r)|([dD])|(>=|<=|[<>=])|(!)|([-+*/()]))",
+    re.IGNORECASE,
+)
+
+
+def _tokenizar(expresion):
+    tokens = []
+    pos = 0
+    expresion = expresion.rstrip()
+    while pos < len(expresion):
+        match = _TOKEN.match(expresion, pos)
+        if not match:
+            raise DiceError(f"Carácter no permitido: {expresion[pos:].strip()[:1]!r}")
+        numero, modificador, dado, comparacion, explosion, operador = match.groups()
+        if numero is not None:
+            tokens.append(("num", numero))
+        elif modificador is not None:
+            tokens.append(("mod", modificador.lower()))
+        elif dado is not None:
+            tokens.append(("d", "d"))
+        elif comparacion is not None:
+            tokens.append(("cmp", comparacion))
+        elif explosion is not None:
+            tokens.append(("!", "!"))
+        else:
+            tokens.append(("op", operador))
+        pos = match.end()
+    tokens.append(("fin", None))
+    return tokens
+
+
+# =============================
+# AST
+# =============================
+@dataclass(frozen=True)
+class Numero:
+    valor: object
+
+
+@dataclass(frozen=True)
+class Dados:
+    """Grupo NdM con sus modificadores.
+
+    repetir y exitos son (comparación, valor); conservar es (kh|kl|dh|dl, n)
+    """
+    cantidad: int
+    caras: int
+    explota: bool = False
+    repetir: tuple = None
+    conservar: tuple = None
+    exitos: tuple = None
+
+    @property
+    def notacion(self):
+        texto = f"{self.cantidad}d{self.caras}"
+        if self.repetir:
+            op, valor = self.repetir
+            texto += f"r{'' if op == '=' else op}{valor}"
+        if self.explota:
+            texto += "!"
+        if self.conservar:
+            texto += f"{self.conservar[0]}{self.conservar[1]}"
+        if self.exitos:
+            texto += f"{self.exitos[0]}{self.exitos[1]}"
+        return texto
+
+
+@dataclass(frozen=True)
+class Negativo:
+    operando: object
+
+
+@dataclass(frozen=True)
+class Operacion:
+    op: str
+    izquierda: object
+    derecha: object
+
+
+class _Parser:
+    """Descenso recursivo: expr := term (+|- term)*, term := unario (*|/ unario)*"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def _actual(self):
+        return self.tokens[self.pos]
+
+    def _avanzar(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parsear(self):
+        nodo = self._expr()
+        if self._actual()[0] != "fin":
+            raise DiceError(f"Sobra texto en la expresión: {self._actual()[1]!r}")
+        return nodo
+
+    def _expr(self):
+        nodo = self._term()
+        while self._actual() in (("op", "+"), ("op", "-")):
+            op = self._avanzar()[1]
+            nodo = Operacion(op, nodo, self._term())
+        return nodo
+
+    def _term(self):
+        nodo = self._unario()
+        while self._actual() in (("op", "*"), ("op", "/")):
+            op = self._avanzar()[1]
+            nodo = Operacion(op, nodo, self._unario())
+        return nodo
+
+    def _unario(self):
+        if self._actual() == ("op", "-"):
+            self._avanzar()
+            return Negativo(self._unario())
+        if self._actual() == ("op", "+"):
+            self._avanzar()
+            return self._unario()
+        return self._atomo()
+
+    def _atomo(self):
+        tipo, valor = self._actual()
+        if tipo == "op" and valor == "(":
+            self._avanzar()
+            nodo = self._expr()
+            if self._avanzar() != ("op", ")"):
+                raise DiceError("Falta cerrar un paréntesis")
+            return nodo
+        if tipo == "d":
+            return self._dados(1)
+        if tipo == "num":
+            self._avanzar()
+            if self._actual()[0] == "d":
+                return self._dados(self._entero(valor))
+            return Numero(float(valor) if "." in valor else int(valor))
+        raise DiceError("Expresión incompleta" if tipo == "fin" else f"Símbolo inesperado: {valor!r}")
+
+    def _dados(self, cantidad):
+        self._avanzar()  # la "d"
+        tipo, valor = self._avanzar()
+        if tipo != "num":
+            raise DiceError("Falta el número de caras después de la 'd'")
+        caras = self._entero(valor)
+        if cantidad < 1 or caras < 1:
+            raise DiceError("Cantidad y caras deben ser al menos 1")
+        if cantidad > MAX_DADOS:
+            raise DiceError(f"Como máximo {MAX_DADOS} dados por tirada")
+        if caras > MAX_CARAS:
+            raise DiceError(f"Como máximo {MAX_CARAS} caras por dado")
+
+        mods = {}
+        while True:
+            tipo, valor = self._actual()
+            if tipo == "!":
+                clave = "explota"
+                self._avanzar()
+                mods_valor = True
+            elif tipo == "mod" and valor == "r":
+                clave = "repetir"
+                self._avanzar()
+                op = self._avanzar()[1] if self._actual()[0] == "cmp" else "="
+                mods_valor = (op, self._numero_modificador("r"))
+            elif tipo == "mod":
+                clave = "conservar"
+                self._avanzar()
+                mods_valor = ("kh" if valor == "k" else valor, self._numero_modificador(valor))
+            elif tipo == "cmp":
+                clave = "exitos"
+                self._avanzar()
+                mods_valor = (valor, self._numero_modificador(valor))
+            else:
+                break
+            if clave in mods:
+                raise DiceError("Cada modificador solo puede aparecer una vez por grupo de dados")
+            mods[clave] = mods_valor
+
+        nodo = Dados(cantidad, caras, **mods)
+        if rango_permitido(nodo)[1] < 1:
+            raise DiceError(f"La repetición de {nodo.notacion} descarta todas las caras")
+        if nodo.explota and caras == 1:
+            raise DiceError("Un dado de una cara no puede explotar")
+        return nodo
+
+    def _numero_modificador(self, modificador):
+        tipo, valor = self._avanzar()
+        if tipo != "num":
+            raise DiceError(f"Falta un número después de {modificador!r}")
+        return self._entero(valor)
+
+    def _entero(self, valor):
+        if "." in valor:
+            raise DiceError("La cantidad y las caras de los dados deben ser enteras")
+        return int(valor)
+
+
+def rango_permitido(nodo):
+    """Caras que pueden salir tras las repeticiones: (primera, cuántas, cara excluida)
+
+    Repetir "hasta que no salga" equivale a tirar directamente entre las caras
+    permitidas, así que nunca hay cadenas de repeticiones.
+    """
+    if not nodo.repetir:
+        return 1, nodo.caras, None
+    op, valor = nodo.repetir
+    if op == "=":
+        if 1 <= valor <= nodo.caras:
+            return 1, nodo.caras - 1, valor
+        return 1, nodo.caras, None
+    if op in ("<", "<="):
+        primera = max(valor + (op == "<="), 1)
+        return primera, nodo.caras - primera + 1, None
+    ultima = min(valor - (op == ">="), nodo.caras)
+    return 1, ultima, None
+
+
+def _contar_dados(nodo):
+    if isinstance(nodo, Dados):
+        return nodo.cantidad
+    if isinstance(nodo, Negativo):
+        return _contar_dados(nodo.operando)
+    if isinstance(nodo, Operacion):
+        return _contar_dados(nodo.izquierda) + _contar_dados(nodo.derecha)
+    return 0
+
+
+@lru_cache(maxsize=1024)
+def compilar(expresion):
+    """Compila una expresión a su AST. Se cachea por texto de la expresión"""
+    nodo = _Parser(_tokenizar(expresion)).parsear()
+    if _contar_dados(nodo) > MAX_DADOS_TOTALES:
+        raise DiceError(f"Como máximo {MAX_DADOS_TOTALES} dados en total")
+    return nodo
+
+
+# =============================
+# EVALUACIÓN
+# =============================
+@dataclass
+class Tirada:
+    resultado: object
+    detalles: list
+    expandida: str
+
+
+def _muestra(tiradas, cantidad):
+    """Lista las primeras tiradas de un grupo de `cantidad` dados"""
+    if cantidad <= MAX_TIRADAS_DETALLE:
+        return ", ".join(tiradas)
+    visibles = ", ".join(tiradas[:MAX_TIRADAS_DETALLE])
+    return f"{visibles}, … (+{cantidad - MAX_TIRADAS_DETALLE})"
+
+
+_PRECEDENCIA = {"+": 1, "-": 1, "*": 2, "/": 2}
+
+
+def _agrupar(hijo, texto, op, derecha=False):
+    """Pone paréntesis en el texto expandido de un hijo si su precedencia lo requiere"""
+    if not isinstance(hijo, Operacion):
+        return texto
+    propia, padre = _PRECEDENCIA[hijo.op], _PRECEDENCIA[op]
+    if propia < padre or (derecha and propia == padre and op in "-/"):
+        return f"({texto})"
+    return texto
+
+
+_COMPARAR = {
+    ">=": np.greater_equal, "<=": np.less_equal,
+    ">": np.greater, "<": np.less, "=": np.equal,
+}
+
+
+def _muestrear(nodo, rng, n):
+    """Tira n dados (o una matriz de forma n) entre las caras permitidas por las repeticiones"""
+    primera, cuantas, excluida = rango_permitido(nodo)
+    tiradas = rng.integers(0, cuantas, size=n) + primera
+    if excluida is not None:
+        tiradas[tiradas >= excluida] += 1
+    return tiradas
+
+
+def _explotar(nodo, rng, tiradas):
+    """Suma a cada dado las explosiones encadenadas. Devuelve (totales, explotó?)"""
+    totales = tiradas.copy()
+    planos = totales.reshape(-1)
+    explotados = tiradas == nodo.caras
+    activos = np.flatnonzero(explotados)
+    for _ in range(MAX_RONDAS_EXPLOSION):
+        if activos.size == 0:
+            break
+        extra = _muestrear(nodo, rng, activos.size)
+        planos[activos] += extra
+        activos = activos[extra == nodo.caras]
+    return totales, explotados
+
+
+def _conservados(nodo, totales):
+    """Máscara de los dados que cuentan según kh/kl/dh/dl (por filas si es una matriz)"""
+    conservados = np.ones(totales.shape, dtype=bool)
+    if not nodo.conservar:
+        return conservados
+    tipo, n = nodo.conservar
+    cantidad = totales.shape[-1]
+    n = min(n, cantidad)
+    orden = np.argsort(totales, axis=-1, kind="stable")
+    if tipo == "kh":
+        descartados = orden[..., :cantidad - n]
+    elif tipo == "kl":
+        descartados = orden[..., n:]
+    elif tipo == "dh":
+        descartados = orden[..., cantidad - n:]
+    else:
+        descartados = orden[..., :n]
+    np.put_along_axis(conservados, descartados, False, axis=-1)
+    return conservados
+
+
+def _tirar_grupo(nodo, rng, forma):
+    """Tira un grupo de dados con sus modificadores: (totales, explotados, conservados, valor)
+
+    forma es (cantidad,) para una tirada o (repeticiones, cantidad) para un lote;
+    valor es la suma (o los éxitos) de la última dimensión.
+    """
+    tiradas = _muestrear(nodo, rng, forma)
+    if nodo.explota:
+        totales, explotados = _explotar(nodo, rng, tiradas)
+    else:
+        totales, explotados = tiradas, None
+    conservados = _conservados(nodo, totales)
+    if nodo.exitos:
+        op, valor = nodo.exitos
+        valor = np.count_nonzero(_COMPARAR[op](totales, valor) & conservados, axis=-1)
+    else:
+        valor = np.where(conservados, totales, 0).sum(axis=-1)
+    return totales, explotados, conservados, valor
+
+
+def _evaluar_dados(nodo, rng, detalles):
+    totales, explotados, conservados, total = _tirar_grupo(nodo, rng, (nodo.cantidad,))
+    total = int(total)
+    if nodo.exitos:
+        resumen = f"{total} éxito{'s' if total != 1 else ''}"
+    else:
+        resumen = str(total)
+
+    # Solo se convierten a texto los dados que se van a mostrar
+    visibles = min(totales.size, MAX_TIRADAS_DETALLE + 1)
+    marcas = []
+    for i in range(visibles):
+        marca = str(int(totales[i]))
+        if explotados is not None and explotados[i]:
+            marca += "!"
+        if not conservados[i]:
+            marca = f"[{marca}]"
+        marcas.append(marca)
+    detalles.append(f"- {nodo.notacion}: {_muestra(marcas, totales.size)} = {resumen}")
+
+    if nodo.exitos or totales.size > MAX_TIRADAS_DETALLE:
+        return total, f"({nodo.notacion}={total})"
+    sumandos = [str(int(t)) for t, c in zip(totales, conservados) if c]
+    return total, "(" + ("+".join(sumandos) or "0") + ")"
+
+
+def _evaluar(nodo, rng, detalles):
+    """Devuelve (valor, texto expandido) del nodo y añade los detalles de cada grupo de dados"""
+    if isinstance(nodo, Numero):
+        return nodo.valor, str(nodo.valor)
+
+    if isinstance(nodo, Dados):
+        return _evaluar_dados(nodo, rng, detalles)
+
+    if isinstance(nodo, Negativo):
+        valor, texto = _evaluar(nodo.operando, rng, detalles)
+        return -valor, f"-{texto}"
+
+    izquierda, texto_izq = _evaluar(nodo.izquierda, rng, detalles)
+    derecha, texto_der = _evaluar(nodo.derecha, rng, detalles)
+    if nodo.op == "+":
+        valor = izquierda + derecha
+    elif nodo.op == "-":
+        valor = izquierda - derecha
+    elif nodo.op == "*":
+        valor = izquierda * derecha
+    else:
+        if derecha == 0:
+            raise DiceError("División entre cero")
+        valor = izquierda / derecha
+    texto_izq = _agrupar(nodo.izquierda, texto_izq, nodo.op)
+    texto_der = _agrupar(nodo.derecha, texto_der, nodo.op, derecha=True)
+    return valor, f"{texto_izq}{nodo.op}{texto_der}"
+
+
+def tirar(expresion, rng=None):
+    """Compila (o reutiliza) la expresión y la tira"""
+    nodo = compilar(expresion.strip())
+    detalles = []
+    resultado, expandida = _evaluar(nodo, rng or _rng, detalles)
+    return Tirada(resultado, detalles, expandida)
+
+
+def procesar_expresion(expresion, rng=None):
+    """Tira una expresión y devuelve (resultado, detalles, expresión expandida)"""
+    tirada = tirar(expresion, rng)
+    return tirada.resultado, "\n".join(tirada.detalles), tirada.expandida
+
+
+def _evaluar_lote(nodo, rng, veces):
+    """Evalúa el nodo `veces` veces a la vez; devuelve un escalar o un array de tamaño veces"""
+    if isinstance(nodo, Numero):
+        return nodo.valor
+    if isinstance(nodo, Dados):
+        return _tirar_grupo(nodo, rng, (veces, nodo.cantidad))[3]
+    if isinstance(nodo, Negativo):
+        return -_evaluar_lote(nodo.operando, rng, veces)
+
+    izquierda = _evaluar_lote(nodo.izquierda, rng, veces)
+    derecha = _evaluar_lote(nodo.derecha, rng, veces)
+    if nodo.op == "+":
+        return izquierda + derecha
+    if nodo.op == "-":
+        return izquierda - derecha
+    if nodo.op == "*":
+        return izquierda * derecha
+    if np.any(np.asarray(derecha) == 0):
+        raise DiceError("División entre cero")
+    return izquierda / derecha
+
+
+_LOTE = re.compile(r"^\s*(\d+)\s*#\s*(.+)$", re.DOTALL)
+
+
+def separar_repeticiones(texto):
+    """'30# 1d20+5' -> (30, '1d20+5'); sin prefijo devuelve (1, texto)"""
+    match = _LOTE.match(texto)
+    if not match:
+        return 1, texto
+    return int(match.group(1)), match.group(2)
+
+
+def tirar_lote(expresion, veces, rng=None):
+    """Tira la expresión `veces` veces en una sola pasada vectorizada. Devuelve un array"""
+    if not 1 <= veces <= MAX_REPETICIONES:
+        raise DiceError(f"Las repeticiones deben estar entre 1 y {MAX_REPETICIONES}")
+    nodo = compilar(expresion.strip())
+    if _contar_dados(nodo) * veces > MAX_DADOS_LOTE:
+        raise DiceError(f"Como máximo {MAX_DADOS_LOTE} dados en total por lote")
+    resultados = _evaluar_lote(nodo, rng or _rng, veces)
+    return np.broadcast_to(resultados, (veces,))
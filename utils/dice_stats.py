@@ -0,0 +1,419 @@
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from math import lgamma
+
+import numpy as np
+
+from utils.dice import (
+    MAX_RONDAS_EXPLOSION, Dados, DiceError, Negativo, Numero, compilar, rango_permitido,
+)
+
+# Valores distintos que puede tener una distribución intermedia
+MAX_SOPORTE = 150_000
+
+# Tiempo estimado máximo de una expresión en nanosegundos (ver _estimar). Deja
+# margen sobre el presupuesto de 50 ms; scripts/bench_dice_stats.py comprueba
+# que todas las expresiones aceptadas caben en él
+MAX_COSTE = 32_000_000
+
+# Nanosegundos aproximados por operación elemental de cada cálculo, medidos
+# con scripts/bench_dice_stats.py en el peor caso de cada uno
+NS_CONVOLUCION = 18          # por valor × log2(valores) de la suma de un grupo
+NS_CONSERVAR = 11            # por cara × frecuencia × (conservados + 16) de kh/kl/dh/dl
+NS_PESO_CONSERVAR = 44       # por término binomial de los pesos de kh/kl/dh/dl
+
+# Probabilidad por debajo de la cual se corta la cola de los dados que explotan
+MIN_PROBABILIDAD = 1e-15
+
+PERCENTILES = (5, 25, 50, 75, 95)
+FILAS_HISTOGRAMA = 15
+ANCHO_HISTOGRAMA = 20
+
+
+@dataclass(frozen=True, eq=False)
+class Distribucion:
+    """Probabilidades de los enteros minimo, minimo+1, ..."""
+    minimo: int
+    probs: np.ndarray
+
+    @property
+    def maximo(self):
+        return self.minimo + len(self.probs) - 1
+
+    @property
+    def valores(self):
+        return np.arange(self.minimo, self.maximo + 1)
+
+    @property
+    def media(self):
+        return float(np.dot(self.valores, self.probs))
+
+    @property
+    def desviacion(self):
+        return float(math.sqrt(max(np.dot((self.valores - self.media) ** 2, self.probs), 0.0)))
+
+    def percentil(self, q):
+        acumulada = np.cumsum(self.probs)
+        return self.minimo + int(np.searchsorted(acumulada, q / 100 - 1e-12))
+
+
+def _crear(minimo, probs):
+    probs = np.asarray(probs, dtype=float)
+    no_nulos = np.flatnonzero(probs > 0)
+    probs = probs[no_nulos[0]:no_nulos[-1] + 1]
+    probs = probs / probs.sum()
+    probs.setflags(write=False)
+    return Distribucion(minimo + int(no_nulos[0]), probs)
+
+
+def _fija(valor):
+    return _crear(valor, [1.0])
+
+
+def _convolucionar(a, b):
+    """Convolución directa para soportes pequeños y por FFT para los grandes"""
+    tamano = len(a) + len(b) - 1
+    if tamano > MAX_SOPORTE:
+        raise DiceError("La distribución es demasiado grande para calcularla")
+    if min(len(a), len(b)) <= 64:
+        return np.convolve(a, b)
+    n = 1 << (tamano - 1).bit_length()
+    resultado = np.clip(np.fft.irfft(np.fft.rfft(a, n) * np.fft.rfft(b, n), n)[:tamano], 0.0, None)
+    # Fuera del soporte de la suma solo hay ruido de redondeo de la FFT
+    no_nulos_a, no_nulos_b = np.flatnonzero(a), np.flatnonzero(b)
+    resultado[:no_nulos_a[0] + no_nulos_b[0]] = 0.0
+    resultado[no_nulos_a[-1] + no_nulos_b[-1] + 1:] = 0.0
+    return resultado
+
+
+def _potencia(probs, veces):
+    """Suma de `veces` dados independientes, por cuadrados sucesivos"""
+    resultado = np.ones(1)
+    while veces:
+        if veces & 1:
+            resultado = _convolucionar(resultado, probs)
+        veces >>= 1
+        if veces:
+            probs = _convolucionar(probs, probs)
+    return resultado
+
+
+def _sumar(a, b):
+    return _crear(a.minimo + b.minimo, _convolucionar(a.probs, b.probs))
+
+
+def _negar(a):
+    return _crear(-a.maximo, a.probs[::-1])
+
+
+def _escalar(a, factor):
+    if factor == 0:
+        return _fija(0)
+    if factor < 0:
+        return _escalar(_negar(a), -factor)
+    tamano = (len(a.probs) - 1) * factor + 1
+    if tamano > MAX_SOPORTE:
+        raise DiceError("La distribución es demasiado grande para calcularla")
+    probs = np.zeros(tamano)
+    probs[::factor] = a.probs
+    return _crear(a.minimo * factor, probs)
+
+
+def _rondas(maximo):
+    """Igual que la tirada: como mucho MAX_RONDAS_EXPLOSION dados extra por dado"""
+    if maximo < 1:
+        return min(MAX_RONDAS_EXPLOSION, int(math.log(MIN_PROBABILIDAD) / math.log(maximo)) + 1)
+    return MAX_RONDAS_EXPLOSION
+
+
+def _tamano_dado(nodo):
+    """Valores posibles de un solo dado (con explosiones) sin construir su distribución"""
+    primera, cuantas, excluida = rango_permitido(nodo)
+    sale_maximo = primera + cuantas - 1 + (excluida is not None) == nodo.caras and excluida != nodo.caras
+    if not nodo.explota or not sale_maximo:
+        return nodo.caras + 1
+    return (_rondas(1 / cuantas) + 1) * nodo.caras + 1
+
+
+def _dado(nodo):
+    """Distribución de un solo dado (con repeticiones y explosiones): (valores, probs)"""
+    primera, cuantas, excluida = rango_permitido(nodo)
+    probs = np.zeros(nodo.caras + 1)
+    probs[primera:primera + cuantas + (excluida is not None)] = 1.0
+    if excluida is not None:
+        probs[excluida] = 0.0
+    probs /= probs.sum()
+    if not nodo.explota or probs[nodo.caras] == 0:
+        return np.arange(nodo.caras + 1), probs
+
+    maximo = probs[nodo.caras]
+    resto = probs.copy()
+    resto[nodo.caras] = 0.0
+    rondas = _rondas(maximo)
+    total = np.zeros((rondas + 1) * nodo.caras + 1)
+    for r in range(rondas + 1):
+        total[r * nodo.caras:(r + 1) * nodo.caras + 1] += maximo ** r * resto
+    total[(rondas + 1) * nodo.caras] += maximo ** (rondas + 1)
+    return np.arange(total.size), total / total.sum()
+
+
+def _conservar(valores, probs, puntos, cantidad, conservar, mayores):
+    """Suma exacta de los `puntos` de los `conservar` dados más altos (o más bajos).
+
+    Se condiciona en la cara t del último dado conservado: a < conservar dados
+    caen en caras mejores que t (suma libre entre ellas), al menos
+    conservar - a en t y el resto en caras peores. Con W[t, a] la probabilidad
+    de ese reparto y Q_t la distribución sin normalizar de las caras mejores,
+
+        resultado = sum_t sum_a W[t, a] · Q_t^(*a) · z^((conservar - a)·s_t)
+
+    Todo se evalúa a la vez en el dominio de la FFT: las potencias de
+    convolución son potencias punto a punto (Horner en a) y Q_t es la suma
+    acumulada de las caras anteriores. El coste es caras × frecuencias ×
+    conservar operaciones vectorizadas, sin bucles de Python por cara.
+    """
+    orden = np.argsort(valores, kind="stable")
+    if mayores:
+        orden = orden[::-1]
+    orden = orden[probs[orden] > 0]
+    p = probs[orden]
+    s = puntos[orden].astype(np.int64)
+    limite = conservar * int(s.max())
+    n = 1 << limite.bit_length()        # n > limite: la convolución circular no se solapa
+    frecuencias = np.arange(n // 2 + 1)
+
+    # W[t, a] = C(N, a) · sum_{b >= conservar - a} C(N - a, b) · p_t^b · peores_t^(N - a - b)
+    peores = np.clip(1.0 - np.cumsum(p), 0.0, None)
+    lg = np.array([lgamma(x + 1) for x in range(cantidad + 1)])
+    a = np.arange(conservar)[:, None]
+    b = np.arange(cantidad + 1)[None, :]
+    libres = cantidad - a
+    cierra = (b <= libres) & (b >= conservar - a)
+    resto = np.where(cierra, libres - b, 0)
+    log_comb = np.where(cierra, lg[libres] - lg[np.minimum(b, libres)] - lg[resto], -np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_peores = np.where(resto == 0, 0.0, resto * np.log(peores)[:, None, None])
+        exponente = np.where(cierra, log_comb + b * np.log(p)[:, None, None] + log_peores, -np.inf)
+    a = np.arange(conservar)
+    pesos = np.exp(exponente).sum(axis=2) * np.exp(lg[cantidad] - lg[a] - lg[cantidad - a])
+
+    # z^s de cada cara en cada frecuencia, por índice sobre las raíces de la unidad
+    raices = np.exp(-2j * np.pi * np.arange(n) / n)
+    giro = raices[np.outer(s, frecuencias) % n]
+    mejores = np.cumsum(p[:, None] * giro, axis=0) - p[:, None] * giro
+    z = mejores * giro.conj()
+    acumulado = np.repeat(pesos[:, -1:], frecuencias.size, axis=1).astype(complex)
+    for w in pesos[:, -2::-1].T:
+        acumulado *= z
+        acumulado += w[:, None]
+    acumulado *= raices[np.outer(conservar * s, frecuencias) % n]
+    resultado = np.clip(np.fft.irfft(acumulado.sum(axis=0), n)[:limite + 1], 0.0, None)
+    # Por debajo del mínimo solo queda ruido de redondeo de la FFT
+    resultado[:conservar * int(s.min())] = 0.0
+    return resultado
+
+
+_COMPARAR = {
+    ">=": np.greater_equal, "<=": np.less_equal,
+    ">": np.greater, "<": np.less, "=": np.equal,
+}
+
+
+def _conservados(nodo):
+    """Dados que cuentan en la suma con kh/kl/dh/dl y si son los mayores"""
+    if not nodo.conservar:
+        return nodo.cantidad, True
+    tipo, n = nodo.conservar
+    n = min(n, nodo.cantidad)
+    return (n if tipo in ("kh", "kl") else nodo.cantidad - n), tipo in ("kh", "dl")
+
+
+def _distribucion_dados(nodo):
+    valores, probs = _dado(nodo)
+    puntos = valores
+    if nodo.exitos:
+        op, umbral = nodo.exitos
+        puntos = _COMPARAR[op](valores, umbral).astype(int)
+
+    conservar, mayores = _conservados(nodo)
+    if conservar == 0:
+        return _fija(0)
+    if conservar < nodo.cantidad:
+        return _crear(0, _conservar(valores, probs, puntos, nodo.cantidad, conservar, mayores))
+
+    por_dado = np.bincount(puntos, weights=probs)
+    return _crear(0, _potencia(por_dado, nodo.cantidad))
+
+
+def _comprobar_soporte(tamano):
+    if tamano > MAX_SOPORTE:
+        raise DiceError("La distribución es demasiado grande para calcularla")
+    return tamano
+
+
+def _estimar(nodo):
+    """(valores posibles, coste) de la distribución de un nodo, sin calcularla.
+
+    El coste es un tiempo aproximado en nanosegundos: tamaño × log2(tamaño)
+    por cada convolución y caras × frecuencias × (conservados + 16) más los
+    pesos binomiales para kh/kl/dh/dl.
+    """
+    if isinstance(nodo, Numero):
+        return 1, 1
+    if isinstance(nodo, Negativo):
+        return _estimar(nodo.operando)
+    if isinstance(nodo, Dados):
+        caras = _comprobar_soporte(_tamano_dado(nodo))
+        maximo = 1 if nodo.exitos else caras - 1
+        conservar, _ = _conservados(nodo)
+        if conservar == 0:
+            return 1, NS_CONVOLUCION * caras
+        if conservar < nodo.cantidad:
+            limite = conservar * maximo
+            frecuencias = (1 << limite.bit_length()) // 2 + 1
+            coste = caras * (NS_CONSERVAR * frecuencias * (conservar + 16)
+                             + NS_PESO_CONSERVAR * conservar * (nodo.cantidad + 1))
+            return _comprobar_soporte(limite + 1), coste
+        tamano = _comprobar_soporte(nodo.cantidad * maximo + 1)
+        # Cuadrados sucesivos: los tamaños se duplican en cada paso, así que el
+        # total es del orden de unas pocas convoluciones del tamaño final
+        return tamano, NS_CONVOLUCION * (caras + tamano * max(tamano.bit_length(), 1))
+
+    izquierda, coste_izquierda = _estimar(nodo.izquierda)
+    derecha, coste_derecha = _estimar(nodo.derecha)
+    coste = coste_izquierda + coste_derecha
+    if nodo.op == "*" and min(izquierda, derecha) == 1:
+        constante = nodo.derecha if derecha == 1 else nodo.izquierda
+        factor = abs(_distribucion(constante).minimo)
+        tamano = _comprobar_soporte((max(izquierda, derecha) - 1) * factor + 1)
+        return tamano, coste + NS_CONVOLUCION * tamano
+    tamano = _comprobar_soporte(izquierda + derecha - 1)
+    return tamano, coste + NS_CONVOLUCION * tamano * max(tamano.bit_length(), 1)
+
+
+def _comprobar_coste(*nodos):
+    """Rechaza antes de calcular las expresiones que no caben en el presupuesto de tiempo"""
+    if sum(_estimar(nodo)[1] for nodo in nodos) > MAX_COSTE:
+        raise DiceError("La expresión es demasiado costosa para calcular sus estadísticas")
+
+
+@lru_cache(maxsize=512)
+def _distribucion(nodo):
+    """Distribución exacta de un nodo del AST; se cachea por nodo normalizado"""
+    if isinstance(nodo, Numero):
+        if nodo.valor != int(nodo.valor):
+            raise DiceError("Las estadísticas solo admiten números enteros")
+        return _fija(int(nodo.valor))
+    if isinstance(nodo, Dados):
+        return _distribucion_dados(nodo)
+    if isinstance(nodo, Negativo):
+        return _negar(_distribucion(nodo.operando))
+
+    izquierda = _distribucion(nodo.izquierda)
+    derecha = _distribucion(nodo.derecha)
+    if nodo.op == "+":
+        return _sumar(izquierda, derecha)
+    if nodo.op == "-":
+        return _sumar(izquierda, _negar(derecha))
+    if nodo.op == "*":
+        if len(derecha.probs) == 1:
+            return _escalar(izquierda, derecha.minimo)
+        if len(izquierda.probs) == 1:
+            return _escalar(derecha, izquierda.minimo)
+        raise DiceError("En las estadísticas solo se puede multiplicar por un número fijo")
+    raise DiceError("Las estadísticas no admiten divisiones")
+
+
+def _rango(nodo):
+    """Mínimo y máximo exactos de un nodo, aunque su probabilidad no quepa en un float"""
+    if isinstance(nodo, Numero):
+        return int(nodo.valor), int(nodo.valor)
+    if isinstance(nodo, Negativo):
+        bajo, alto = _rango(nodo.operando)
+        return -alto, -bajo
+    if isinstance(nodo, Dados):
+        valores, probs = _dado(nodo)
+        puntos = valores[probs > 0]
+        if nodo.exitos:
+            op, umbral = nodo.exitos
+            puntos = _COMPARAR[op](puntos, umbral).astype(int)
+        conservar, _ = _conservados(nodo)
+        return conservar * int(puntos.min()), conservar * int(puntos.max())
+
+    (a, b), (c, d) = _rango(nodo.izquierda), _rango(nodo.derecha)
+    if nodo.op == "+":
+        return a + c, b + d
+    if nodo.op == "-":
+        return a - d, b - c
+    productos = (a * c, a * d, b * c, b * d)
+    return min(productos), max(productos)
+
+
+def distribucion(expresion):
+    """Distribución exacta de una expresión de dados
+
+    Las colas con probabilidad por debajo de la precisión de la FFT quedan a
+    cero, pero el soporte se extiende al mínimo y máximo reales.
+    """
+    nodo = compilar(expresion.strip())
+    _comprobar_coste(nodo)
+    dist = _distribucion(nodo)
+    bajo, alto = _rango(nodo)
+    if bajo >= dist.minimo and alto <= dist.maximo:
+        return dist
+    probs = np.zeros(alto - bajo + 1)
+    probs[dist.minimo - bajo:dist.maximo - bajo + 1] = dist.probs
+    probs.setflags(write=False)
+    return Distribucion(bajo, probs)
+
+
+@lru_cache(maxsize=256)
+def _enfrentar(nodo_a, nodo_b):
+    diferencia = _sumar(_distribucion(nodo_a), _negar(_distribucion(nodo_b)))
+    valores = diferencia.valores
+    gana = float(diferencia.probs[valores > 0].sum())
+    empata = float(diferencia.probs[valores == 0].sum())
+    return gana, empata, max(1.0 - gana - empata, 0.0)
+
+
+def enfrentar(expresion_a, expresion_b):
+    """Probabilidades (gana, empata, pierde) de A frente a B"""
+    nodo_a, nodo_b = compilar(expresion_a.strip()), compilar(expresion_b.strip())
+    _comprobar_coste(nodo_a, nodo_b)
+    return _enfrentar(nodo_a, nodo_b)
+
+
+def histograma(dist, filas=FILAS_HISTOGRAMA, ancho=ANCHO_HISTOGRAMA):
+    """Histograma ASCII; agrupa valores si hay más que filas y omite las colas casi nulas"""
+    acumulada = np.cumsum(dist.probs)
+    desde = int(np.searchsorted(acumulada, 1e-4))
+    hasta = int(np.searchsorted(acumulada, 1 - 1e-4))
+    probs = dist.probs[desde:hasta + 1]
+    paso = max(1, math.ceil(len(probs) / filas))
+    cubos = np.add.reduceat(probs, np.arange(0, len(probs), paso))
+    mayor = cubos.max()
+
+    inicio = dist.minimo + desde
+    etiquetas = []
+    for i in range(len(cubos)):
+        bajo = inicio + i * paso
+        alto = min(bajo + paso - 1, inicio + len(probs) - 1)
+        etiquetas.append(str(bajo) if bajo == alto else f"{bajo}-{alto}")
+    margen = max(len(e) for e in etiquetas)
+
+    lineas = []
+    for etiqueta, p in zip(etiquetas, cubos):
+        barra = "█" * max(1 if p > 0 else 0, round(p / mayor * ancho))
+        lineas.append(f"{etiqueta:>{margen}} | {barra} {p * 100:.1f}%")
+    return "\n".join(lineas)
+
+
+def resumen(dist):
+    """Media, desviación, extremos y percentiles en texto"""
+    percentiles = " ".join(f"p{q}={dist.percentil(q)}" for q in PERCENTILES)
+    return (
+        f"Media: {dist.media:.2f}  Desv.: {dist.desviacion:.2f}\n"
+        f"Mín/Máx: {dist.minimo} / {dist.maximo}\n"
+        f"Percentiles: {percentiles}"
+    )
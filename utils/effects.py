@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import re
+import time
+from dataclasses import dataclass
+
+# Duración máxima de un efecto temporal (30 días)
+MAX_DURACION = 30 * 24 * 3600
+
+_UNIDADES = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_DURACION = re.compile(r"^(\d+)\s*([smhd]?)$")
+
+# Efectos vigentes del personaje c como lista JSON, ordenados por caducidad
+EFECTOS_ACTIVOS_SQL = """
+    (SELECT COALESCE(jsonb_agg(jsonb_build_object(
+                'atributo', ae.attribute, 'valor', ae.delta, 'expira', extract(epoch FROM ae.expires_at)
+            ) ORDER BY ae.expires_at, ae.id), '[]'::jsonb)
+     FROM active_effects ae
+     WHERE ae.character_id = c.id AND ae.expires_at > now())
+"""
+
+
+class EffectError(ValueError):
+    """Definición de efecto temporal incorrecta"""
+
+
+@dataclass(frozen=True)
+class Efecto:
+    """Efecto temporal pendiente de aplicar: atributo +delta durante segundos"""
+    atributo: str
+    delta: float
+    segundos: int
+
+    @property
+    def texto(self):
+        simbolo = "+" if self.delta > 0 else ""
+        return f"{self.atributo} {simbolo}{_numero(self.delta)} durante {formatear_duracion(self.segundos)}"
+
+
+def _numero(valor):
+    valor = float(valor)
+    return int(valor) if valor.is_integer() else valor
+
+
+def parsear_duracion(texto):
+    """'90', '90s', '10m', '2h', '1d' -> segundos"""
+    match = _DURACION.match(texto.strip().lower())
+    if not match:
+        raise EffectError(f"Duración no válida: {texto} (usa por ejemplo 30s, 10m, 2h o 1d)")
+    segundos = int(match.group(1)) * _UNIDADES[match.group(2) or "s"]
+    if not 0 < segundos <= MAX_DURACION:
+        raise EffectError("La duración debe estar entre 1 segundo y 30 días")
+    return segundos
+
+
+def formatear_duracion(segundos):
+    for unidad, tamano in (("d", 86400), ("h", 3600), ("m", 60)):
+        if segundos % tamano == 0:
+            return f"{segundos // tamano}{unidad}"
+    return f"{segundos}s"
+
+
+def parsear_efecto(params):
+    """'Ataque,+2,10m' -> Efecto('Ataque', 2, 600)"""
+    parts = [p.strip() for p in params.split(',')]
+    if len(parts) != 3 or not parts[0]:
+        raise EffectError("Error en formato: efecto@atributo,cantidad,duración (ej: Ataque,+2,10m)")
+    try:
+        delta = float(parts[1])
+    except ValueError:
+        raise EffectError(f"Cantidad no válida: {parts[1]}")
+    if delta == 0:
+        raise EffectError("La cantidad de un efecto no puede ser 0")
+    return Efecto(parts[0], delta, parsear_duracion(parts[2]))
+
+
+def aplicar_efectos_tx(cur, character_id, efectos, channel_id=None, source=None):
+    """Inserta los efectos en una sola sentencia. Devuelve [(id, expira_epoch)]"""
+    cur.execute("""
+        INSERT INTO active_effects (character_id, attribute, delta, expires_at, channel_id, source)
+        SELECT %s, a, d, now() + make_interval(secs => s), %s, %s
+        FROM unnest(%s::text[], %s::numeric[], %s::int[]) AS e(a, d, s)
+        RETURNING id, extract(epoch FROM expires_at)
+    """, (character_id, channel_id, source,
+          [e.atributo for e in efectos], [e.delta for e in efectos], [e.segundos for e in efectos]))
+    return [(effect_id, float(expira)) for effect_id, expira in cur.fetchall()]
+
+
+class EffectScheduler:
+    """Caducidad de los efectos temporales con un único temporizador.
+
+    Las caducidades pendientes viven en un montículo (expira, id). La tarea
+    duerme hasta la primera y solo se despierta antes si llega un efecto que
+    caduca antes que todos los demás, así que no hay sondeo periódico. Al
+    caducar se borran todas las filas vencidas en una sola sentencia y se
+    avisa en el canal donde se aplicaron.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._heap = []
+        self._wake = asyncio.Event()
+        self._task = None
+        self.loaded = 0
+        self.expired = 0
+        self.wakeups = 0
+
+    @property
+    def db(self):
+        return self.bot.db
+
+    async def start(self):
+        """Carga las caducidades pendientes y arranca el temporizador"""
+        # El índice (expires_at, id) las devuelve ya ordenadas: una lista
+        # ordenada es un montículo válido y no hace falta heapify
+        self._heap = await self.db.run(self._cargar)
+        self.loaded = len(self._heap)
+        self._task = asyncio.create_task(self._run())
+        print(f"[EFECTOS] {self.loaded} efectos temporales pendientes")
+
+    def _cargar(self, cur):
+        cur.execute("SELECT extract(epoch FROM expires_at), id FROM active_effects ORDER BY expires_at, id")
+        return [(float(expira), effect_id) for expira, effect_id in cur.fetchall()]
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def schedule(self, effect_id, expira):
+        """Programa la caducidad de un efecto recién aplicado (epoch en segundos)"""
+        antes = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (expira, effect_id))
+        if antes is None or expira < antes:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._heap:
+                    await self._wake.wait()
+                else:
+                    espera = self._heap[0][0] - time.time()
+                    if espera > 0:
+                        try:
+                            await asyncio.wait_for(self._wake.wait(), timeout=espera)
+                        except asyncio.TimeoutError:
+                            pass
+                self._wake.clear()
+                self.wakeups += 1
+
+                ahora = time.time()
+                vencidos = []
+                while self._heap and self._heap[0][0] <= ahora:
+                    vencidos.append(heapq.heappop(self._heap)[1])
+                if vencidos:
+                    await self._expirar(vencidos)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[EFECTOS] Error al caducar efectos: {e}")
+                await asyncio.sleep(5)
+
+    async def _expirar(self, ids):
+        filas = await self.db.run(self._borrar, ids)
+        self.expired += len(filas)
+
+        avisos = {}
+        for channel_id, nombre, atributo, delta in filas:
+            if channel_id:
+                simbolo = "+" if delta > 0 else ""
+                avisos.setdefault(channel_id, []).append(f"**{nombre}**: {atributo} {simbolo}{_numero(delta)}")
+        for channel_id, lineas in avisos.items():
+            channel = self.bot.get_channel(int(channel_id))
+            if channel:
+                try:
+                    await channel.send("Efectos terminados:\n" + "\n".join(lineas))
+                except Exception as e:
+                    print(f"[EFECTOS] No se pudo avisar en {channel_id}: {e}")
+
+    def _borrar(self, cur, ids):
+        cur.execute("""
+            DELETE FROM active_effects ae
+            USING characters c
+            WHERE ae.id = ANY(%s) AND c.id = ae.character_id
+            RETURNING ae.channel_id, c.name, ae.attribute, ae.delta
+        """, (ids,))
+        return cur.fetchall()
+
+    def stats(self):
+        return {
+            "pending": len(self._heap),
+            "next_in_s": round(max(self._heap[0][0] - time.time(), 0), 3) if self._heap else None,
+            "loaded": self.loaded,
+            "expired": self.expired,
+            "wakeups": self.wakeups,
+        }
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+
+from utils.dice import procesar_expresion
+
+# Vida inicial si el personaje no tiene atributo "Vida" ni se indica otra
+DEFAULT_VIDA = 20
+
+ACCIONES = ("atacar", "defender", "esquivar")
+
+ACTIVO = "activo"
+DERROTADO = "derrotado"
+
+
+@dataclass
+class Participante:
+    id: int
+    name: str
+    initiative: int
+    hp: int
+    max_hp: int
+    status: str
+
+
+@dataclass(frozen=True)
+class Accion:
+    actor_id: int
+    action: str
+    target_id: int = None
+
+
+def tirar(expresion):
+    """Resultado entero de una expresión de dados"""
+    return int(round(procesar_expresion(expresion)[0]))
+
+
+def orden_iniciativa(participantes, stats):
+    """Mayor iniciativa primero; desempata la agilidad y luego el nombre"""
+    def clave(p):
+        agilidad = stats[p.name].valor("Agilidad") if p.name in stats else 0
+        return -p.initiative, -agilidad, p.name
+    return sorted(participantes, key=clave)
+
+
+def resolver_ronda(participantes, acciones, stats, tirar=tirar):
+    """Resuelve todas las acciones de una ronda en orden de iniciativa.
+
+    Modifica hp/status de los participantes y devuelve las líneas del resumen.
+    "defender" tira la defensa dos veces y se queda con la mejor; "esquivar"
+    cambia la defensa por una tirada de Agilidad que, si iguala o supera al
+    ataque, lo evita por completo.
+    """
+    por_id = {p.id: p for p in participantes}
+    por_actor = {a.actor_id: a for a in acciones}
+    lineas = [
+        f"{p.name} se prepara para {por_actor[p.id].action}."
+        for p in participantes
+        if p.id in por_actor and por_actor[p.id].action != "atacar" and p.status != DERROTADO
+    ]
+
+    for p in orden_iniciativa(participantes, stats):
+        accion = por_actor.get(p.id)
+        if not accion or accion.action != "atacar":
+            continue
+        if p.status == DERROTADO or p.name not in stats:
+            lineas.append(f"{p.name} no puede actuar.")
+            continue
+        objetivo = por_id.get(accion.target_id)
+        if not objetivo or objetivo.status == DERROTADO or objetivo.name not in stats:
+            lineas.append(f"{p.name} se queda sin objetivo.")
+            continue
+
+        ataque = tirar(stats[p.name].dado("Ataque")[0])
+        reaccion = por_actor.get(objetivo.id)
+        reaccion = reaccion.action if reaccion else None
+        if reaccion == "esquivar":
+            esquive = tirar(stats[objetivo.name].dado("Agilidad")[0])
+            if esquive >= ataque:
+                lineas.append(f"{p.name} ataca a {objetivo.name} ({ataque}) y lo esquiva ({esquive}).")
+                continue
+            dano = ataque
+            texto_defensa = f"esquive fallido {esquive}"
+        else:
+            dado_defensa = stats[objetivo.name].dado("Defensa")[0]
+            defensa = tirar(dado_defensa)
+            if reaccion == "defender":
+                defensa = max(defensa, tirar(dado_defensa))
+            dano = max(0, ataque - defensa)
+            texto_defensa = f"defensa {defensa}"
+
+        objetivo.hp = max(0, objetivo.hp - dano)
+        linea = f"{p.name} ataca a {objetivo.name}: {ataque} vs {texto_defensa} → {dano} de daño"
+        if objetivo.hp == 0:
+            objetivo.status = DERROTADO
+            linea += f". **{objetivo.name} cae derrotado.**"
+        lineas.append(linea)
+    return lineas
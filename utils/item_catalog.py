@@ -0,0 +1,143 @@
+import asyncio
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class ItemRecord:
+    id: int
+    guild_id: str
+    name: str
+    category: str
+    equipable: bool
+    max_uses: int
+    effects: dict
+    attack: str
+    defense: str
+
+    @property
+    def lower_name(self):
+        return self.name.lower()
+
+
+ITEM_COLUMNS = "id, guild_id, name, category, equipable, max_uses, effects, attack, defense"
+
+
+def _record(row):
+    item_id, guild_id, name, category, equipable, max_uses, effects, attack, defense = row
+    return ItemRecord(item_id, guild_id, name, category, bool(equipable), max_uses or 0, effects or {}, attack, defense)
+
+
+@dataclass
+class _GuildItems:
+    by_id: dict = field(default_factory=dict)
+    by_lower: dict = field(default_factory=dict)
+
+    def add(self, item):
+        self.by_id[item.id] = item
+        self.by_lower[item.lower_name] = item
+
+    def drop(self, item):
+        self.by_id.pop(item.id, None)
+        if self.by_lower.get(item.lower_name) is item:
+            del self.by_lower[item.lower_name]
+
+
+class ItemCatalog:
+    """Copia en memoria de la tabla items, separada por servidor.
+
+    Cada servidor se carga completo la primera vez que se consulta, así que
+    las búsquedas por id y por nombre son O(1) y no dependen de cuántos
+    servidores haya. /item crear y /item eliminar la mantienen al día con
+    refresh() y remove().
+
+    Las cargas usan su propia conexión del pool (db.run): no se debe consultar
+    el catálogo mientras se tiene un cursor abierto. Cada servidor tiene su
+    propio lock, así que la carga de uno no bloquea a los demás.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._guilds = {}
+        self._versions = {}
+        self._locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def _guild(self, guild_id):
+        guild_id = str(guild_id)
+        items = self._guilds.get(guild_id)
+        if items is not None:
+            self.hits += 1
+            return items
+        self.misses += 1
+        async with self._locks.setdefault(guild_id, asyncio.Lock()):
+            items = self._guilds.get(guild_id)
+            if items is None:
+                rows = await self.db.run(self._fetch_guild, guild_id)
+                items = _GuildItems()
+                for row in rows:
+                    items.add(_record(row))
+                self._guilds[guild_id] = items
+                self.loads += 1
+        return items
+
+    def _fetch_guild(self, cur, guild_id):
+        cur.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE guild_id=%s ORDER BY id", (guild_id,))
+        return cur.fetchall()
+
+    def _fetch_one(self, cur, item_id):
+        cur.execute(f"SELECT {ITEM_COLUMNS} FROM items WHERE id=%s", (item_id,))
+        return cur.fetchone()
+
+    async def by_id(self, guild_id, item_id):
+        items = await self._guild(guild_id)
+        return items.by_id.get(item_id)
+
+    async def by_name(self, guild_id, name):
+        """Busca un item del servidor por nombre sin distinguir mayúsculas"""
+        items = await self._guild(guild_id)
+        return items.by_lower.get(name.strip().lower())
+
+    async def names(self, guild_id, item_ids):
+        """Devuelve {id: nombre} para los ids indicados que existan en el servidor"""
+        items = await self._guild(guild_id)
+        return {i: items.by_id[i].name for i in item_ids if i in items.by_id}
+
+    def version(self, guild_id):
+        """Contador que cambia cada vez que se crea, edita o borra un item del servidor"""
+        return self._versions.get(str(guild_id), 0)
+
+    def _bump(self, guild_id):
+        guild_id = str(guild_id)
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    async def refresh(self, guild_id, item_id):
+        """Recarga un item tras crearlo o editarlo"""
+        self._bump(guild_id)
+        items = self._guilds.get(str(guild_id))
+        if items is None:
+            return
+        row = await self.db.run(self._fetch_one, item_id)
+        old = items.by_id.get(item_id)
+        if old:
+            items.drop(old)
+        if row:
+            items.add(_record(row))
+
+    def remove(self, guild_id, item_id):
+        """Quita un item borrado de la caché"""
+        self._bump(guild_id)
+        items = self._guilds.get(str(guild_id))
+        item = items.by_id.get(item_id) if items else None
+        if item:
+            items.drop(item)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "guilds": len(self._guilds),
+            "size": sum(len(items.by_id) for items in self._guilds.values()),
+        }
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Huecos de precio de cada listado (listing_prices.price_slot va de 1 a 3)
+PRICE_SLOTS = 3
+
+
+def recalcular_listados(listings, componentes, rng):
+    """Calcula el nuevo stock y los nuevos precios de todos los listados de un mercado.
+
+    listings: filas (id, base_stock, current_stock) de market_listings.
+    componentes: filas (listing_id, price_slot, item_id, qty, initial_qty) de
+    listing_prices. qty es NULL si el componente solo existe en el precio inicial.
+    rng: numpy.random.Generator; con la misma semilla el resultado es el mismo.
+
+    Devuelve (stocks, precios):
+    - stocks: filas (id, base_stock, current_stock) en el orden de listings.
+    - precios: filas (listing_id, price_slot, item_id, qty) con la nueva qty
+      de cada componente (None si deja de formar parte del precio).
+
+    Reglas (las mismas que aplicaba /mercado actualizar fila a fila):
+    - Nuevo stock aleatorio entre 1 y 10.
+    - Precio vacío: sigue vacío. Precio con todas las cantidades a 0: se
+      restaura el precio inicial.
+    - Si se vendió la mitad del stock o más, cada componente sube x1.5 (los
+      de cantidad 1 pasan a 2); si no, baja x0.5. Nunca por debajo de 1.
+    """
+    n = len(listings)
+    posicion = {row[0]: i for i, row in enumerate(listings)}
+    base = np.array([int(row[1] or 0) for row in listings], dtype=np.int64)
+    current = np.array([int(row[2] or 0) for row in listings], dtype=np.int64)
+
+    sold = base - current
+    mitad = np.where(base > 0, -(-base // 2), 1)
+    subir = sold >= mitad
+    especial = subir & (base > 0)
+    factor = np.where(subir, 1.5, 0.5)
+
+    listing_idx = np.array([posicion[c[0]] for c in componentes], dtype=np.int64)
+    grupo = listing_idx * PRICE_SLOTS + np.array([c[1] - 1 for c in componentes], dtype=np.int64)
+    tiene_qty = np.array([c[3] is not None for c in componentes], dtype=bool)
+    qty = np.array([c[3] or 0 for c in componentes], dtype=np.int64)
+
+    ajustadas = np.where(
+        (qty == 1) & especial[listing_idx],
+        2,
+        np.maximum(1, np.trunc(qty * factor[listing_idx]).astype(np.int64)),
+    )
+
+    # Un precio existe si tiene algún componente con qty, y es "cero" si ninguna es positiva
+    existe = np.zeros(n * PRICE_SLOTS, dtype=bool)
+    con_valor = np.zeros(n * PRICE_SLOTS, dtype=bool)
+    np.logical_or.at(existe, grupo, tiene_qty)
+    np.logical_or.at(con_valor, grupo, tiene_qty & (qty > 0))
+    restaurar = existe[grupo] & ~con_valor[grupo]
+
+    precios = []
+    for k, (listing_id, slot, item_id, _, initial_qty) in enumerate(componentes):
+        if restaurar[k]:
+            nueva = initial_qty
+        elif tiene_qty[k]:
+            nueva = int(ajustadas[k])
+        else:
+            nueva = None
+        precios.append((listing_id, slot, item_id, nueva))
+
+    new_base = rng.integers(1, 11, size=n)
+    stocks = [(row[0], int(stock), int(stock)) for row, stock in zip(listings, new_base)]
+
+    return stocks, precios
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import re
+import time
+from dataclasses import dataclass
+
+MIGRATIONS_DIR = os.path.join("sql", "migrations")
+
+# 0001_nombre.sql: el número fija el orden de aplicación
+MIGRATION_FILE = re.compile(r"^(\d{4})_([\w-]+)\.sql$")
+
+# Clave del advisory lock que evita que dos instancias migren a la vez
+MIGRATION_LOCK_KEY = 7311001
+
+
+class MigrationError(Exception):
+    """El historial de migraciones no coincide con los ficheros"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def checksum(self):
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Lee las migraciones del directorio ordenadas por versión"""
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Versión de migración repetida: {version:04d}")
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def apply_migrations(cur, migrations):
+    """Aplica en orden las migraciones pendientes. Devuelve las que se aplicaron.
+
+    Pensada para Database.run: cada migración se confirma por separado junto
+    con su fila en schema_migrations, así que un fallo deja aplicadas las
+    anteriores y se reintenta desde la que falló en el siguiente arranque.
+    """
+    conn = cur.connection
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            duration_ms NUMERIC,
+            applied_at TIMESTAMPTZ DEFAULT now()
+        )
+    """)
+    conn.commit()
+
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cur.fetchall())
+
+        for migration in migrations:
+            checksum = applied.get(migration.version)
+            if checksum is not None and checksum != migration.checksum:
+                raise MigrationError(
+                    f"La migración {migration.version:04d}_{migration.name} cambió después de aplicarse"
+                )
+
+        pending = [m for m in migrations if m.version not in applied]
+        for migration in pending:
+            inicio = time.perf_counter()
+            cur.execute(migration.sql)
+            cur.execute("""
+                INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                VALUES (%s, %s, %s, %s)
+            """, (migration.version, migration.name, migration.checksum,
+                  round((time.perf_counter() - inicio) * 1000, 3)))
+            conn.commit()
+        return pending
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.commit()
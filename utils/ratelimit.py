@@ -0,0 +1,186 @@
+import math
+import time
+from dataclasses import dataclass
+
+import discord
+from discord.ext import commands
+
+# Grupo de los comandos personalizados (.nombre), que no son comandos del bot
+GRUPO_PERSONALIZADO = "comando_personalizado"
+
+# Cada cuánto se borran de memoria los cubos que ya están llenos (inactivos)
+PURGA_SEGUNDOS = 300
+
+
+@dataclass(frozen=True)
+class Limite:
+    capacidad: int       # llamadas seguidas permitidas
+    periodo: float       # segundos en recargar la capacidad completa
+
+    @property
+    def ritmo(self):
+        return self.capacidad / self.periodo
+
+
+@dataclass(frozen=True)
+class Presupuesto:
+    usuario: Limite
+    servidor: Limite = None   # None: sin límite compartido por servidor
+
+
+# Presupuestos por comando ("grupo subcomando"), por grupo o por defecto ("*")
+LIMITES = {
+    "*": Presupuesto(Limite(8, 20), Limite(60, 60)),
+    "roll": Presupuesto(Limite(10, 10), Limite(120, 60)),
+    GRUPO_PERSONALIZADO: Presupuesto(Limite(5, 10), Limite(60, 60)),
+    # Recorren todos los mercados del servidor: cubos propios y mucho más estrictos
+    "mercado inflacion": Presupuesto(Limite(1, 60), Limite(2, 600)),
+    "mercado reiniciar_inflacion": Presupuesto(Limite(1, 60), Limite(2, 600)),
+    "mercado actualizar": Presupuesto(Limite(1, 60), Limite(3, 600)),
+}
+
+
+class LimiteExcedido(commands.CheckFailure):
+    """Comando con prefijo rechazado por el limitador (ya se avisó al usuario)"""
+
+
+def _limite(texto):
+    capacidad, periodo = texto.split("/")
+    limite = Limite(int(capacidad), float(periodo))
+    if limite.capacidad < 1 or limite.periodo <= 0:
+        raise ValueError(texto)
+    return limite
+
+
+def cargar_limites(texto, base=LIMITES):
+    """Añade a los presupuestos por defecto los de RATE_LIMITS.
+
+    Formato: "mercado inflacion=1/60:2/600;inventario=5/10". Cada entrada es
+    capacidad/segundos por usuario y, tras ':', por servidor.
+    """
+    limites = dict(base)
+    for entrada in filter(None, (e.strip() for e in (texto or "").split(";"))):
+        try:
+            clave, valor = entrada.split("=", 1)
+            usuario, _, servidor = valor.partition(":")
+            limites[clave.strip().lower()] = Presupuesto(_limite(usuario), _limite(servidor) if servidor else None)
+        except ValueError:
+            print(f"[RATELIMIT] Entrada de RATE_LIMITS no válida, se ignora: {entrada}")
+    return limites
+
+
+class RateLimiter:
+    """Cubos de tokens en memoria por usuario y por servidor para cada grupo de comandos.
+
+    Cada llamada gasta un token del cubo del usuario y otro del servidor; los
+    cubos se recargan de forma continua al ritmo de su presupuesto. Solo se
+    gastan si hay token en ambos, así que una llamada rechazada no penaliza.
+    """
+
+    def __init__(self, limites=None):
+        self.limites = limites or LIMITES
+        # (ámbito, id, grupo) -> [tokens, instante de la última recarga]
+        self._cubos = {}
+        self._purga = time.monotonic()
+        self.permitidas = {}
+        self.rechazadas = {}
+
+    def grupo(self, nombre):
+        """Clave de presupuesto de un comando: el propio comando, su grupo o el de por defecto"""
+        nombre = nombre.lower()
+        if nombre in self.limites:
+            return nombre
+        raiz = nombre.split(" ", 1)[0]
+        return raiz if raiz in self.limites else "*"
+
+    def _cubo(self, clave, limite, ahora):
+        cubo = self._cubos.get(clave)
+        if cubo is None:
+            cubo = self._cubos[clave] = [float(limite.capacidad), ahora]
+        else:
+            cubo[0] = min(limite.capacidad, cubo[0] + (ahora - cubo[1]) * limite.ritmo)
+            cubo[1] = ahora
+        return cubo
+
+    def consumir(self, user_id, guild_id, nombre):
+        """Gasta un token para el comando. Devuelve (espera, ámbito): (0, None) si se permite"""
+        ahora = time.monotonic()
+        if ahora - self._purga > PURGA_SEGUNDOS:
+            self._purgar(ahora)
+
+        grupo = self.grupo(nombre)
+        # Sin presupuesto propio cada grupo de comandos tiene sus cubos
+        cubeta = grupo if grupo != "*" else nombre.lower().split(" ", 1)[0]
+        presupuesto = self.limites[grupo]
+
+        cubos = [("usuario", self._cubo(("u", str(user_id), cubeta), presupuesto.usuario, ahora), presupuesto.usuario)]
+        if presupuesto.servidor and guild_id is not None:
+            cubos.append(("servidor", self._cubo(("g", str(guild_id), cubeta), presupuesto.servidor, ahora),
+                          presupuesto.servidor))
+
+        for ambito, cubo, limite in cubos:
+            if cubo[0] < 1:
+                self.rechazadas[cubeta] = self.rechazadas.get(cubeta, 0) + 1
+                return (1 - cubo[0]) / limite.ritmo, ambito
+        for _, cubo, _ in cubos:
+            cubo[0] -= 1
+        self.permitidas[cubeta] = self.permitidas.get(cubeta, 0) + 1
+        return 0, None
+
+    def _purgar(self, ahora):
+        """Olvida los cubos que ya se habrían recargado por completo"""
+        self._purga = ahora
+        mayor_periodo = max(p.periodo for pr in self.limites.values() for p in (pr.usuario, pr.servidor) if p)
+        self._cubos = {k: c for k, c in self._cubos.items() if ahora - c[1] < mayor_periodo}
+
+    def stats(self):
+        return {
+            "buckets": len(self._cubos),
+            "allowed": sum(self.permitidas.values()),
+            "rejected": sum(self.rechazadas.values()),
+            "rejected_by_group": dict(self.rechazadas),
+        }
+
+
+def mensaje_espera(espera, ambito):
+    segundos = max(math.ceil(espera), 1)
+    if ambito == "servidor":
+        return f"Este servidor está usando mucho este comando. Prueba de nuevo en {segundos}s."
+    return f"Vas demasiado rápido. Prueba de nuevo en {segundos}s."
+
+
+def instalar(bot, limiter):
+    """Aplica el limitador a los slash commands y a los comandos con prefijo"""
+
+    async def interaction_check(interaction: discord.Interaction):
+        # El autocompletado se responde desde memoria y no cuenta
+        if interaction.type is not discord.InteractionType.application_command or interaction.command is None:
+            return True
+        espera, ambito = limiter.consumir(interaction.user.id, interaction.guild_id,
+                                          interaction.command.qualified_name)
+        if espera:
+            await interaction.response.send_message(mensaje_espera(espera, ambito), ephemeral=True)
+            return False
+        return True
+
+    async def prefix_check(ctx: commands.Context):
+        espera, ambito = limiter.consumir(ctx.author.id, ctx.guild.id if ctx.guild else None,
+                                          ctx.command.qualified_name)
+        if espera:
+            await ctx.send(mensaje_espera(espera, ambito), delete_after=10)
+            raise LimiteExcedido()
+        return True
+
+    async def on_command_error(ctx: commands.Context, error):
+        # Con un listener propio discord.py deja de registrar los errores, así que
+        # se imprimen aquí salvo los ya avisados y los .nombre que no son del bot
+        # (los atienden los comandos personalizados)
+        if isinstance(error, (LimiteExcedido, commands.CommandNotFound)):
+            return
+        if (ctx.command and ctx.command.has_error_handler()) or (ctx.cog and ctx.cog.has_error_handler()):
+            return
+        print(f"[ERROR] Comando {ctx.command}: {error!r}")
+
+    bot.tree.interaction_check = interaction_check
+    bot.add_check(prefix_check)
+    bot.add_listener(on_command_error, "on_command_error")
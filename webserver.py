@@ -1,11 +1,17 @@
 
 # webserver.py - Versión mejorada
-from flask import Flask 
+from flask import Flask, jsonify
 import os
 import threading
 
 app = Flask('')
 
+# Proveedores de métricas: nombre -> función sin argumentos que devuelve un dict
+metrics_providers = {}
+
+def register_metrics(name, provider):
+    metrics_providers[name] = provider
+
 @app.route('/')
 def index():
     return 'Bot is alive!'
@@ -14,6 +20,10 @@ def index():
 def health():
     return 'OK', 200
 
+@app.route('/metrics')
+def metrics():
+    return jsonify({name: provider() for name, provider in metrics_providers.items()})
+
 def run():
     port = int(os.environ.get('PORT', 8000))
 